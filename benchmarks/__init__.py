@@ -0,0 +1,19 @@
+import os
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+def setup():
+    """
+    Configures Django so that the benchmarks can import the scraper app
+    outside of manage.py.
+    """
+
+    import django
+
+    if str(BASE_DIR) not in sys.path:
+        sys.path.insert(0, str(BASE_DIR))
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'marketscrape.settings')
+    django.setup()
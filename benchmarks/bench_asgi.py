@@ -0,0 +1,290 @@
+"""
+Compares the throughput of the WSGI and ASGI deployments of the index page
+under the same simulated upstream latency, then the time to the first event
+of the report streamed by /stream/.
+
+Every Marketplace and Ebay request answers with a synthetic page after the
+given latency, without touching the network. WSGI runs the synchronous
+view on a fixed number of worker threads, the way gunicorn sync workers
+serve one request each. ASGI runs the asynchronous view on a single event
+loop, the way one uvicorn worker does. Both go through the full Django
+handler stack, with the result cache bypassed.
+
+The stream is read by every client as it arrives. Under ASGI it is served
+both by the synchronous Stream view, which Django has to consume whole
+before sending anything, and by AsyncStream, which sends every event as
+soon as its stage completes.
+
+Usage:
+    python -m benchmarks.bench_asgi [--latency SECONDS] [--concurrency N] [--requests N] [--wsgi-workers N] [--items N] [--stream-requests N]
+"""
+
+import argparse
+import asyncio
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from scraper.testing import ebay_search_page, marketplace_pages
+from . import setup
+
+class SimulatedResponse:
+    """
+    The parts of a requests or httpx response the scraper reads.
+    """
+
+    def __init__(self, html: str):
+        self.text = html
+        self.content = html.encode()
+        self.status_code = 200
+        self.encoding = 'utf-8'
+        self.apparent_encoding = 'utf-8'
+
+class Upstream:
+    """
+    Serves the synthetic Marketplace and Ebay pages after a fixed latency.
+    """
+
+    def __init__(self, latency: float, items: int):
+        self.latency = latency
+        self.mobile, self.desktop = marketplace_pages()
+        self.ebay = [ebay_search_page(items, seed=page) for page in range(5)]
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def page(self, url: str) -> SimulatedResponse:
+        with self.lock:
+            self.requests += 1
+
+        if 'ebay' in url:
+            return SimulatedResponse(self.ebay[int(re.search(r"_pgn=(\d+)", url).group(1)) % len(self.ebay)])
+
+        return SimulatedResponse(self.mobile if '//m.' in url else self.desktop)
+
+    def fetch(self, url: str, headers: dict, cancel=None) -> SimulatedResponse:
+        time.sleep(self.latency)
+        return self.page(url)
+
+    async def afetch(self, url: str, headers: dict) -> SimulatedResponse:
+        await asyncio.sleep(self.latency)
+        return self.page(url)
+
+def listing_url(i: int) -> str:
+    """
+    Returns a distinct listing URL for every request.
+    """
+
+    return f"https://www.facebook.com/marketplace/item/{100000000000000 + i}/"
+
+def summarize(name: str, latencies: list[float], elapsed: float, failures: int) -> None:
+    """
+    Prints the throughput and latency percentiles of a deployment.
+    """
+
+    p50, p95 = np.percentile(latencies, [50, 95]) if latencies else (0.0, 0.0)
+    print(f"{name:<24}{len(latencies):>6}{failures:>7}{elapsed:>10.2f}{len(latencies) / elapsed:>11.2f}{p50:>9.2f}{p95:>9.2f}")
+
+def client_requests(requests: int, concurrency: int) -> list[range]:
+    """
+    Splits the requests between the clients, each client sends its share
+    one after the other.
+    """
+
+    return [range(client, requests, concurrency) for client in range(concurrency)]
+
+def run_wsgi(requests: int, concurrency: int, workers: int) -> tuple[list[float], float, int]:
+    """
+    Sends the requests through the WSGI handler, which serves at most
+    workers of them at a time.
+    """
+
+    from django.test import Client
+
+    # The clients queue up behind the busy workers, like connections waiting in the listen backlog
+    slots = threading.Semaphore(workers)
+
+    def client(indices: range) -> list[tuple[float, int]]:
+        # A test client isn't thread safe, every client thread gets its own
+        session = Client()
+        results = []
+        for i in indices:
+            start = time.perf_counter()
+            with slots:
+                response = session.post('/', {'url': listing_url(i), 'refresh': 'on'})
+            results.append((time.perf_counter() - start, response.status_code))
+        return results
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = [result for results in executor.map(client, client_requests(requests, concurrency)) for result in results]
+    elapsed = time.perf_counter() - start
+
+    return [seconds for seconds, status in results if status == 200], elapsed, sum(status != 200 for _, status in results)
+
+def run_asgi(requests: int, concurrency: int) -> tuple[list[float], float, int]:
+    """
+    Sends the requests through the ASGI handler, all of them served by one
+    event loop.
+    """
+
+    from django.test import AsyncClient
+
+    async def client(indices: range) -> list[tuple[float, int]]:
+        session = AsyncClient()
+        results = []
+        for i in indices:
+            start = time.perf_counter()
+            response = await session.post('/', {'url': listing_url(i), 'refresh': 'on'})
+            results.append((time.perf_counter() - start, response.status_code))
+        return results
+
+    async def main():
+        start = time.perf_counter()
+        results = await asyncio.gather(*(client(indices) for indices in client_requests(requests, concurrency)))
+        return [result for results in results for result in results], time.perf_counter() - start
+
+    results, elapsed = asyncio.run(main())
+
+    return [seconds for seconds, status in results if status == 200], elapsed, sum(status != 200 for _, status in results)
+
+def summarize_stream(name: str, timings: list[tuple[float, float]], failures: int) -> None:
+    """
+    Prints the percentiles of the time to the first event and to the end of
+    the streams of a deployment.
+    """
+
+    first, complete = np.percentile(np.array(timings), [50, 95], axis=0).T if timings else ((0.0, 0.0), (0.0, 0.0))
+    print(f"{name:<24}{len(timings):>6}{failures:>7}{first[0]:>10.2f}{first[1]:>9.2f}{complete[0]:>9.2f}{complete[1]:>9.2f}")
+
+def stream_path(i: int) -> str:
+    """
+    Returns the stream of the report of a distinct listing for every request.
+    """
+
+    return f"/stream/?url={listing_url(i)}&refresh=on"
+
+def run_wsgi_stream(requests: int, concurrency: int, workers: int) -> tuple[list[tuple[float, float]], int]:
+    """
+    Reads the streams through the WSGI handler, a worker stays busy until
+    its stream has ended.
+    """
+
+    from django.test import Client
+
+    slots = threading.Semaphore(workers)
+
+    def client(indices: range) -> list[tuple[float, float, int]]:
+        session = Client()
+        results = []
+        for i in indices:
+            start = time.perf_counter()
+            first = None
+            with slots:
+                response = session.get(stream_path(i))
+                for _ in response.streaming_content:
+                    if first is None:
+                        first = time.perf_counter() - start
+                response.close()
+            results.append((first, time.perf_counter() - start, response.status_code))
+        return results
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = [result for results in executor.map(client, client_requests(requests, concurrency)) for result in results]
+
+    return [(first, complete) for first, complete, status in results if status == 200], sum(status != 200 for _, _, status in results)
+
+def run_asgi_stream(requests: int, concurrency: int) -> tuple[list[tuple[float, float]], int]:
+    """
+    Reads the streams through the ASGI handler, all of them served by one
+    event loop.
+    """
+
+    from django.test import AsyncClient
+
+    async def client(indices: range) -> list[tuple[float, float, int]]:
+        session = AsyncClient()
+        results = []
+        for i in indices:
+            start = time.perf_counter()
+            first = None
+            response = await session.get(stream_path(i))
+            # Consumes synchronous and asynchronous streams the way the ASGI handler does
+            async for _ in response:
+                if first is None:
+                    first = time.perf_counter() - start
+            results.append((first, time.perf_counter() - start, response.status_code))
+        return results
+
+    async def main():
+        results = await asyncio.gather(*(client(indices) for indices in client_requests(requests, concurrency)))
+        return [result for results in results for result in results]
+
+    results = asyncio.run(main())
+
+    return [(first, complete) for first, complete, status in results if status == 200], sum(status != 200 for _, _, status in results)
+
+def urlconf(view, stream=None) -> type:
+    """
+    Returns a URLconf that routes the index page to the given view, and
+    /stream/ to the stream view when one is given.
+    """
+
+    from django.urls import path
+
+    class URLConf:
+        urlpatterns = [path('', view.as_view(), name='index')]
+        if stream is not None:
+            urlpatterns.append(path('stream/', stream.as_view(), name='stream'))
+
+    return URLConf
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.5, help='Seconds every upstream request takes')
+    parser.add_argument('--concurrency', type=int, default=50, help='Clients sending requests at the same time')
+    parser.add_argument('--requests', type=int, default=100, help='Analyses requested from each deployment')
+    parser.add_argument('--wsgi-workers', type=int, default=4, help='Requests the WSGI deployment serves at once')
+    parser.add_argument('--items', type=int, default=48, help='Items on every synthetic Ebay page')
+    parser.add_argument('--stream-requests', type=int, default=20, help='Reports streamed from each deployment, 0 to skip the stream')
+    args = parser.parse_args()
+
+    setup()
+    from django.test.utils import override_settings, setup_test_environment
+    import scraper.utils
+    import warnings
+    from scraper.views import AsyncIndex, AsyncStream, Index, Stream
+
+    setup_test_environment()
+    upstream = Upstream(args.latency, args.items)
+    scraper.utils.fetch = upstream.fetch
+    scraper.utils.afetch = upstream.afetch
+
+    print(f"{args.requests} analyses, {args.concurrency} concurrent clients, {args.latency * 1000:.0f} ms upstream latency, {args.items} items per Ebay page")
+    print(f"{'deployment':<24}{'done':>6}{'failed':>7}{'seconds':>10}{'per second':>11}{'p50 s':>9}{'p95 s':>9}")
+
+    with override_settings(ROOT_URLCONF=urlconf(Index)):
+        summarize(f"wsgi ({args.wsgi_workers} workers)", *run_wsgi(args.requests, args.concurrency, args.wsgi_workers))
+
+    with override_settings(ROOT_URLCONF=urlconf(AsyncIndex)):
+        summarize("asgi (1 worker)", *run_asgi(args.requests, args.concurrency))
+
+    if not args.stream_requests:
+        return
+
+    print(f"\n{args.stream_requests} streamed reports, seconds to the first event and to the end of the stream")
+    print(f"{'deployment':<24}{'done':>6}{'failed':>7}{'first p50':>10}{'p95':>9}{'end p50':>9}{'p95':>9}")
+
+    with override_settings(ROOT_URLCONF=urlconf(Index, Stream)):
+        summarize_stream(f"wsgi ({args.wsgi_workers} workers)", *run_wsgi_stream(args.stream_requests, args.concurrency, args.wsgi_workers))
+
+    # Django warns about every synchronous stream it has to consume whole
+    with override_settings(ROOT_URLCONF=urlconf(Index, Stream)), warnings.catch_warnings():
+        warnings.filterwarnings('ignore', message="StreamingHttpResponse must consume synchronous iterators")
+        summarize_stream("asgi, Stream", *run_asgi_stream(args.stream_requests, args.concurrency))
+
+    with override_settings(ROOT_URLCONF=urlconf(AsyncIndex, AsyncStream)):
+        summarize_stream("asgi, AsyncStream", *run_asgi_stream(args.stream_requests, args.concurrency))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Compares the full Plotly figure of the price chart against its compact
+payload, which the browser turns into the same figure: the time the server
+spends building each, and the size each adds to the page once escaped into
+the data-chart attribute, raw and gzipped. The sampled payload is the
+compact one with the products downsampled to --max-points, and mode is how
+the browser plots the products, SVG or WebGL.
+
+Usage:
+    python -m benchmarks.bench_charts [--sizes N [N ...]] [--repeat N] [--max-points N]
+"""
+
+import argparse
+import gzip
+import json
+import time
+import numpy as np
+from . import setup
+from .fixtures import COUNTRIES, CONDITIONS, WORDS
+
+def products_table(size: int, seed: int = 0):
+    """
+    Builds a table of comparable products with realistic titles, prices and
+    shipping costs.
+    """
+
+    from scraper.products import ProductTable
+
+    rng = np.random.default_rng(seed)
+    titles = [' '.join(rng.choice(WORDS, size=rng.integers(4, 13))) for _ in range(size)]
+    prices = np.round(rng.lognormal(5, 0.8, size=size), 2)
+    shipping = np.round(np.where(rng.random(size) < 0.4, 0.0, rng.uniform(2, 40, size=size)), 2)
+
+    return ProductTable(titles, prices, shipping, rng.choice(COUNTRIES, size=size), rng.choice(CONDITIONS, size=size))
+
+def best_of(function, repeat: int) -> tuple[float, str]:
+    """
+    Returns the fastest of several runs of a function, in seconds, and its result.
+    """
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+
+    return min(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[48, 240, 1000, 5000], help='Numbers of comparable products')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per payload, the fastest one is reported')
+    parser.add_argument('--max-points', type=int, default=1000, help='Products plotted by the sampled payload')
+    args = parser.parse_args()
+
+    setup()
+    from django.utils.html import escape
+    from scraper.utils import chart_rendering, create_chart, create_compact_chart, get_chart_config
+
+    sampled = {**get_chart_config(), 'DOWNSAMPLE': True, 'MAX_POINTS': args.max_points}
+    payloads = (
+        ('figure', lambda products: create_chart(products, 'USD', 'Apple iPhone 12 Pro Max', 0)),
+        ('compact', lambda products: create_compact_chart(products, 'USD', 'Apple iPhone 12 Pro Max', 0)),
+        ('sampled', lambda products: create_compact_chart(products, 'USD', 'Apple iPhone 12 Pro Max', 0, rendering=chart_rendering(products, 0, sampled))),
+    )
+
+    print(f"{'products':>9}{'payload':>9}{'mode':>7}{'points':>8}{'server ms':>11}{'attr KiB':>10}{'gzip KiB':>10}{'time saved':>12}{'size saved':>12}")
+
+    for size in args.sizes:
+        products = products_table(size)
+        results = {}
+        for name, function in payloads:
+            seconds, payload = best_of(lambda: function(products), args.repeat)
+            attribute = escape(payload).encode()
+            rendering = json.loads(payload)['rendering'] if name != 'figure' else chart_rendering(products, 0)
+            results[name] = (seconds, len(attribute), len(gzip.compress(attribute)), rendering['mode'], rendering['points'])
+
+        for name, (seconds, attribute, compressed, mode, points) in results.items():
+            saved = ''
+            if name != 'figure':
+                figure = results['figure']
+                saved = f"{1 - seconds / figure[0]:>12.0%}{1 - attribute / figure[1]:>12.0%}"
+            print(f"{size:>9}{name:>9}{mode:>7}{points:>8}{seconds * 1000:>11.2f}{attribute / 1024:>10.1f}{compressed / 1024:>10.1f}{saved}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Compares the single-pass item extractor of EbayScraper against the five
+whole-page find_all scans it replaced.
+
+Usage:
+    python -m benchmarks.bench_extraction [saved_page.html ...] [--repeat N]
+"""
+
+import argparse
+import re
+import time
+from bs4 import BeautifulSoup
+from . import setup
+from .fixtures import ebay_pages
+
+def five_scan_extraction(soup: BeautifulSoup) -> tuple[list, list, list, list, list]:
+    """
+    The previous extraction: one find_all over the whole page per field.
+    """
+
+    titles = soup.find_all('div', class_='s-item__title')
+
+    prices = [price.text for price in soup.find_all('span', class_='s-item__price')]
+    prices = [float(re.search(r"([0-9]+\.[0-9]+)|([0-9]+,[0-9]+)", price).group(0).replace(",", "")) for price in prices]
+
+    shipping = []
+    for ship in soup.find_all('span', class_='s-item__shipping s-item__logisticsCost'):
+        match = re.search(r"([0-9]+.*[0-9])|(Free)|(not specified)", ship.text)
+        shipping.append(float(match.group(1).replace(",", "")) if match and match.group(1) else 0.0)
+
+    countries = [country.text.replace("from ", "") for country in soup.find_all('span', class_='s-item__location s-item__itemLocation')]
+    conditions = [condition.text for condition in soup.find_all('span', class_='SECONDARY_INFO')]
+
+    return titles, prices, shipping, countries, conditions
+
+def best_of(function, repeat: int) -> float:
+    """
+    Returns the fastest of several runs of a function, in seconds.
+    """
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pages', nargs='*', help='Saved Ebay result pages, synthetic pages are used when omitted')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per page, the fastest one is reported')
+    args = parser.parse_args()
+
+    setup()
+    from scraper.shop_class import EbayScraper
+
+    scraper = EbayScraper()
+
+    print(f"{'page':<24}{'items':>7}{'five-scan ms':>14}{'single-pass ms':>16}{'speedup':>9}{'misaligned':>12}")
+    for name, html in ebay_pages(args.pages):
+        soup = BeautifulSoup(html, 'html.parser')
+
+        records = list(scraper.iter_product_info(soup))
+        columns = five_scan_extraction(soup)
+        # Fields the five-scan approach can't pair with the right title
+        misaligned = sum(abs(len(column) - len(columns[0])) for column in columns[1:])
+
+        legacy = best_of(lambda: five_scan_extraction(soup), args.repeat)
+        single = best_of(lambda: list(scraper.iter_product_info(soup)), args.repeat)
+
+        print(f"{name:<24}{len(records):>7}{legacy * 1000:>14.2f}{single * 1000:>16.2f}{legacy / single:>8.2f}x{misaligned:>12}")
+
+if __name__ == '__main__':
+    main()
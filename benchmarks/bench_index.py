@@ -0,0 +1,116 @@
+"""
+Measures the comparable index on a synthetic catalog of Ebay titles: the
+time to insert the titles and compact them, the memory it takes, the time
+to save it and load it memory-mapped, and the latency of a candidate
+lookup. With --recall, also checks on a sample of the catalog how many of
+the titles the similarity scoring ranks highest are among the candidates.
+
+The titles mix the common words of the result page fixtures with a long
+tail of model and part numbers drawn from a Zipf distribution, the way
+real catalogs have a few frequent tokens and many rare ones.
+
+Usage:
+    python -m benchmarks.bench_index [--titles N] [--queries N] [--candidates N] [--recall N]
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+from . import setup
+from .fixtures import WORDS
+
+def catalog(titles: int, seed: int = 0) -> list[str]:
+    """
+    Generates normalized titles of 4 to 12 tokens.
+    """
+
+    rng = np.random.default_rng(seed)
+    tail = np.array([f"x{i:05d}" for i in range(50000)], dtype=object)
+    common = np.array(WORDS, dtype=object)
+
+    lengths = rng.integers(4, 13, size=titles)
+    total = int(lengths.sum())
+    rare = rng.random(total) < 0.3
+    tokens = np.where(rare, tail[np.minimum(rng.zipf(1.3, size=total), len(tail)) - 1], common[rng.integers(0, len(common), size=total)])
+    bounds = np.concatenate([[0], np.cumsum(lengths)])
+
+    return [' '.join(tokens[bounds[i]:bounds[i + 1]]) for i in range(titles)]
+
+def percentiles(timings: list[float]) -> str:
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99]) * 1000
+    return f"p50 {p50:.2f} ms, p95 {p95:.2f} ms, p99 {p99:.2f} ms"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--titles', type=int, default=1_000_000, help='Distinct titles in the catalog')
+    parser.add_argument('--queries', type=int, default=200, help='Lookups timed')
+    parser.add_argument('--candidates', type=int, default=300, help='Candidates retrieved per lookup')
+    parser.add_argument('--recall', type=int, default=0, help='Titles of the sample the recall is measured on, 0 skips it')
+    args = parser.parse_args()
+
+    setup()
+    from scraper.index import ComparableIndex
+    from scraper.similarity import batch_similarity
+
+    start = time.perf_counter()
+    titles = catalog(args.titles)
+    print(f"Generated {len(titles)} titles in {time.perf_counter() - start:.2f}s")
+
+    index = ComparableIndex(max_documents=len(titles))
+    start = time.perf_counter()
+    index.add_many(zip(range(1, len(titles) + 1), titles))
+    inserted = time.perf_counter() - start
+    start = time.perf_counter()
+    index.compact()
+    compacted = time.perf_counter() - start
+    stats = index.stats()
+    print(
+        f"Inserted in {inserted:.2f}s ({len(titles) / inserted:,.0f} titles/sec), compacted in {compacted:.2f}s: "
+        f"{stats['documents']} documents, {stats['tokens']} tokens, {stats['postings']} postings, {stats['bytes'] / 1024 / 1024:.1f} MiB"
+    )
+
+    rng = np.random.default_rng(1)
+    queries = [titles[i] for i in rng.integers(0, len(titles), size=args.queries)]
+
+    def lookups(index: ComparableIndex) -> list[float]:
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query, args.candidates)
+            timings.append(time.perf_counter() - start)
+        return timings
+
+    print(f"Lookup in memory:        {percentiles(lookups(index))}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / 'index'
+        start = time.perf_counter()
+        index.save(path)
+        saved = time.perf_counter() - start
+        start = time.perf_counter()
+        loaded = ComparableIndex.load(path, len(titles))
+        print(f"Saved in {saved:.2f}s, loaded memory-mapped in {time.perf_counter() - start:.2f}s")
+        print(f"Lookup memory-mapped:    {percentiles(lookups(loaded))}")
+
+        start = time.perf_counter()
+        loaded.add_many(zip(range(len(titles) + 1, len(titles) + 10001), catalog(10000, seed=2)))
+        print(f"Inserted 10000 new titles in {(time.perf_counter() - start) * 1000:.1f} ms")
+        print(f"Lookup with new titles:  {percentiles(lookups(loaded))}")
+        del loaded
+
+    if args.recall:
+        # Brute force scoring of the whole sample is what the index saves, so it runs on a sample only
+        sample = titles[:args.recall]
+        sample_index = ComparableIndex(max_documents=len(sample))
+        sample_index.add_many(zip(range(len(sample)), sample))
+        recalls = []
+        for query in queries[:20]:
+            best = set(np.argsort(-batch_similarity(query, sample), kind='stable')[:50].tolist())
+            candidates = {comparable_id for comparable_id, _ in sample_index.search(query, args.candidates)}
+            recalls.append(len(best & candidates) / len(best))
+        print(f"Recall of the 50 most similar titles of {len(sample)} among {args.candidates} candidates: {np.mean(recalls):.1%}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Reports the parse time and peak memory of every installed parser backend,
+for full pages and for the targeted subtrees the scraper actually reads.
+
+Usage:
+    python -m benchmarks.bench_parsers [--ebay saved_page.html ...] [--repeat N]
+"""
+
+import argparse
+import time
+import tracemalloc
+from bs4 import BeautifulSoup
+from bs4.builder import builder_registry
+from scraper.testing import marketplace_pages
+from . import setup
+from .fixtures import ebay_pages
+
+BACKENDS = ('html.parser', 'lxml', 'html5lib')
+
+def measure(html: str, parser: str, parse_only, repeat: int) -> tuple[float, int]:
+    """
+    Parses a page with a backend and a target.
+
+    Returns:
+        A tuple of the fastest parse time in seconds and the peak memory in bytes.
+    """
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        BeautifulSoup(html, parser, parse_only=parse_only)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    BeautifulSoup(html, parser, parse_only=parse_only)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return min(timings), peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ebay', nargs='*', default=None, help='Saved Ebay result pages, synthetic pages are used when omitted')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per page, the fastest one is reported')
+    args = parser.parse_args()
+
+    setup()
+    from scraper.utils import PARSE_TARGETS
+
+    mobile, desktop = marketplace_pages()
+    pages = [(name, html, PARSE_TARGETS["ebay"]) for name, html in ebay_pages(args.ebay)]
+    pages += [("marketplace-desktop", desktop, PARSE_TARGETS["marketplace"]), ("marketplace-mobile", mobile, None)]
+
+    backends = [backend for backend in BACKENDS if builder_registry.lookup(backend) is not None]
+
+    print(f"{'page':<24}{'KiB':>7}  {'backend':<12}{'target':<10}{'parse ms':>10}{'peak MiB':>10}")
+    for name, html, target in pages:
+        for backend in backends:
+            for label, parse_only in (('full', None), ('targeted', target)):
+                if label == 'targeted' and target is None:
+                    continue
+                seconds, peak = measure(html, backend, parse_only, args.repeat)
+                print(f"{name:<24}{len(html) / 1024:>7.0f}  {backend:<12}{label:<10}{seconds * 1000:>10.2f}{peak / 2**20:>10.2f}")
+
+if __name__ == '__main__':
+    main()
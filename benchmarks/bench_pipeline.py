@@ -0,0 +1,277 @@
+"""
+Times every stage of the analysis of a listing, and the index page end to
+end, on Marketplace and Ebay pages saved as HTML fixtures. Nothing touches
+the network: the pages are served from the fixtures instead of fetched, and
+the store, the comparable index and the result cache are bypassed so that
+every run does the full work. The title and similarity caches are cleared
+before every run, so the titles are always scored for the first time.
+
+Stages, on the listing and on the Ebay fixtures of every size:
+    create_soup                    Parsing a page with its parse target
+    marketplace_scraper            FacebookMarketplaceScraper.from_urls
+    get_product_info               Extracting the products of a result page
+    remove_outliers                Of the products of all the result pages
+    score_products                 Scoring them against the listing title
+    filter_products_by_similarity  Keeping the similar ones
+    create_chart                   The Plotly figure of the price chart
+    create_compact_chart           Its compact payload, the default
+    create_bargraph                The country chart
+    index_view                     POST / to the Index view, end to end
+
+The fixtures are generated from fixed seeds, or read from --fixtures, a
+directory of pages saved from the real sites or by --save-fixtures, see
+fixtures.load_fixtures.
+
+The results are written as JSON with --json. With --baseline they are
+compared to results saved before on the same machine: the stages whose
+median, or fastest run with --metric min_ms, is more than --threshold
+slower are flagged as regressions, and the exit status is 1. The fastest
+run is steadier on a busy machine.
+
+Usage:
+    python -m benchmarks.bench_pipeline [--fixtures DIR] [--save-fixtures DIR] [--sizes SIZE [SIZE ...]] [--repeat N]
+                                        [--json FILE] [--baseline FILE] [--metric {median_ms,min_ms}] [--threshold FRACTION] [--min-delta MS]
+"""
+
+import argparse
+import datetime
+import gc
+import json
+import platform
+import re
+import sys
+import time
+from pathlib import Path
+import numpy as np
+from . import setup
+from .bench_asgi import SimulatedResponse, urlconf
+from .fixtures import load_fixtures, save_fixtures
+
+LISTING_URL = "https://www.facebook.com/marketplace/item/123456789012345/"
+
+class FixtureServer:
+    """
+    Answers the requests of the scraper with the fixtures, the Ebay result
+    pages of the selected size in page order.
+    """
+
+    def __init__(self, fixtures: dict):
+        self.mobile, self.desktop = fixtures['marketplace']
+        self.ebay = fixtures['ebay']
+        self.size = next(iter(self.ebay))
+
+    def fetch(self, url: str, headers: dict, cancel=None) -> SimulatedResponse:
+        if 'ebay' in url:
+            pages = self.ebay[self.size]
+            return SimulatedResponse(pages[(int(re.search(r"_pgn=(\d+)", url).group(1)) - 1) % len(pages)])
+
+        return SimulatedResponse(self.mobile if '//m.' in url else self.desktop)
+
+def clear_caches() -> None:
+    """
+    Empties the caches of cleaned titles, normalized titles and similarity
+    scores.
+    """
+
+    from scraper.similarity import normalize_title, score_cache
+    from scraper.utils import clean_text
+
+    clean_text.cache_clear()
+    normalize_title.cache_clear()
+    score_cache.clear()
+
+def measure(stage: str, fixture: str, items: int, function, repeat: int) -> dict:
+    """
+    Runs a stage once to warm up, then times it repeat times with the caches
+    cleared before every run. Like timeit, the garbage collector is paused
+    while a run is timed, the soups of the fixtures otherwise make its
+    pauses land in random runs.
+
+    Returns:
+        dict: The stage, the fixture, the number of items it worked on and
+        the fastest, median and 95th percentile times in milliseconds.
+    """
+
+    timings = []
+    for _ in range(repeat + 1):
+        clear_caches()
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+
+    timings = np.array(timings[1:]) * 1000
+
+    return {
+        'stage': stage,
+        'fixture': fixture,
+        'items': items,
+        'runs': repeat,
+        'min_ms': round(float(timings.min()), 4),
+        'median_ms': round(float(np.median(timings)), 4),
+        'p95_ms': round(float(np.percentile(timings, 95)), 4),
+    }
+
+def run_stages(server: FixtureServer, sizes: list[str], repeat: int) -> list[dict]:
+    """
+    Times the stages on the listing, then on the result pages of every size.
+    """
+
+    from django.test import Client
+    from scraper.marketplace_class import FacebookMarketplaceScraper
+    from scraper.products import ProductTable
+    from scraper.shop_class import EbayScraper
+    from scraper.utils import PARSE_TARGETS, create_bargraph, create_chart, create_compact_chart, create_soup, remove_illegal_characters
+
+    mobile_url = LISTING_URL.replace("www", "m")
+    listing = FacebookMarketplaceScraper.from_urls(mobile_url, LISTING_URL)
+    title = remove_illegal_characters(listing.get_listing_title())
+
+    results = [
+        measure('create_soup', 'marketplace', 1, lambda: create_soup(LISTING_URL, None, parse_only=PARSE_TARGETS['marketplace']), repeat),
+        measure('marketplace_scraper', 'marketplace', 1, lambda: FacebookMarketplaceScraper.from_urls(mobile_url, LISTING_URL), repeat),
+    ]
+
+    shopping = EbayScraper()
+    client = Client()
+    for size in sizes:
+        server.size = size
+        fixture = f"ebay-{size}"
+        requests = [shopping.search_request(title, page) for page in range(1, len(server.ebay[size]) + 1)]
+        soups = [create_soup(url, headers, parse_only=PARSE_TARGETS['ebay']) for url, headers in requests]
+        page = shopping.get_product_info(soups[0])
+
+        # The products of all the pages, scored together like the candidates of the comparable index
+        products = ProductTable.concatenate([shopping.get_product_info(soup) for soup in soups])
+        products.similarities = shopping.score_products(products, title.lower())
+        threshold = shopping.ramp_down_threshold(products.similarities, 0.0) or 0.0
+        similar = shopping.filter_products_by_similarity(products, threshold)
+        best = shopping.best_product_index(similar)
+
+        url, headers = requests[0]
+        results += [
+            measure('create_soup', fixture, len(page), lambda: create_soup(url, headers, parse_only=PARSE_TARGETS['ebay']), repeat),
+            measure('get_product_info', fixture, len(page), lambda: shopping.get_product_info(soups[0]), repeat),
+            measure('remove_outliers', fixture, len(products), lambda: shopping.remove_outliers(products), repeat),
+            measure('score_products', fixture, len(products), lambda: shopping.score_products(products, title.lower()), repeat),
+            measure('filter_products_by_similarity', fixture, len(products), lambda: shopping.filter_products_by_similarity(products, threshold), repeat),
+            measure('create_chart', fixture, len(similar), lambda: create_chart(similar, 'USD', title, best), repeat),
+            measure('create_compact_chart', fixture, len(similar), lambda: create_compact_chart(similar, 'USD', title, best), repeat),
+            measure('create_bargraph', fixture, len(similar), lambda: create_bargraph(similar.countries), repeat),
+        ]
+
+        def index_view():
+            response = client.post('/', {'url': LISTING_URL, 'refresh': 'on'})
+            if response.status_code != 200:
+                raise RuntimeError(f"The index page answered {response.status_code}")
+
+        results.append(measure('index_view', fixture, len(products), index_view, repeat))
+
+    return results
+
+def compare(results: list[dict], baseline: dict, metric: str, threshold: float, min_delta: float) -> list[str]:
+    """
+    Adds the baseline time and the change of the metric to every result
+    measured in the baseline.
+
+    Returns:
+        list[str]: The regressions, the stages slower than the baseline by
+        more than threshold and by at least min_delta milliseconds.
+    """
+
+    previous = {(result['stage'], result['fixture']): result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        before = previous.get((result['stage'], result['fixture']))
+        if before is None:
+            continue
+
+        result['baseline_ms'] = before[metric]
+        result['change'] = round(result[metric] / before[metric] - 1, 4) if before[metric] else 0.0
+        result['regression'] = result['change'] > threshold and result[metric] - before[metric] >= min_delta
+        if result['regression']:
+            regressions.append(f"{result['stage']} on {result['fixture']}: {before[metric]:.2f} ms -> {result[metric]:.2f} ms ({result['change']:+.0%})")
+
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fixtures', help='Directory of saved pages, generated pages are used by default')
+    parser.add_argument('--save-fixtures', help='Save the generated pages to this directory and exit')
+    parser.add_argument('--sizes', nargs='+', help='Sizes of the Ebay fixtures to run, all of them by default')
+    parser.add_argument('--repeat', type=int, default=10, help='Timed runs per stage')
+    parser.add_argument('--json', help="Write the results as JSON to this file, '-' for standard output")
+    parser.add_argument('--baseline', help='JSON results of a previous run to compare against')
+    parser.add_argument('--metric', choices=['median_ms', 'min_ms'], default='median_ms', help='Time compared with the baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Slowdown flagged as a regression, 0.2 is 20%%')
+    parser.add_argument('--min-delta', type=float, default=0.1, help='Smallest slowdown in milliseconds flagged, below it timings are noise')
+    args = parser.parse_args()
+
+    if args.save_fixtures:
+        for path in save_fixtures(args.save_fixtures):
+            print(path)
+        return
+
+    setup()
+    from django.test.utils import override_settings, setup_test_environment
+    import scraper.utils
+    from scraper.views import Index
+
+    fixtures = load_fixtures(args.fixtures)
+    sizes = args.sizes or list(fixtures['ebay'])
+    unknown = [size for size in sizes if size not in fixtures['ebay']]
+    if unknown:
+        parser.error(f"No Ebay fixtures of size {', '.join(unknown)}, the sizes are {', '.join(fixtures['ebay'])}")
+
+    setup_test_environment()
+    server = FixtureServer(fixtures)
+    scraper.utils.fetch = server.fetch
+
+    disabled = {'ENABLED': False}
+    with override_settings(ROOT_URLCONF=urlconf(Index), SCRAPER_STORE=disabled, SCRAPER_INDEX=disabled, SCRAPER_PAGE_CACHE=disabled):
+        results = run_stages(server, sizes, args.repeat)
+
+    regressions = []
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.metric, args.threshold, args.min_delta)
+
+    report = {
+        'meta': {
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.platform(),
+            'fixtures': args.fixtures or 'generated',
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    if args.baseline:
+        report['meta'].update({'baseline': args.baseline, 'metric': args.metric, 'threshold': args.threshold, 'regressions': len(regressions)})
+
+    # The table goes to standard error when the JSON goes to standard output
+    out = sys.stderr if args.json == '-' else sys.stdout
+    header = f"{'stage':<31}{'fixture':<14}{'items':>7}{'min ms':>10}{'median ms':>11}{'p95 ms':>10}"
+    print(header + (f"{'baseline':>10}{'change':>9}" if args.baseline else ''), file=out)
+    for result in results:
+        line = f"{result['stage']:<31}{result['fixture']:<14}{result['items']:>7}{result['min_ms']:>10.2f}{result['median_ms']:>11.2f}{result['p95_ms']:>10.2f}"
+        if 'baseline_ms' in result:
+            line += f"{result['baseline_ms']:>10.2f}{result['change']:>+9.0%}" + ('  REGRESSION' if result['regression'] else '')
+        print(line, file=out)
+
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2) + '\n')
+
+    if regressions:
+        print(f"\n{len(regressions)} regressions beyond {args.threshold:.0%}:\n  " + "\n  ".join(regressions), file=out)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
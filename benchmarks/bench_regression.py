@@ -0,0 +1,108 @@
+"""
+Compares the NumPy trend line fit of the price chart against the
+scikit-learn pipeline it replaced (PolynomialFeatures, LinearRegression and
+mean_squared_error): the time per fit, how far the curves and confidence
+bands deviate from each other, and the cost of importing scikit-learn.
+
+scikit-learn is no longer a dependency of the app, install it to run the
+comparison.
+
+Usage:
+    python -m benchmarks.bench_regression [--sizes N [N ...]] [--repeat N]
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+import numpy as np
+from . import setup
+
+def sklearn_fit(x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, float]:
+    """
+    The previous fit of create_chart: the curve over 100 points and the
+    half-width of its confidence band.
+    """
+
+    from sklearn.linear_model import LinearRegression
+    from sklearn.metrics import mean_squared_error
+    from sklearn.preprocessing import PolynomialFeatures
+
+    poly_features = PolynomialFeatures(degree=4, include_bias=True)
+    X_poly = poly_features.fit_transform(x.reshape(-1, 1))
+    poly_model = LinearRegression()
+    poly_model.fit(X_poly, y)
+
+    X_range = np.linspace(x.min(), x.max(), 100)
+    Y_range = poly_model.predict(poly_features.fit_transform(X_range.reshape(-1, 1)))
+    mse = mean_squared_error(y, poly_model.predict(X_poly))
+
+    return Y_range, 1.96 * np.sqrt(mse)
+
+def best_of(function, repeat: int) -> tuple[float, object]:
+    """
+    Returns the fastest of several runs of a function, in seconds, and its result.
+    """
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+
+    return min(timings), result
+
+def import_seconds(statement: str) -> float:
+    """
+    Returns the time a fresh interpreter takes to run an import statement.
+    """
+
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', statement], check=True)
+
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[48, 240, 1000, 5000], help='Numbers of comparable products')
+    parser.add_argument('--repeat', type=int, default=20, help='Runs per fit, the fastest one is reported')
+    args = parser.parse_args()
+
+    setup()
+    from scraper.utils import fit_polynomial
+
+    try:
+        import sklearn
+    except ImportError:
+        sklearn = None
+        print("scikit-learn isn't installed, only the NumPy fits are timed")
+
+    if sklearn is not None:
+        baseline = import_seconds('import numpy')
+        print(f"Importing scikit-learn's regression modules: {(import_seconds('import numpy, sklearn.linear_model, sklearn.preprocessing, sklearn.metrics') - baseline) * 1000:.0f} ms on top of NumPy")
+
+    print(f"{'products':>9}{'fit':>10}{'ms':>9}{'speedup':>9}{'curve diff':>12}{'band diff':>11}")
+
+    rng = np.random.default_rng(0)
+    for size in args.sizes:
+        x = np.sort(np.round(rng.lognormal(5, 0.8, size=size), 2))
+        y = np.round(np.where(rng.random(size) < 0.4, 0.0, rng.uniform(2, 40, size=size)), 2)
+        weights = rng.uniform(0.5, 1.5, size=size)
+
+        reference = None
+        if sklearn is not None:
+            seconds, (curve, ci) = best_of(lambda: sklearn_fit(x, y), args.repeat)
+            reference = seconds, curve, ci
+            print(f"{size:>9}{'sklearn':>10}{seconds * 1000:>9.3f}")
+
+        for name, options in (('numpy', {}), ('weighted', {'weights': weights}), ('robust', {'robust': True})):
+            seconds, fit = best_of(lambda: fit_polynomial(x, y, **options), args.repeat)
+            line = f"{size:>9}{name:>10}{seconds * 1000:>9.3f}"
+            if reference is not None:
+                line += f"{reference[0] / seconds:>8.1f}x"
+                if name == 'numpy':
+                    line += f"{np.abs(fit['y'] - reference[1]).max():>12.2e}{abs(fit['ci'] - reference[2]):>11.2e}"
+            print(line)
+
+if __name__ == '__main__':
+    main()
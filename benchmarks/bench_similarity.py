@@ -0,0 +1,81 @@
+"""
+Compares the batch title-similarity kernels against the per-pair
+SequenceMatcher scoring they replaced, both in speed and in how far their
+scores deviate from it. Warm rows are served from the score cache.
+
+Usage:
+    python -m benchmarks.bench_similarity [saved_page.html ...] [--target TITLE] [--repeat N]
+"""
+
+import argparse
+import string
+import time
+from difflib import SequenceMatcher
+import numpy as np
+from . import setup
+from .fixtures import ebay_pages
+
+def per_pair_similarity(string1: str, string2: str) -> float:
+    """
+    The previous scoring: both titles normalized and a new SequenceMatcher
+    built for every pair.
+    """
+
+    string1 = ' '.join(string1.lower().strip().split())
+    string2 = ' '.join(string2.lower().strip().split())
+
+    translator = str.maketrans('', '', string.punctuation)
+
+    return SequenceMatcher(None, string1.translate(translator), string2.translate(translator)).ratio()
+
+def best_of(function, repeat: int) -> tuple[float, object]:
+    """
+    Returns the fastest of several runs of a function, in seconds, and its result.
+    """
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+
+    return min(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pages', nargs='*', help='Saved Ebay result pages, synthetic pages are used when omitted')
+    parser.add_argument('--target', default='Apple iPhone 12 Pro Max 128GB Unlocked', help='Title of the Marketplace listing')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per kernel, the fastest one is reported')
+    args = parser.parse_args()
+
+    setup()
+    from scraper.shop_class import EbayScraper
+    from scraper.similarity import SIMILARITY_METHODS, SequenceMatcher as BatchMatcher, batch_similarity, normalize_title, score_cache
+    from scraper.utils import parse_html, PARSE_TARGETS
+
+    scraper = EbayScraper()
+    titles = []
+    for _, html in ebay_pages(args.pages):
+        titles += scraper.get_product_info(parse_html(html, PARSE_TARGETS["ebay"])).titles.tolist()
+
+    target = args.target.lower()
+    reference_time, reference = best_of(lambda: np.array([per_pair_similarity(title, target) for title in titles]), args.repeat)
+
+    print(f"{len(titles)} candidate titles, batch ratio backed by {BatchMatcher.__module__.split('.')[0]}")
+    print(f"{'kernel':<12}{'ms':>9}{'speedup':>9}{'max |diff|':>12}{'mean |diff|':>13}{'same at 0.35':>14}")
+    print(f"{'per-pair':<12}{reference_time * 1000:>9.2f}{1:>8.2f}x{0:>12.4f}{0:>13.4f}{1:>13.1%}")
+    def cold(method):
+        # Start from empty caches so that only the kernel is measured
+        score_cache.clear()
+        normalize_title.cache_clear()
+        return batch_similarity(target, titles, method=method)
+
+    for method in SIMILARITY_METHODS:
+        for label, function in ((method, cold), (f"{method} warm", lambda method: batch_similarity(target, titles, method=method))):
+            seconds, scores = best_of(lambda: function(method), args.repeat)
+            difference = np.abs(scores - reference)
+            agreement = np.mean((scores >= 0.35) == (reference >= 0.35))
+            print(f"{label:<12}{seconds * 1000:>9.2f}{reference_time / seconds:>8.2f}x{difference.max():>12.4f}{difference.mean():>13.4f}{agreement:>13.1%}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Measures the startup cost of the scraper app with python -X importtime:
+importing its views the way a worker does on boot, and running
+manage.py check, which every management command pays for. Reports the wall
+time, the import time of the scraper modules, the heaviest packages, and
+whether any of the dependencies that should only load on first use were
+imported. Exits with status 1 when a measurement exceeds the budget.
+
+Usage:
+    python -m benchmarks.bench_startup [--runs N] [--budget FILE] [--top N]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from . import BASE_DIR
+
+BUDGET = Path(__file__).resolve().parent / 'startup_budget.json'
+
+SCENARIOS = {
+    'import scraper.views': [
+        '-c',
+        "import django, os; os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'marketscrape.settings'); "
+        "django.setup(); import scraper.views"
+    ],
+    'manage.py check': [str(BASE_DIR / 'manage.py'), 'check'],
+}
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int, int]]:
+    """
+    Parses the report of -X importtime.
+
+    Returns:
+        list[tuple[str, int, int, int]]: The module, its own import time and
+        its cumulative import time in microseconds, and its nesting level,
+        in the order of the report.
+    """
+
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        imports.append((name.strip(), int(own), int(cumulative), (len(name) - len(name.lstrip())) // 2))
+
+    return imports
+
+def run(arguments: list[str]) -> tuple[float, list[tuple[str, int, int, int]]]:
+    """
+    Runs a fresh interpreter with -X importtime.
+
+    Returns:
+        tuple[float, list]: The wall time in seconds and the parsed report.
+    """
+
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', *arguments], cwd=BASE_DIR, capture_output=True, text=True,
+        env={**os.environ, 'PYTHONDONTWRITEBYTECODE': '1'}
+    )
+    elapsed = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr[-2000:])
+
+    return elapsed, parse_importtime(completed.stderr)
+
+def measure(arguments: list[str], runs: int) -> dict:
+    """
+    Runs a scenario several times and keeps the median of every measurement.
+    """
+
+    walls, totals, scrapers = [], [], []
+    report = None
+    for _ in range(runs):
+        wall, imports = run(arguments)
+        walls.append(wall)
+        totals.append(sum(own for _, own, _, _ in imports))
+        # Time spent importing the scraper package and everything it pulled in first
+        scrapers.append(sum(cumulative for name, _, cumulative, level in imports if name.startswith('scraper') and not any(
+            parent.startswith('scraper') and parent_level < level for parent, _, _, parent_level in imports
+        )))
+        report = imports
+
+    return {
+        'wall_ms': statistics.median(walls) * 1000,
+        'import_ms': statistics.median(totals) / 1000,
+        'scraper_ms': statistics.median(scrapers) / 1000,
+        'modules': {name for name, _, _, _ in report},
+        'report': report,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='Runs per scenario, the median is reported')
+    parser.add_argument('--budget', type=Path, default=BUDGET, help='JSON file of the budget')
+    parser.add_argument('--top', type=int, default=10, help='Heaviest top-level packages listed per scenario')
+    args = parser.parse_args()
+
+    budget = json.loads(args.budget.read_text())
+    interpreter = statistics.median(run(['-c', 'pass'])[0] for _ in range(args.runs)) * 1000
+    print(f"Bare interpreter: {interpreter:.0f} ms")
+
+    failures = []
+    for name, arguments in SCENARIOS.items():
+        result = measure(arguments, args.runs)
+        limits = budget['scenarios'].get(name, {})
+
+        print(f"\n{name}")
+        for measurement in ('wall_ms', 'import_ms', 'scraper_ms'):
+            limit = limits.get(measurement)
+            status = ''
+            if limit is not None:
+                status = f"  (budget {limit:.0f} ms{', OVER' if result[measurement] > limit else ''})"
+                if result[measurement] > limit:
+                    failures.append(f"{name}: {measurement} {result[measurement]:.0f} ms > {limit:.0f} ms")
+            print(f"  {measurement:<12}{result[measurement]:>8.0f} ms{status}")
+
+        heaviest = sorted(
+            ((cumulative, module) for module, _, cumulative, level in result['report'] if level == 0 or (level == 1 and module.startswith('scraper'))),
+            reverse=True
+        )[:args.top]
+        print("  heaviest: " + ", ".join(f"{module} {cumulative / 1000:.0f} ms" for cumulative, module in heaviest))
+
+        loaded = sorted(module for module in budget['lazy'] if module in result['modules'])
+        print(f"  lazy dependencies imported: {', '.join(loaded) or 'none'}")
+        failures += [f"{name}: imported {module} at startup" for module in loaded]
+
+    if failures:
+        print("\nOver budget:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+
+    print("\nWithin budget")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+from pathlib import Path
+from scraper.testing import ebay_search_page, marketplace_pages
+
+# Item counts of the synthetic result pages, _ipg=240 is what EbayScraper requests
+EBAY_SIZES = {
+    'small': 48,
+    'medium': 120,
+    'large': 240,
+}
+
+def load_pages(paths: list[str]) -> list[tuple[str, str]]:
+    """
+    Loads saved HTML pages.
+
+    Args:
+        paths: The paths of the saved pages.
+
+    Returns:
+        A list of (name, HTML) tuples.
+    """
+
+    return [(Path(path).name, Path(path).read_text(encoding='utf-8', errors='replace')) for path in paths]
+
+def ebay_pages(paths: list[str] = None) -> list[tuple[str, str]]:
+    """
+    Returns the saved Ebay result pages, or a synthetic page of every size
+    when no paths are given.
+
+    Args:
+        paths: The paths of the saved pages.
+
+    Returns:
+        A list of (name, HTML) tuples.
+    """
+
+    if paths:
+        return load_pages(paths)
+
+    return [(f"synthetic-{size}", ebay_search_page(items, seed=i)) for i, (size, items) in enumerate(EBAY_SIZES.items())]
+
+def save_fixtures(directory: str, pages: int = 5) -> list[Path]:
+    """
+    Saves the synthetic Marketplace listing and the synthetic Ebay result
+    pages of every size, so that benchmarks can run against the same HTML
+    files as fixtures that were saved from the real sites.
+
+    Args:
+        directory: The directory to save the pages in.
+        pages: The number of result pages of each size, EbayScraper reads 5.
+
+    Returns:
+        The paths of the saved pages.
+    """
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    mobile, desktop = marketplace_pages()
+    files = {'marketplace-mobile.html': mobile, 'marketplace-desktop.html': desktop}
+    for size, items in EBAY_SIZES.items():
+        for page in range(1, pages + 1):
+            files[f"ebay-{size}-{page}.html"] = ebay_search_page(items, seed=page)
+
+    for name, html in files.items():
+        (directory / name).write_text(html, encoding='utf-8')
+
+    return [directory / name for name in files]
+
+def load_fixtures(directory: str = None, pages: int = 5) -> dict:
+    """
+    Loads the pages saved by save_fixtures, or pages saved from the real
+    sites under the same names: marketplace-mobile.html,
+    marketplace-desktop.html and ebay-<size>-<page>.html. The pages are
+    generated instead when no directory is given.
+
+    Args:
+        directory: The directory of the saved pages.
+        pages: The number of result pages of each size to generate.
+
+    Returns:
+        A dict with the mobile and desktop HTML of the listing under
+        'marketplace', and the HTML of the result pages of each size, in
+        page order, under 'ebay'.
+    """
+
+    if directory is None:
+        return {
+            'marketplace': marketplace_pages(),
+            'ebay': {size: [ebay_search_page(items, seed=page) for page in range(1, pages + 1)] for size, items in EBAY_SIZES.items()},
+        }
+
+    directory = Path(directory)
+    read = lambda path: path.read_text(encoding='utf-8', errors='replace')
+
+    ebay = {}
+    for path in directory.glob('ebay-*-*.html'):
+        size, page = path.stem[len('ebay-'):].rsplit('-', 1)
+        ebay.setdefault(size, {})[int(page)] = read(path)
+
+    return {
+        'marketplace': (read(directory / 'marketplace-mobile.html'), read(directory / 'marketplace-desktop.html')),
+        'ebay': {size: [pages[page] for page in sorted(pages)] for size, pages in sorted(ebay.items())},
+    }
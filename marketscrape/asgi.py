@@ -9,8 +9,20 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'marketscrape.settings')
+# Route the index page to the asynchronous pipeline, which doesn't tie up a
+# worker while the scraped pages are in flight
+os.environ.setdefault('SCRAPER_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
+
+# Requests never build the comparable index, the copy saved by rebuild_comparable_index is loaded once here.
+# The index module and its dependencies are only imported when the index is enabled and saved
+index_config = getattr(settings, 'SCRAPER_INDEX', {})
+if index_config.get('ENABLED') and index_config.get('PATH') and os.path.exists(os.path.join(index_config['PATH'], 'meta.json')):
+    from scraper.index import load_comparable_index
+
+    load_comparable_index()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -85,6 +86,34 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Holds finished analyses, use a shared backend (e.g. Redis) when running several workers
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Seconds a finished analysis is served from the cache
+SCRAPER_RESULT_CACHE_TTL = 600
+
+# Serve the index page with the asynchronous pipeline, set by marketscrape/asgi.py
+SCRAPER_ASYNC_VIEWS = os.environ.get('SCRAPER_ASYNC_VIEWS', '0') == '1'
+
+# Threads the asynchronous pipeline parses, scores and charts in, defaults to the number of CPUs
+SCRAPER_CPU_WORKERS = None
+
+# Background analyses submitted to /jobs/, kept in the database and run by a thread pool of each web process, see scraper/jobs.py
+SCRAPER_JOBS = {
+    'MAX_WORKERS': 2,
+    'MAX_PENDING': 32,
+    'TTL': 3600,
+    'STALE_AFTER': 300,
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -127,6 +156,84 @@ STATIC_ROOT = '/scraper/static/'
 
 CRISPY_TEMPLATE_PACK = 'bootstrap5'
 
+# Pooled HTTP client used for every scraped page, see scraper/client.py
+SCRAPER_HTTP_CLIENT = {
+    'POOL_CONNECTIONS': 10,
+    'POOL_MAXSIZE': 10,
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': 10.0,
+    'RETRIES': 2,
+    'BACKOFF_FACTOR': 0.3,
+    'BACKOFF_JITTER': 0.3,
+}
+
+# BeautifulSoup parser backend used for scraped pages, falls back to html.parser when not installed
+SCRAPER_HTML_PARSER = 'lxml'
+
+# Title similarity kernel, 'ratio' reproduces difflib's SequenceMatcher ratio the thresholds are tuned for
+SCRAPER_SIMILARITY_METHOD = 'ratio'
+
+# Payload of the price chart: 'compact' sends the data and the trend coefficients and lets the
+# browser build the Plotly figure, 'figure' sends the full figure JSON
+SCRAPER_CHART_FORMAT = 'compact'
+
+# Rendering of the products of the price chart: WebGL past WEBGL_THRESHOLD points, and with DOWNSAMPLE
+# a sample of at most MAX_POINTS products that keeps the extremes, the best match and the density
+SCRAPER_CHART_RENDERING = {
+    'WEBGL_THRESHOLD': 1000,
+    'DOWNSAMPLE': False,
+    'MAX_POINTS': 1000,
+}
+
+# Fit the trend line of the price chart with Tukey biweights, so that a few mispriced products don't bend it
+SCRAPER_ROBUST_TREND = False
+
+# Remove price outliers against a running estimate over the result pages received so far,
+# instead of against each page on its own
+SCRAPER_STREAMING_OUTLIERS = False
+
+# Optional on-disk cache of fetched pages shared by all workers, see scraper/page_cache.py
+SCRAPER_PAGE_CACHE = {
+    'ENABLED': False,
+    'DIR': BASE_DIR / '.page_cache',
+    'MAX_BYTES': 256 * 1024 * 1024,
+    'TTL': {
+        'default': 900,
+        'www.ebay.com': 3600,
+        'www.facebook.com': 300,
+        'm.facebook.com': 300,
+    },
+}
+
+# Limits of the batch analysis API at /api/batch/, see scraper/batch.py
+SCRAPER_BATCH = {
+    'MAX_URLS': 100,
+    'PARALLELISM': 4,
+    'MAX_PARALLELISM': 16,
+}
+
+# Database record of the analyses and their Ebay products, see scraper/store.py. Off by default, every
+# analysis writes to the database once it is on. A title searched less than MAX_AGE seconds ago is
+# served from the database instead of Ebay
+SCRAPER_STORE = {
+    'ENABLED': False,
+    'MAX_AGE': 3600,
+    'MIN_COMPARABLES': 20,
+}
+
+# In-memory token index over the stored Ebay products, see scraper/index.py. Listings without a
+# recent search of their own are served from the closest stored products seen in the last MAX_AGE seconds.
+# Off by default. The servers load the copy saved at PATH when they start, build it with:
+# python manage.py rebuild_comparable_index
+SCRAPER_INDEX = {
+    'ENABLED': False,
+    'PATH': BASE_DIR / '.comparable_index',
+    'MAX_DOCUMENTS': 5_000_000,
+    'CANDIDATES': 300,
+    'MAX_AGE': 24 * 3600,
+    'MIN_COMPARABLES': 20,
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
@@ -13,11 +13,18 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
-from scraper.views import Index
+from scraper.views import AsyncBatchAnalysis, AsyncIndex, AsyncStream, BatchAnalysis, Index, Jobs, JobStatus, Report, Stats, Stream
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('', Index.as_view(), name='index')
+    path('', (AsyncIndex if settings.SCRAPER_ASYNC_VIEWS else Index).as_view(), name='index'),
+    path('report/', Report.as_view(), name='report'),
+    path('stream/', (AsyncStream if settings.SCRAPER_ASYNC_VIEWS else Stream).as_view(), name='stream'),
+    path('jobs/', Jobs.as_view(), name='jobs'),
+    path('jobs/<str:job_id>/', JobStatus.as_view(), name='job'),
+    path('api/batch/', (AsyncBatchAnalysis if settings.SCRAPER_ASYNC_VIEWS else BatchAnalysis).as_view(), name='batch'),
+    path('stats/', Stats.as_view(), name='stats')
 ]
@@ -9,8 +9,17 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'marketscrape.settings')
 
 application = get_wsgi_application()
+
+# Requests never build the comparable index, the copy saved by rebuild_comparable_index is loaded once here.
+# The index module and its dependencies are only imported when the index is enabled and saved
+index_config = getattr(settings, 'SCRAPER_INDEX', {})
+if index_config.get('ENABLED') and index_config.get('PATH') and os.path.exists(os.path.join(index_config['PATH'], 'meta.json')):
+    from scraper.index import load_comparable_index
+
+    load_comparable_index()
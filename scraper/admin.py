@@ -1,3 +1,27 @@
 from django.contrib import admin
+from .models import Comparable, Job, Listing
 
-# Register your models here.
+class ComparableInline(admin.TabularInline):
+    model = Comparable
+    extra = 0
+    fields = ('position', 'title', 'price', 'shipping', 'country', 'condition', 'similarity')
+    readonly_fields = fields
+
+@admin.register(Listing)
+class ListingAdmin(admin.ModelAdmin):
+    list_display = ('title', 'price', 'currency', 'price_rating', 'best_price', 'total_items', 'analyzed_at')
+    search_fields = ('title', 'normalized_title', 'url')
+    date_hierarchy = 'analyzed_at'
+    inlines = [ComparableInline]
+
+@admin.register(Comparable)
+class ComparableAdmin(admin.ModelAdmin):
+    list_display = ('title', 'price', 'shipping', 'similarity', 'query', 'scraped_at')
+    search_fields = ('title', 'query')
+    list_select_related = ('listing',)
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('url', 'status', 'stage', 'worker', 'created', 'finished')
+    list_filter = ('status',)
+    search_fields = ('url', 'id')
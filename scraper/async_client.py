@@ -0,0 +1,132 @@
+import asyncio
+import random
+import weakref
+from collections import Counter
+from typing import TYPE_CHECKING
+from urllib.parse import urlsplit
+from .client import get_config
+
+if TYPE_CHECKING:
+    import httpx
+
+# One client per event loop, an httpx.AsyncClient can't be shared between loops
+_clients = weakref.WeakKeyDictionary()
+# Requests and new connections per host, reused connections are the difference
+_requests = Counter()
+_connections = Counter()
+
+def create_async_client(config: dict) -> "httpx.AsyncClient":
+    """
+    Creates an asynchronous client with the same connection pool sizes and
+    timeouts as the synchronous session.
+
+    Args:
+        config (dict): The HTTP client configuration, see client.get_config.
+
+    Returns:
+        httpx.AsyncClient: The configured client.
+    """
+
+    # Only the ASGI deployment fetches asynchronously, the other processes never import httpx
+    import httpx
+
+    limits = httpx.Limits(
+        max_connections=config["POOL_CONNECTIONS"] * config["POOL_MAXSIZE"],
+        max_keepalive_connections=config["POOL_CONNECTIONS"] * config["POOL_MAXSIZE"]
+    )
+    timeout = httpx.Timeout(config["READ_TIMEOUT"], connect=config["CONNECT_TIMEOUT"])
+
+    # httpx advertises br on its own when a brotli decoder is installed
+    return httpx.AsyncClient(limits=limits, timeout=timeout, follow_redirects=True)
+
+async def client_lifetime(client: "httpx.AsyncClient"):
+    """
+    Closes a client when its event loop shuts down. The loop finalizes the
+    asynchronous generators it has started when it shuts down, which
+    asyncio.run, asgiref and the ASGI servers all do before closing it.
+
+    Args:
+        client (httpx.AsyncClient): The client of the loop.
+    """
+
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+async def get_async_client() -> "httpx.AsyncClient":
+    """
+    Returns the client of the running event loop, creating it on first use.
+    The client is closed when the loop shuts down.
+
+    Returns:
+        httpx.AsyncClient: The shared client of the loop.
+    """
+
+    loop = asyncio.get_running_loop()
+    entry = _clients.get(loop)
+    if entry is None:
+        client = create_async_client(get_config())
+        lifetime = client_lifetime(client)
+        # Starting the generator registers it with the loop, the entry keeps it alive until then
+        await lifetime.__anext__()
+        entry = _clients[loop] = (client, lifetime)
+
+    return entry[0]
+
+async def afetch(url: str, headers: dict) -> "httpx.Response":
+    """
+    Retrieves a URL through the client of the running event loop, retrying
+    connection errors and the retryable statuses with the same jittered
+    exponential backoff as the synchronous session.
+
+    Args:
+        url (str): URL of the page to retrieve
+        headers (dict): Dictionary of headers to use in the request
+
+    Returns:
+        httpx.Response: The response of the request
+    """
+
+    import httpx
+
+    config = get_config()
+    client = await get_async_client()
+    parts = urlsplit(url)
+    host = f"{parts.scheme}://{parts.hostname}"
+
+    async def trace(event: str, info: dict):
+        # httpcore opens a connection only when the pool has no idle one for the host
+        if event == "connection.connect_tcp.complete":
+            _connections[host] += 1
+
+    for attempt in range(config["RETRIES"] + 1):
+        last = attempt == config["RETRIES"]
+        # Every attempt is a request, like urllib3 counts them
+        _requests[host] += 1
+        try:
+            response = await client.get(url, headers=headers, extensions={"trace": trace})
+            if last or response.status_code not in config["STATUS_FORCELIST"]:
+                return response
+        except httpx.TransportError:
+            if last:
+                raise
+
+        # Like urllib3, the first retry is immediate and the following ones back off exponentially
+        if attempt > 0:
+            await asyncio.sleep(config["BACKOFF_FACTOR"] * 2 ** attempt + random.uniform(0, config["BACKOFF_JITTER"]))
+
+def async_pool_stats() -> dict:
+    """
+    Returns the connection statistics of the asynchronous clients of this
+    process for every host, in the format of client.pool_stats.
+
+    Returns:
+        dict: A dictionary mapping each host to its number of requests, new
+        connections and reused connections.
+    """
+
+    return {
+        host: {"requests": count, "new": _connections[host], "reused": count - _connections[host]}
+        for host, count in _requests.items()
+    }
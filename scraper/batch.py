@@ -0,0 +1,256 @@
+import asyncio
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import AsyncIterator, Callable, Iterator
+from django.conf import settings
+from django.db import connections
+from .exceptions import ListingNotFound
+from .pipeline import acached_analysis, cached_analysis
+from .products import ProductTable
+from .shop_class import EbayScraper
+
+# Marketplace listing URLs, the desktop, mobile and tracking variants all name the same listing
+MARKETPLACE_URL = re.compile(r"^https?://(?:(?:www|m|web)\.)?facebook\.com/marketplace/item/([0-9]+)")
+
+# Defaults of the SCRAPER_BATCH setting
+DEFAULT_BATCH = {
+    # Listings a single batch may contain
+    'MAX_URLS': 100,
+    # Listings analyzed at the same time when the request doesn't say
+    'PARALLELISM': 4,
+    # Upper bound of the parallelism a request may ask for
+    'MAX_PARALLELISM': 16,
+}
+
+def get_batch_config() -> dict:
+    """
+    Returns the batch API configuration, merging the SCRAPER_BATCH setting
+    over the defaults.
+    """
+
+    return {**DEFAULT_BATCH, **getattr(settings, 'SCRAPER_BATCH', {})}
+
+class SharedEbayScraper(EbayScraper):
+    """
+    EbayScraper that searches each distinct query only once, however many
+    listings of a batch ask for it. Concurrent listings with the same query
+    wait for the first one's search and share its table of products, which
+    the rest of the pipeline only reads.
+
+    The asynchronous searches of afind_viable_product are shared the same
+    way, between the listings of a batch analyzed on one event loop.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.searches = {}
+        self.asearches = {}
+        self.shared = 0
+        # Tables of products already recorded in the store, kept alive by the searches
+        self.claimed = set()
+        self.lock = threading.Lock()
+
+    def query_key(self, title: str, ramp_down: float) -> tuple[str, float]:
+        """
+        Returns the key of an Ebay query. Ebay search ignores case and
+        repeated whitespace, and the products are scored against the
+        lowercase title, so titles that only differ in those share a key.
+        """
+
+        return ' '.join(title.lower().split()), ramp_down
+
+    def find_viable_product(self, title: str, ramp_down: float, on_page: Callable[[int, ProductTable], None] = None) -> ProductTable:
+        """
+        Finds the viable products of a query, see EbayScraper.find_viable_product.
+        Only the listing that runs the search gets its on_page calls.
+        """
+
+        key = self.query_key(title, ramp_down)
+        with self.lock:
+            future = self.searches.get(key)
+            owner = future is None
+            if owner:
+                future = self.searches[key] = Future()
+            else:
+                self.shared += 1
+
+        if owner:
+            try:
+                future.set_result(super().find_viable_product(title, ramp_down, on_page))
+            except Exception as e:
+                future.set_exception(e)
+
+        return future.result()
+
+    async def afind_viable_product(self, title: str, ramp_down: float, on_page: Callable[[int, ProductTable], None] = None) -> ProductTable:
+        """
+        Asynchronous version of find_viable_product. The search runs as a
+        task of its own, so a listing that is cancelled doesn't cancel it
+        for the listings waiting on it.
+        """
+
+        key = self.query_key(title, ramp_down)
+        task = self.asearches.get(key)
+        if task is None:
+            task = self.asearches[key] = asyncio.ensure_future(super().afind_viable_product(title, ramp_down, on_page))
+        else:
+            with self.lock:
+                self.shared += 1
+
+        return await asyncio.shield(task)
+
+    def claim_products(self, products: ProductTable) -> bool:
+        """
+        Only the first listing of the batch that records a shared table of
+        products stores it, see EbayScraper.claim_products.
+        """
+
+        with self.lock:
+            if id(products) in self.claimed:
+                return False
+            self.claimed.add(id(products))
+
+        return True
+
+def canonicalize_urls(urls: list) -> tuple[list[str], list[dict]]:
+    """
+    Validates and canonicalizes the URLs of a batch, keeping the first
+    occurrence of every listing.
+
+    Args:
+        urls (list): The URLs of the batch, as sent by the client.
+
+    Returns:
+        tuple[list[str], list[dict]]: The distinct canonical URLs, and the
+        result lines of the URLs that aren't valid.
+    """
+
+    canonical, invalid = {}, []
+
+    for url in urls:
+        match = MARKETPLACE_URL.match(url.strip()) if isinstance(url, str) else None
+        if match is None:
+            invalid.append({'url': url, 'result': None, 'error': "Not a Marketplace listing URL."})
+            continue
+        # Matches what shorten_url makes of the desktop URL, so batches share the result cache with the site
+        canonical.setdefault(f"https://www.facebook.com/marketplace/item/{match.group(1)}", url)
+
+    return list(canonical), invalid
+
+def batch_result(url: str, context: dict, charts: bool) -> dict:
+    """
+    Returns the result line of an analyzed listing of a batch.
+
+    Args:
+        url (str): The canonical URL of the listing.
+        context (dict): The context of its report.
+        charts (bool): Whether to include the charts in the result.
+    """
+
+    if not charts:
+        context = {key: value for key, value in context.items() if key not in ('chart', 'chart_rendering', 'bargraph')}
+
+    return {'url': url, 'result': context, 'error': None}
+
+def batch_failure(url: str, error: Exception) -> dict:
+    """
+    Returns the result line of a listing of a batch whose analysis failed.
+    """
+
+    if isinstance(error, ListingNotFound):
+        return {'url': url, 'result': None, 'error': "The listing doesn't exist anymore."}
+
+    return {'url': url, 'result': None, 'error': f"{type(error).__name__}: {error}"}
+
+def analyze_batch(urls: list, parallelism: int = None, refresh: bool = False, charts: bool = False) -> Iterator[dict]:
+    """
+    Analyzes a batch of Marketplace listings concurrently and yields the
+    result of each one as soon as it is done.
+
+    Args:
+        urls (list): The URLs of the listings.
+        parallelism (int): The number of listings analyzed at the same time,
+            capped by the MAX_PARALLELISM of the SCRAPER_BATCH setting.
+        refresh (bool): Whether to run the analyses even if they are cached.
+        charts (bool): Whether to include the charts in the results.
+
+    Returns:
+        Iterator[dict]: One line per distinct listing, in completion order,
+        with the canonical URL of the listing, the context of its report or
+        None, and the reason it failed or None.
+    """
+
+    config = get_batch_config()
+    parallelism = max(1, min(parallelism or config['PARALLELISM'], config['MAX_PARALLELISM']))
+
+    shortened_urls, invalid = canonicalize_urls(urls)
+    yield from invalid
+
+    if not shortened_urls:
+        return
+
+    shopping_instance = SharedEbayScraper()
+
+    def analyze(url: str) -> dict:
+        try:
+            return batch_result(url, cached_analysis(url, refresh, shopping_instance=shopping_instance), charts)
+        except Exception as e:
+            return batch_failure(url, e)
+        finally:
+            # Database connections are per thread, don't leave this worker's open
+            connections.close_all()
+
+    executor = ThreadPoolExecutor(max_workers=min(parallelism, len(shortened_urls)), thread_name_prefix='scraper-batch')
+    try:
+        for future in as_completed([executor.submit(analyze, url) for url in shortened_urls]):
+            yield future.result()
+    finally:
+        # A client that disconnects cancels the listings that haven't started
+        executor.shutdown(wait=False, cancel_futures=True)
+
+async def aanalyze_batch(urls: list, parallelism: int = None, refresh: bool = False, charts: bool = False) -> AsyncIterator[dict]:
+    """
+    Asynchronous version of analyze_batch: the listings are analyzed as
+    tasks of the event loop with acached_analysis, at most parallelism of
+    them at a time.
+
+    Args:
+        urls (list): The URLs of the listings.
+        parallelism (int): The number of listings analyzed at the same time,
+            capped by the MAX_PARALLELISM of the SCRAPER_BATCH setting.
+        refresh (bool): Whether to run the analyses even if they are cached.
+        charts (bool): Whether to include the charts in the results.
+
+    Returns:
+        AsyncIterator[dict]: One line per distinct listing, see analyze_batch.
+    """
+
+    config = get_batch_config()
+    parallelism = max(1, min(parallelism or config['PARALLELISM'], config['MAX_PARALLELISM']))
+
+    shortened_urls, invalid = canonicalize_urls(urls)
+    for line in invalid:
+        yield line
+
+    if not shortened_urls:
+        return
+
+    shopping_instance = SharedEbayScraper()
+    slots = asyncio.Semaphore(parallelism)
+
+    async def analyze(url: str) -> dict:
+        async with slots:
+            try:
+                return batch_result(url, await acached_analysis(url, refresh, shopping_instance=shopping_instance), charts)
+            except Exception as e:
+                return batch_failure(url, e)
+
+    tasks = [asyncio.ensure_future(analyze(url)) for url in shortened_urls]
+    try:
+        for next_line in asyncio.as_completed(tasks):
+            yield await next_line
+    finally:
+        # A client that disconnects cancels the listings that haven't finished
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,193 @@
+import os
+import random
+import threading
+from functools import lru_cache
+from typing import TYPE_CHECKING
+from .exceptions import FetchCancelled
+from django.conf import settings
+
+if TYPE_CHECKING:
+    import requests
+
+# Defaults for the SCRAPER_HTTP_CLIENT setting
+DEFAULT_HTTP_CLIENT = {
+    # Number of hosts whose connection pools are kept alive
+    "POOL_CONNECTIONS": 10,
+    # Number of keep-alive connections kept per host
+    "POOL_MAXSIZE": 10,
+    "CONNECT_TIMEOUT": 3.05,
+    "READ_TIMEOUT": 10.0,
+    "RETRIES": 2,
+    "BACKOFF_FACTOR": 0.3,
+    # Upper bound of the random delay added to every backoff, in seconds
+    "BACKOFF_JITTER": 0.3,
+    "STATUS_FORCELIST": (429, 500, 502, 503, 504),
+}
+
+_lock = threading.Lock()
+_session = None
+_session_pid = None
+
+@lru_cache(maxsize=None)
+def jittered_retry_class() -> type:
+    """
+    Returns the retry policy of the session, defined on first use so that
+    urllib3 is only imported by the processes that fetch pages.
+
+    Returns:
+        type: The Retry subclass that adds a random jitter to every
+        exponential backoff.
+    """
+
+    from urllib3.util import Retry
+
+    class JitteredRetry(Retry):
+        """Retry policy that adds a random jitter to every exponential backoff."""
+
+        def __init__(self, *args, backoff_jitter: float = 0.0, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.backoff_jitter = backoff_jitter
+
+        def new(self, **kw):
+            kw.setdefault("backoff_jitter", self.backoff_jitter)
+            return super().new(**kw)
+
+        def get_backoff_time(self) -> float:
+            backoff = super().get_backoff_time()
+            if backoff <= 0:
+                return 0
+
+            return backoff + random.uniform(0, self.backoff_jitter)
+
+    return JitteredRetry
+
+def get_config() -> dict:
+    """
+    Returns the HTTP client configuration, merging the SCRAPER_HTTP_CLIENT
+    setting over the defaults.
+
+    Returns:
+        dict: The HTTP client configuration.
+    """
+
+    return {**DEFAULT_HTTP_CLIENT, **getattr(settings, "SCRAPER_HTTP_CLIENT", {})}
+
+def create_session(config: dict) -> "requests.Session":
+    """
+    Creates a session with pooled keep-alive connections, a bounded retry
+    policy and compression negotiation.
+
+    Args:
+        config (dict): The HTTP client configuration.
+
+    Returns:
+        requests.Session: The configured session.
+    """
+
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util import make_headers
+
+    retry = jittered_retry_class()(
+        total=config["RETRIES"],
+        backoff_factor=config["BACKOFF_FACTOR"],
+        backoff_jitter=config["BACKOFF_JITTER"],
+        status_forcelist=config["STATUS_FORCELIST"],
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=config["POOL_CONNECTIONS"],
+        pool_maxsize=config["POOL_MAXSIZE"],
+        max_retries=retry
+    )
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    # Advertises br only when a brotli decoder is installed
+    session.headers["Accept-Encoding"] = make_headers(accept_encoding=True)["accept-encoding"]
+
+    return session
+
+def get_session() -> "requests.Session":
+    """
+    Returns the process-wide session, creating it on first use and again
+    after a fork so that workers never share sockets with their parent.
+
+    Returns:
+        requests.Session: The shared session.
+    """
+
+    global _session, _session_pid
+
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _lock:
+            if _session is None or _session_pid != pid:
+                _session = create_session(get_config())
+                _session_pid = pid
+
+    return _session
+
+def fetch(url: str, headers: dict, cancel: threading.Event = None) -> "requests.Response":
+    """
+    Retrieves a URL through the shared session.
+
+    Args:
+        url (str): URL of the page to retrieve
+        headers (dict): Dictionary of headers to use in the request
+        cancel (threading.Event): Optional event that aborts the download
+            between chunks once it is set
+
+    Returns:
+        requests.Response: The response of the request
+    """
+
+    config = get_config()
+    timeout = (config["CONNECT_TIMEOUT"], config["READ_TIMEOUT"])
+
+    if cancel is None:
+        return get_session().get(url, headers=headers, timeout=timeout)
+
+    if cancel.is_set():
+        raise FetchCancelled(url)
+
+    response = get_session().get(url, headers=headers, timeout=timeout, stream=True)
+    chunks = []
+    for chunk in response.iter_content(chunk_size=64 * 1024):
+        if cancel.is_set():
+            # Closing the streamed response drops the connection instead of
+            # returning it to the pool with an unread body
+            response.close()
+            raise FetchCancelled(url)
+        chunks.append(chunk)
+
+    response._content = b"".join(chunks)
+
+    return response
+
+def pool_stats() -> dict:
+    """
+    Returns the connection pool statistics of every host the shared session
+    currently keeps a pool for.
+
+    Returns:
+        dict: A dictionary mapping each host to its number of requests, new
+        connections and reused connections.
+    """
+
+    stats = {}
+    if _session is None or _session_pid != os.getpid():
+        return stats
+
+    for adapter in set(_session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            host = stats.setdefault(f"{key.key_scheme}://{key.key_host}", {"requests": 0, "new": 0, "reused": 0})
+            host["requests"] += pool.num_requests
+            host["new"] += pool.num_connections
+            host["reused"] += pool.num_requests - pool.num_connections
+
+    return stats
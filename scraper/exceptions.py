@@ -9,3 +9,15 @@ class InvalidSimilarityThreshold(Exception):
 class InvalidDataFormat(Exception):
     """Raised when the data format is invalid or does not match the expected format."""
     pass
+
+class ListingNotFound(Exception):
+    """Raised when the Marketplace listing no longer exists."""
+    pass
+
+class FetchCancelled(Exception):
+    """Raised when a pending page fetch is cancelled before it completes."""
+    pass
+
+class JobQueueFull(Exception):
+    """Raised when too many analyses are waiting for a worker to accept another one."""
+    pass
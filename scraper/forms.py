@@ -5,4 +5,7 @@ class MarketForm(forms.Form):
         'class': 'form-control',
         'placeholder': 'Enter a Facebook Marketplace URL...',
         'autocomplete': 'off'
-    }))
\ No newline at end of file
+    }))
+    refresh = forms.BooleanField(label='Force refresh', required=False, widget=forms.CheckboxInput(attrs={
+        'class': 'form-check-input'
+    }))
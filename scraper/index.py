@@ -0,0 +1,489 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from array import array
+from datetime import timedelta
+from pathlib import Path
+from typing import Iterable
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+from .models import Comparable
+from .products import ProductTable
+from .similarity import normalize_title
+
+# Defaults of the SCRAPER_INDEX setting
+DEFAULT_INDEX = {
+    # Look up the Ebay products of a listing in the index before searching Ebay
+    'ENABLED': False,
+    # Directory the rebuild_comparable_index command saves the index to, loaded memory-mapped when the server starts
+    'PATH': None,
+    # Distinct titles kept in the index, the oldest are evicted beyond it
+    'MAX_DOCUMENTS': 5_000_000,
+    # Products retrieved from the index for the similarity scoring to rank
+    'CANDIDATES': 300,
+    # Seconds a stored product stays a valid comparable
+    'MAX_AGE': 7 * 24 * 3600,
+    # Fewest similar products worth serving an analysis from
+    'MIN_COMPARABLES': 20,
+}
+
+# Eviction trims the index down to this fraction of MAX_DOCUMENTS so that it
+# doesn't run again on the very next insert
+LOW_WATERMARK = 0.9
+
+# Postings added since the last compaction after which they are merged into
+# the contiguous arrays, which are faster to search
+DELTA_LIMIT = 1_000_000
+
+# Postings scored per search, the tokens of a title are scored from the
+# rarest and the most common ones are skipped past it
+MAX_POSTINGS = 500_000
+
+# Postings of the rarest tokens of a title whose documents are the
+# candidates, the more common tokens only add to the scores of those
+CANDIDATE_POSTINGS = 100_000
+
+logger = logging.getLogger(__name__)
+
+_index = None
+
+def title_key(title: str) -> int:
+    """
+    Returns a stable 64-bit key of a normalized title, the same in every
+    process.
+    """
+
+    return int.from_bytes(hashlib.blake2b(title.encode(), digest_size=8).digest(), 'little', signed=True)
+
+class ComparableIndex:
+    """
+    Inverted index from the tokens of normalized Ebay titles to the stored
+    products that have them.
+
+    Every distinct title is one document, pointing at the most recent
+    Comparable seen with it. The postings of each token are kept in one
+    contiguous array (memory-mapped when the index is loaded from disk),
+    plus the postings inserted since, which are merged in by compaction.
+    Documents are numbered in the order their title was first seen, and the
+    oldest are evicted once the index grows past its size bound.
+    """
+
+    def __init__(self, max_documents: int = DEFAULT_INDEX['MAX_DOCUMENTS']):
+        self.max_documents = max_documents
+
+        self.tokens = {}
+        # Postings of the token ids below len(offsets) - 1: postings[offsets[t]:offsets[t + 1]]
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.postings = np.empty(0, dtype=np.int32)
+        # Postings inserted since the last compaction, per token id
+        self.delta = {}
+        self.delta_size = 0
+
+        # Per document: the id of its Comparable, the length of its title and the key of its title
+        self.comparables = array('q')
+        self.lengths = array('H')
+        self.hashes = array('q')
+        self.keys = {}
+
+        # Largest Comparable id inserted, new products are read from the database after it
+        self.last_id = 0
+
+        self.lock = threading.RLock()
+        # Held while reading new products from the database, which searches don't wait for
+        self.catch_up = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.comparables)
+
+    def add(self, comparable_id: int, title: str) -> None:
+        """
+        Inserts a stored product. A title that is already indexed only points
+        its document at the newer product.
+
+        Args:
+            comparable_id (int): The id of the Comparable.
+            title (str): The normalized title of the product.
+        """
+
+        self.add_many([(comparable_id, title)])
+
+    def add_many(self, products: Iterable[tuple[int, str]]) -> None:
+        """
+        Inserts stored products, see add. Evicts the oldest documents when the
+        index grows past its size bound.
+
+        Args:
+            products (Iterable): The id and normalized title of each product,
+                in increasing id order. The products up to the last one
+                inserted are skipped.
+        """
+
+        with self.lock:
+            for comparable_id, title in products:
+                if comparable_id <= self.last_id:
+                    continue
+                self.last_id = comparable_id
+
+                key = title_key(title)
+                document = self.keys.get(key)
+                if document is not None:
+                    self.comparables[document] = comparable_id
+                    continue
+
+                document = len(self.comparables)
+                tokens = dict.fromkeys(title.split())
+                for token in tokens:
+                    token_id = self.tokens.setdefault(token, len(self.tokens))
+                    postings = self.delta.get(token_id)
+                    if postings is None:
+                        postings = self.delta[token_id] = array('i')
+                    postings.append(document)
+
+                self.keys[key] = document
+                self.comparables.append(comparable_id)
+                self.lengths.append(min(len(title), 65535))
+                self.hashes.append(key)
+                self.delta_size += len(tokens)
+
+            if len(self.comparables) > self.max_documents:
+                self.compact(len(self.comparables) - int(self.max_documents * LOW_WATERMARK))
+            elif self.delta_size > DELTA_LIMIT:
+                self.compact()
+
+    def token_postings(self, token_id: int) -> np.ndarray:
+        """
+        Returns the documents that have a token, in increasing order.
+        """
+
+        if token_id < len(self.offsets) - 1:
+            base = self.postings[self.offsets[token_id]:self.offsets[token_id + 1]]
+        else:
+            base = self.postings[:0]
+
+        delta = self.delta.get(token_id)
+        if not delta:
+            return base
+
+        return np.concatenate([base, np.array(delta, dtype=np.int32)])
+
+    def search(self, title: str, limit: int) -> list[tuple[int, float]]:
+        """
+        Retrieves the stored products whose titles share the most with a
+        title. Candidates are ranked by the Dice coefficient of the characters
+        of the tokens they share, which follows the SequenceMatcher ratio the
+        similarity scoring ranks them by afterwards: twice the length of the
+        shared tokens over the length of both titles.
+
+        Args:
+            title (str): The title to look up.
+            limit (int): The number of products to retrieve.
+
+        Returns:
+            list[tuple[int, float]]: The Comparable id and the score of each
+            product, best first.
+        """
+
+        title = normalize_title(title)
+
+        with self.lock:
+            documents = len(self.comparables)
+            terms = [(token, self.tokens[token]) for token in dict.fromkeys(title.split()) if token in self.tokens]
+            if not documents or not terms or limit <= 0:
+                return []
+
+            postings = sorted(((len(token) + 1, self.token_postings(term)) for token, term in terms), key=lambda term: len(term[1]))
+
+            scores = np.zeros(documents, dtype=np.float32)
+            scored = 0
+            matches = None
+            for i, (weight, documents_with_term) in enumerate(postings):
+                if i and matches is None and scored + len(documents_with_term) > CANDIDATE_POSTINGS:
+                    matches = np.flatnonzero(scores > 0)
+                if i and scored + len(documents_with_term) > MAX_POSTINGS:
+                    break
+                # A document has each token at most once, so the postings of a token never repeat
+                scores[documents_with_term] += weight
+                scored += len(documents_with_term)
+
+            if matches is None:
+                matches = np.flatnonzero(scores > 0)
+            lengths = np.frombuffer(self.lengths, dtype=np.uint16)[matches].astype(np.float32)
+            comparables = np.frombuffer(self.comparables, dtype=np.int64)[matches]
+
+        scores = 2 * scores[matches] / (lengths + len(title) + 1)
+
+        if len(scores) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+
+        return list(zip(comparables[top].tolist(), scores[top].tolist()))
+
+    def compact(self, start: int = 0) -> None:
+        """
+        Merges the postings inserted since the last compaction into the
+        contiguous arrays, dropping the documents before start and the
+        tokens no document has anymore.
+
+        Args:
+            start (int): The first document to keep.
+        """
+
+        with self.lock:
+            base_tokens = np.repeat(np.arange(len(self.offsets) - 1, dtype=np.int64), np.diff(self.offsets))
+            delta_ids = list(self.delta)
+            delta_tokens = np.repeat(np.array(delta_ids, dtype=np.int64), [len(self.delta[token_id]) for token_id in delta_ids])
+            delta_postings = np.concatenate([np.array(self.delta[token_id], dtype=np.int32) for token_id in delta_ids]) if delta_ids else np.empty(0, dtype=np.int32)
+
+            tokens = np.concatenate([base_tokens, delta_tokens])
+            postings = np.concatenate([np.asarray(self.postings), delta_postings])
+
+            kept = postings >= start
+            tokens, postings = tokens[kept], postings[kept] - start
+
+            # Documents of a token were inserted in increasing order, the base ones before the delta ones
+            order = np.argsort(tokens, kind='stable')
+            tokens, postings = tokens[order], postings[order]
+
+            counts = np.bincount(tokens, minlength=len(self.tokens))
+            used = counts > 0
+            # Token ids follow the order of the vocabulary, so the kept tokens are renumbered by keeping that order
+            vocabulary = [token for token, token_id in self.tokens.items() if used[token_id]]
+
+            self.tokens = {token: i for i, token in enumerate(vocabulary)}
+            self.offsets = np.concatenate([[0], np.cumsum(counts[used])]).astype(np.int64)
+            self.postings = postings.astype(np.int32)
+            self.delta = {}
+            self.delta_size = 0
+
+            if start:
+                self.comparables = self.comparables[start:]
+                self.lengths = self.lengths[start:]
+                self.hashes = self.hashes[start:]
+                self.keys = dict(zip(self.hashes, range(len(self.hashes))))
+
+    def save(self, directory: Path) -> None:
+        """
+        Compacts the index and saves it to a directory, replacing the index
+        saved there before only once the new one is complete.
+
+        Args:
+            directory (Path): The directory of the index.
+        """
+
+        directory = Path(directory)
+        temporary = directory.with_name(f"{directory.name}.tmp-{os.getpid()}")
+        shutil.rmtree(temporary, ignore_errors=True)
+        temporary.mkdir(parents=True)
+
+        with self.lock:
+            self.compact()
+            np.save(temporary / 'offsets.npy', self.offsets)
+            np.save(temporary / 'postings.npy', self.postings)
+            np.save(temporary / 'comparables.npy', np.frombuffer(self.comparables, dtype=np.int64))
+            np.save(temporary / 'lengths.npy', np.frombuffer(self.lengths, dtype=np.uint16))
+            np.save(temporary / 'hashes.npy', np.frombuffer(self.hashes, dtype=np.int64))
+            (temporary / 'tokens.json').write_text(json.dumps(list(self.tokens)), encoding='utf-8')
+            (temporary / 'meta.json').write_text(json.dumps({
+                'documents': len(self.comparables),
+                'last_id': self.last_id,
+            }), encoding='utf-8')
+
+        previous = directory.with_name(f"{directory.name}.old-{os.getpid()}")
+        if directory.exists():
+            os.replace(directory, previous)
+        os.replace(temporary, directory)
+        shutil.rmtree(previous, ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory: Path, max_documents: int = DEFAULT_INDEX['MAX_DOCUMENTS']) -> "ComparableIndex":
+        """
+        Loads an index saved by save. The postings are memory-mapped, so the
+        processes of a server share a single copy of them.
+
+        Args:
+            directory (Path): The directory of the index.
+            max_documents (int): The size bound of the index.
+
+        Returns:
+            ComparableIndex: The index.
+        """
+
+        directory = Path(directory)
+        meta = json.loads((directory / 'meta.json').read_text(encoding='utf-8'))
+
+        index = cls(max_documents)
+        index.tokens = {token: i for i, token in enumerate(json.loads((directory / 'tokens.json').read_text(encoding='utf-8')))}
+        index.offsets = np.load(directory / 'offsets.npy', mmap_mode='r')
+        index.postings = np.load(directory / 'postings.npy', mmap_mode='r')
+        index.comparables = array('q', np.load(directory / 'comparables.npy').tobytes())
+        index.lengths = array('H', np.load(directory / 'lengths.npy').tobytes())
+        index.hashes = array('q', np.load(directory / 'hashes.npy').tobytes())
+        index.keys = dict(zip(index.hashes, range(len(index.hashes))))
+        index.last_id = meta['last_id']
+
+        return index
+
+    def stats(self) -> dict:
+        """
+        Returns the size of the index.
+        """
+
+        with self.lock:
+            return {
+                'documents': len(self.comparables),
+                'max_documents': self.max_documents,
+                'tokens': len(self.tokens),
+                'postings': len(self.postings) + self.delta_size,
+                'pending_postings': self.delta_size,
+                'last_id': self.last_id,
+                'bytes': int(self.offsets.nbytes + self.postings.nbytes) + 4 * self.delta_size + 18 * len(self.comparables)
+            }
+
+def get_index_config() -> dict:
+    """
+    Returns the index configuration, merging the SCRAPER_INDEX setting over
+    the defaults.
+    """
+
+    return {**DEFAULT_INDEX, **getattr(settings, 'SCRAPER_INDEX', {})}
+
+def build_index(batch_size: int = 10000, max_documents: int = None) -> ComparableIndex:
+    """
+    Builds an index of every stored product, reading them in id order.
+
+    Args:
+        batch_size (int): The number of products read from the database at once.
+        max_documents (int): The size bound of the index, the configured one
+            by default.
+
+    Returns:
+        ComparableIndex: The index.
+    """
+
+    index = ComparableIndex(max_documents or get_index_config()['MAX_DOCUMENTS'])
+    index_new_comparables(index, batch_size)
+    index.compact()
+
+    return index
+
+def index_new_comparables(index: ComparableIndex, batch_size: int = 10000) -> int:
+    """
+    Inserts the products stored since the last one the index has.
+
+    Args:
+        index (ComparableIndex): The index.
+        batch_size (int): The number of products read from the database at once.
+
+    Returns:
+        int: The number of products inserted.
+    """
+
+    inserted = 0
+    # Threads catching up at the same time would read the same products, searches only wait for each insert
+    with index.catch_up:
+        while True:
+            rows = list(
+                Comparable.objects.filter(id__gt=index.last_id).order_by('id').values_list('id', 'normalized_title')[:batch_size]
+            )
+            if not rows:
+                return inserted
+            index.add_many(rows)
+            inserted += len(rows)
+
+def load_comparable_index() -> ComparableIndex:
+    """
+    Loads the index saved by the rebuild_comparable_index command as the
+    index of this process, when the SCRAPER_INDEX setting enables it. Called
+    once when the server starts, requests never load or build the index.
+
+    Returns:
+        ComparableIndex: The index, or None when it is disabled or has not
+        been saved yet.
+    """
+
+    global _index
+
+    config = get_index_config()
+    if not config['ENABLED']:
+        return None
+
+    path = config['PATH'] and Path(config['PATH'])
+    if not path or not (path / 'meta.json').exists():
+        logger.warning("The comparable index is enabled but wasn't saved, run manage.py rebuild_comparable_index and restart the server to use it.")
+        return None
+
+    _index = ComparableIndex.load(path, config['MAX_DOCUMENTS'])
+
+    return _index
+
+def get_comparable_index() -> ComparableIndex:
+    """
+    Returns the process-wide index configured by the SCRAPER_INDEX setting.
+
+    Returns:
+        ComparableIndex: The index, or None when it is disabled or wasn't
+        loaded when the server started.
+    """
+
+    return _index if get_index_config()['ENABLED'] else None
+
+def candidate_comparables(title: str) -> ProductTable:
+    """
+    Retrieves the stored products that are the closest candidates for a
+    title from the index, without their similarity scores, which the
+    EbayScraper computes like for a result page.
+
+    Args:
+        title (str): The title of the Marketplace listing.
+
+    Returns:
+        ProductTable: The candidates seen in the last MAX_AGE seconds, best
+        match first, or None when the index is disabled or not loaded.
+    """
+
+    index = get_comparable_index()
+    if index is None:
+        return None
+
+    config = get_index_config()
+    ids = [comparable_id for comparable_id, _ in index.search(title, config['CANDIDATES'])]
+    if not ids:
+        return ProductTable.empty()
+
+    rows = Comparable.objects.filter(
+        id__in=ids, scraped_at__gte=timezone.now() - timedelta(seconds=config['MAX_AGE'])
+    ).values_list('id', 'title', 'price', 'shipping', 'country', 'condition')
+    rows = {row[0]: row[1:] for row in rows}
+
+    ranked = [rows[comparable_id] for comparable_id in ids if comparable_id in rows]
+    if not ranked:
+        return ProductTable.empty()
+
+    titles, prices, shipping, countries, conditions = zip(*ranked)
+
+    return ProductTable(titles, prices, shipping, countries, conditions)
+
+def update_comparable_index() -> None:
+    """
+    Inserts the newly stored products into the index of this process, if it
+    is loaded. Runs once the products are committed, and inserts the products
+    the other processes stored since as well, so every process catches up
+    when it next stores products.
+    """
+
+    if _index is not None:
+        index_new_comparables(_index)
+
+def comparable_index_stats() -> dict:
+    """
+    Returns the size of the index, or an empty dictionary when it is disabled
+    or not loaded yet.
+    """
+
+    return _index.stats() if _index is not None and get_index_config()['ENABLED'] else {}
@@ -0,0 +1,271 @@
+import datetime
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.models import Count, Q
+from django.utils import timezone
+from .exceptions import ListingNotFound, JobQueueFull
+from .models import Job
+from .pipeline import cached_analysis
+
+# Defaults of the SCRAPER_JOBS setting
+DEFAULT_JOBS = {
+    # Analyses running at the same time, each one also fetches its Ebay pages concurrently
+    'MAX_WORKERS': 2,
+    # Jobs waiting for a worker before new submissions are refused
+    'MAX_PENDING': 32,
+    # Seconds a finished job can still be polled
+    'TTL': 3600,
+    # Seconds without a heartbeat after which a running job is taken to have lost its worker and is queued again, workers beat every third of it
+    'STALE_AFTER': 300,
+}
+
+class JobQueue:
+    """
+    Runs analyses in a bounded pool of worker threads of the web process,
+    so a request only has to submit a job and the client polls for its
+    result. No broker is needed: the jobs are kept in the database, so the
+    poll can reach any worker process, and every process with a free thread
+    takes the oldest queued job, including the jobs left queued by a
+    process that stopped. Every process keeps the jobs it runs alive with a
+    heartbeat, a running job is queued again once its worker process has
+    exited, or its heartbeat is STALE_AFTER seconds old.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, ttl: float, stale_after: float):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.stale_after = stale_after
+        self.host = socket.gethostname()
+        self.worker = f"{self.host}:{os.getpid()}"
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scraper-job')
+        self.stopped = threading.Event()
+
+        threading.Thread(target=self.heartbeat, name='scraper-job-heartbeat', daemon=True).start()
+
+        # Take over the jobs that were waiting when the previous worker processes stopped
+        self.executor.submit(self.drain)
+
+    def submit(self, url: str, refresh: bool = False) -> Job:
+        """
+        Queues the analysis of a listing.
+
+        Args:
+            url: The URL of the Marketplace listing.
+            refresh: Whether to run the analysis even if it is cached.
+
+        Returns:
+            Job: The queued job.
+
+        Raises:
+            JobQueueFull: If too many jobs are already waiting for a worker.
+        """
+
+        self.prune()
+
+        pending = Job.objects.filter(status='queued').count()
+        if pending >= self.max_pending:
+            raise JobQueueFull(f"{pending} analyses are already waiting, try again later.")
+
+        job = Job.objects.create(url=url, refresh=refresh)
+        self.executor.submit(self.drain)
+
+        return job
+
+    def get(self, job_id: str) -> Job:
+        """
+        Returns a job by its id, or None when it doesn't exist or expired.
+        """
+
+        return Job.objects.filter(id=job_id).first()
+
+    def claim(self) -> Job:
+        """
+        Marks the oldest queued job as running in this process. The update
+        only succeeds for one of the processes claiming a job at the same
+        time, the others try the next one.
+
+        Returns:
+            Job: The claimed job, or None when no job is queued.
+        """
+
+        for job_id in Job.objects.filter(status='queued').order_by('created').values_list('id', flat=True)[:self.max_workers + 1]:
+            if Job.objects.filter(id=job_id, status='queued').update(status='running', worker=self.worker, updated=timezone.now()):
+                return Job.objects.get(id=job_id)
+
+        return None
+
+    def drain(self) -> None:
+        """
+        Runs queued jobs in a worker thread until none is left.
+        """
+
+        try:
+            while (job := self.claim()) is not None:
+                self.run(job)
+        finally:
+            # Database connections are per thread, don't leave this worker's open
+            connections.close_all()
+
+    def run(self, job: Job) -> None:
+        """
+        Runs the analysis of a claimed job, recording every stage the
+        pipeline reports.
+
+        Args:
+            job: The job to run.
+        """
+
+        lock = threading.Lock()
+
+        def progress(stage: str, data: dict) -> None:
+            with lock:
+                job.stage = stage
+                if stage == 'page':
+                    job.pages_total = data['pages']
+                    job.pages_done.append(data['page'])
+                self.running(job).update(stage=job.stage, pages_total=job.pages_total, pages_done=job.pages_done, updated=timezone.now())
+
+        try:
+            self.finish(job, 'done', result=cached_analysis(job.url, job.refresh, progress))
+        except ListingNotFound:
+            self.finish(job, 'missing', error="The listing doesn't exist anymore.")
+        except Exception as e:
+            self.finish(job, 'failed', error=f"{type(e).__name__}: {e}")
+
+    def finish(self, job: Job, status: str, result: dict = None, error: str = None) -> None:
+        """
+        Marks a job as finished.
+
+        Args:
+            job: The job.
+            status: The final status of the job.
+            result: The context of the analysis report.
+            error: The reason the job failed.
+        """
+
+        now = timezone.now()
+        self.running(job).update(status=status, result=result, error=error, updated=now, finished=now)
+
+    def running(self, job: Job):
+        """
+        Selects a job only while this process is still the one running it.
+        A job queued again because its worker was taken for gone may be
+        claimed by another worker, the run that lost it mustn't overwrite
+        that worker's progress or result.
+        """
+
+        return Job.objects.filter(id=job.id, status='running', worker=self.worker)
+
+    def heartbeat(self) -> None:
+        """
+        Refreshes the updated time of the jobs this process runs, every third
+        of STALE_AFTER until the queue is shut down, so that a job whose
+        analysis reports no progress for a while isn't queued again while
+        its worker is alive.
+        """
+
+        while not self.stopped.wait(self.stale_after / 3):
+            try:
+                Job.objects.filter(status='running', worker=self.worker).update(updated=timezone.now())
+            except DatabaseError:
+                # Beat again next time, the jobs only go stale after three missed beats
+                pass
+            finally:
+                connections.close_all()
+
+    def prune(self) -> None:
+        """
+        Forgets the jobs that finished more than the TTL ago, and queues
+        again the running jobs whose worker is gone: a process of this host
+        that exited, or any worker that missed its heartbeats for
+        STALE_AFTER seconds.
+        """
+
+        now = timezone.now()
+        Job.objects.filter(finished__lt=now - datetime.timedelta(seconds=self.ttl)).delete()
+
+        lost = Q(updated__lt=now - datetime.timedelta(seconds=self.stale_after))
+        if os.name == 'posix':
+            workers = Job.objects.filter(status='running', worker__startswith=f"{self.host}:").exclude(worker=self.worker).values_list('worker', flat=True).distinct()
+            exited = [worker for worker in workers if not process_exists(int(worker.rpartition(':')[2]))]
+            if exited:
+                lost |= Q(worker__in=exited)
+
+        requeued = Job.objects.filter(lost, status='running').update(
+            status='queued', worker='', stage=None, pages_total=0, pages_done=[], updated=now
+        )
+        if requeued:
+            self.executor.submit(self.drain)
+
+    def shutdown(self) -> None:
+        """
+        Stops the heartbeat and the worker threads, the jobs they were running
+        are queued again by another worker once their heartbeat is stale.
+        """
+
+        self.stopped.set()
+        self.executor.shutdown()
+
+    def stats(self) -> dict:
+        """
+        Returns the number of jobs in each status.
+        """
+
+        counts = dict.fromkeys(Job.STATUSES, 0)
+        counts.update(Job.objects.values_list('status').annotate(count=Count('id')).order_by())
+
+        return {'max_workers': self.max_workers, 'max_pending': self.max_pending, **counts}
+
+def process_exists(pid: int) -> bool:
+    """
+    Tells whether a process of this host is still running.
+    """
+
+    try:
+        # Signal 0 only checks that the process can be signalled
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # It exists but belongs to another user
+        return True
+
+    return True
+
+_queue = None
+_queue_pid = None
+_lock = threading.Lock()
+
+def get_job_queue() -> JobQueue:
+    """
+    Returns the job queue of the current process, configured by the
+    SCRAPER_JOBS setting. Worker threads don't survive a fork, so a forked
+    worker process starts its own pool of them, the jobs themselves are
+    shared through the database.
+
+    Returns:
+        JobQueue: The job queue.
+    """
+
+    global _queue, _queue_pid
+
+    if _queue is None or _queue_pid != os.getpid():
+        with _lock:
+            if _queue is None or _queue_pid != os.getpid():
+                config = {**DEFAULT_JOBS, **getattr(settings, 'SCRAPER_JOBS', {})}
+                _queue = JobQueue(config['MAX_WORKERS'], config['MAX_PENDING'], config['TTL'], config['STALE_AFTER'])
+                _queue_pid = os.getpid()
+
+    return _queue
+
+def job_queue_stats() -> dict:
+    """
+    Returns the counters of the jobs of every worker process.
+    """
+
+    return get_job_queue().stats()
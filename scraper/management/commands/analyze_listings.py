@@ -0,0 +1,199 @@
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import django
+from django.core.management.base import BaseCommand, CommandError
+from scraper.exceptions import ListingNotFound
+from scraper.pipeline import analyze_listing
+from scraper.utils import shorten_url
+
+# Columns of every record, the prices are plain numbers and the timings are in seconds
+FIELDS = (
+    'url', 'status', 'error', 'title', 'price', 'currency', 'price_rating',
+    'best_title', 'best_price', 'best_shipping', 'best_score', 'total_items',
+    'marketplace_seconds', 'ebay_seconds', 'charts_seconds', 'total_seconds'
+)
+
+STAGES = ('marketplace_seconds', 'ebay_seconds', 'charts_seconds', 'total_seconds')
+
+# Statuses of the records a resumed run doesn't analyze again, listings that failed are retried
+DONE_STATUSES = ('ok', 'missing')
+
+def init_worker():
+    """
+    Sets up Django in a worker process that wasn't forked from the command.
+    """
+
+    django.setup()
+
+def analyze_record(url: str) -> dict:
+    """
+    Runs the analysis of a listing in a worker process and times its stages:
+    fetching the Marketplace listing, searching and rating the Ebay
+    products, and building the charts.
+
+    Args:
+        url (str): The canonical URL of the listing.
+
+    Returns:
+        dict: The record of the listing, with every column of FIELDS.
+    """
+
+    record = dict.fromkeys(FIELDS)
+    record['url'] = url
+
+    marks = {}
+    def progress(stage: str, data: dict):
+        marks[stage] = time.perf_counter()
+
+    start = time.perf_counter()
+    try:
+        context = analyze_listing(url, progress)
+    except ListingNotFound:
+        record.update(status='missing', error="The listing doesn't exist anymore.")
+    except Exception as e:
+        record.update(status='error', error=f"{type(e).__name__}: {e}")
+    else:
+        record['status'] = 'ok'
+        for field in ('title', 'price', 'currency', 'price_rating', 'best_title', 'best_price', 'best_shipping', 'best_score', 'total_items'):
+            record[field] = context[field]
+    end = time.perf_counter()
+
+    if 'listing' in marks:
+        record['marketplace_seconds'] = round(marks['listing'] - start, 4)
+    if 'rating' in marks:
+        record['ebay_seconds'] = round(marks['rating'] - marks['listing'], 4)
+        record['charts_seconds'] = round(end - marks['rating'], 4) if record['status'] == 'ok' else None
+    record['total_seconds'] = round(end - start, 4)
+
+    return record
+
+class Command(BaseCommand):
+    help = (
+        "Analyzes Marketplace listings in bulk across a pool of processes and writes one JSONL or CSV "
+        "record per listing, with its rating, best match and per-stage timings."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', nargs='?', default='-', help="File of Marketplace URLs, one per line, - for stdin (default)")
+        parser.add_argument('-o', '--output', required=True, help="File the records are written to")
+        parser.add_argument('--format', choices=('jsonl', 'csv'), help="Format of the records, guessed from the output extension by default")
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of worker processes (default: number of CPUs)")
+        parser.add_argument('--resume', action='store_true', help="Skip the listings already analyzed or missing in the output file, retry the failed ones and append to it")
+
+    def handle(self, *args, **options):
+        output = Path(options['output'])
+        record_format = options['format'] or ('csv' if output.suffix.lower() == '.csv' else 'jsonl')
+        workers = max(1, options['workers'] or 1)
+
+        urls = self.read_urls(options['input'])
+        done = self.resume(output, record_format) if options['resume'] else set()
+        pending = [url for url in urls if url not in done]
+
+        self.stdout.write(f"{len(urls)} listings, {len(urls) - len(pending)} already done in {output}, analyzing {len(pending)} with {workers} workers")
+
+        start = time.perf_counter()
+        records = []
+        with open(output, 'a' if options['resume'] else 'w', newline='', encoding='utf-8') as file:
+            writer = self.record_writer(file, record_format, header=file.tell() == 0)
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+                futures = [executor.submit(analyze_record, url) for url in pending]
+                for future in as_completed(futures):
+                    record = future.result()
+                    writer(record)
+                    # Every finished listing is on disk, so an interrupted run can be resumed
+                    file.flush()
+                    records.append(record)
+                    self.stdout.write(f"[{len(records)}/{len(pending)}] {record['status']:<7} {record['url']}")
+
+        self.report(records, time.perf_counter() - start)
+
+    def read_urls(self, source: str) -> list[str]:
+        """
+        Reads the canonical URLs of the listings, skipping blank lines,
+        comments and repeated listings.
+        """
+
+        if source == '-':
+            lines = sys.stdin.read().splitlines()
+        else:
+            try:
+                lines = Path(source).read_text(encoding='utf-8').splitlines()
+            except OSError as e:
+                raise CommandError(f"Can't read {source}: {e}")
+
+        urls = {}
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                urls.setdefault(shorten_url(line))
+            except AttributeError:
+                self.stderr.write(f"Skipping {line}: not a Marketplace listing URL")
+
+        return list(urls)
+
+    def resume(self, output: Path, record_format: str) -> set[str]:
+        """
+        Returns the URLs of the output file whose record has one of the
+        DONE_STATUSES. A record cut short by an interrupted run is removed, so
+        that it is analyzed again.
+        """
+
+        if not output.exists():
+            return set()
+
+        # Drop everything after the last complete line
+        content = output.read_bytes()
+        complete = content[:content.rfind(b"\n") + 1]
+        if len(complete) != len(content):
+            with open(output, 'r+b') as file:
+                file.truncate(len(complete))
+
+        lines = complete.decode('utf-8').splitlines()
+        if record_format == 'csv':
+            return {row['url'] for row in csv.DictReader(lines) if row.get('url') and row.get('status') in DONE_STATUSES}
+
+        done = set()
+        for line in lines:
+            try:
+                record = json.loads(line)
+                if record['status'] in DONE_STATUSES:
+                    done.add(record['url'])
+            except (ValueError, KeyError, TypeError):
+                continue
+
+        return done
+
+    def record_writer(self, file, record_format: str, header: bool):
+        """
+        Returns a function that writes a record to the output file.
+        """
+
+        if record_format == 'csv':
+            writer = csv.DictWriter(file, fieldnames=FIELDS)
+            if header:
+                writer.writeheader()
+            return writer.writerow
+
+        return lambda record: file.write(json.dumps(record) + "\n")
+
+    def report(self, records: list[dict], elapsed: float) -> None:
+        """
+        Writes the throughput of the run and the mean time of every stage.
+        """
+
+        ok = [record for record in records if record['status'] == 'ok']
+        self.stdout.write(self.style.SUCCESS(
+            f"Analyzed {len(records)} listings in {elapsed:.2f}s ({len(records) / elapsed if elapsed else 0.0:.2f} listings/sec), "
+            f"{len(ok)} ok, {len(records) - len(ok)} failed"
+        ))
+
+        if ok:
+            means = ", ".join(f"{stage.replace('_seconds', '')} {sum(record[stage] for record in ok) / len(ok):.2f}s" for stage in STAGES)
+            self.stdout.write(f"Mean per listing: {means}")
@@ -0,0 +1,34 @@
+import time
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from scraper.index import build_index, get_index_config
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the token index of the stored Ebay products from the database and saves it, "
+        "The servers load it memory-mapped when they start, restart them to use the new index."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', help="Directory the index is saved to (default: PATH of the SCRAPER_INDEX setting)")
+        parser.add_argument('--max-documents', type=int, help="Distinct titles kept in the index (default: MAX_DOCUMENTS of the SCRAPER_INDEX setting)")
+        parser.add_argument('--batch-size', type=int, default=10000, help="Products read from the database at once")
+
+    def handle(self, *args, **options):
+        config = get_index_config()
+        path = options['path'] or config['PATH']
+        if not path:
+            raise CommandError("No index path, set PATH in the SCRAPER_INDEX setting or pass --path.")
+
+        start = time.perf_counter()
+        index = build_index(max(1, options['batch_size']), options['max_documents'] or config['MAX_DOCUMENTS'])
+        built = time.perf_counter() - start
+
+        index.save(Path(path))
+        saved = time.perf_counter() - start - built
+
+        stats = index.stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {stats['documents']} titles, {stats['tokens']} tokens and {stats['postings']} postings "
+            f"({stats['bytes'] / 1024 / 1024:.1f} MiB) in {built:.2f}s, saved to {path} in {saved:.2f}s"
+        ))
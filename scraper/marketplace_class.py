@@ -1,7 +1,12 @@
+import asyncio
 import datetime
 import re
 import json
-from .utils import *
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .exceptions import ListingNotFound
+from .utils import PARSE_TARGETS, acreate_soup, create_soup
 
 class FacebookMarketplaceScraper:
     def __init__(self, mobile_soup, base_soup):
@@ -21,6 +26,81 @@ class FacebookMarketplaceScraper:
         
         self.json_content = json_content
 
+    @classmethod
+    def from_urls(cls, mobile_url: str, url: str) -> "FacebookMarketplaceScraper":
+        """
+        Fetches the mobile and desktop versions of a listing concurrently and
+        builds the scraper as soon as both have arrived. When the mobile page
+        alone shows that the listing is missing, or its fetch fails, the
+        pending desktop fetch is cancelled.
+
+        Args:
+            mobile_url: The URL of the mobile version of the listing.
+            url: The URL of the desktop version of the listing.
+
+        Returns:
+            The FacebookMarketplaceScraper instance of the listing.
+
+        Raises:
+            ListingNotFound: If the listing is missing.
+        """
+
+        cancel = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=2)
+
+        try:
+            mobile_future = executor.submit(create_soup, mobile_url, None)
+            base_future = executor.submit(create_soup, url, None, cancel, PARSE_TARGETS["marketplace"])
+
+            try:
+                mobile_soup = mobile_future.result()
+                if cls.is_page_missing(mobile_soup):
+                    raise ListingNotFound(f"The listing {url} is missing")
+            except BaseException:
+                # The desktop page is useless once the mobile one failed or shows the listing is missing
+                cancel.set()
+                raise
+
+            base_soup = base_future.result()
+        finally:
+            # Never wait on a cancelled fetch, it unwinds in the background
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return cls(mobile_soup, base_soup)
+
+    @classmethod
+    async def afrom_urls(cls, mobile_url: str, url: str) -> "FacebookMarketplaceScraper":
+        """
+        Asynchronous version of from_urls: both versions of the listing are
+        fetched concurrently on the event loop and parsed in the CPU
+        executor. When the mobile page shows that the listing is missing, or
+        its fetch fails, the pending desktop fetch is cancelled.
+
+        Args:
+            mobile_url: The URL of the mobile version of the listing.
+            url: The URL of the desktop version of the listing.
+
+        Returns:
+            The FacebookMarketplaceScraper instance of the listing.
+
+        Raises:
+            ListingNotFound: If the listing is missing.
+        """
+
+        base_task = asyncio.ensure_future(acreate_soup(url, None, PARSE_TARGETS["marketplace"]))
+
+        try:
+            mobile_soup = await acreate_soup(mobile_url, None)
+            if cls.is_page_missing(mobile_soup):
+                raise ListingNotFound(f"The listing {url} is missing")
+
+            base_soup = await base_task
+        finally:
+            # Does nothing once the desktop page has arrived
+            base_task.cancel()
+
+        return cls(mobile_soup, base_soup)
+
     def get_listing_price(self) -> float:
         """
         Retrieves the price of a product listing.
@@ -200,11 +280,25 @@ class FacebookMarketplaceScraper:
             True if the listing is missing, otherwise False.
         """
 
-        title_element = self.mobile_soup.find("title")
+        return self.is_page_missing(self.mobile_soup)
+
+    @staticmethod
+    def is_page_missing(mobile_soup) -> bool:
+        """
+        Checks if the mobile version of a listing shows that it is missing.
+
+        Args:
+            mobile_soup: The BeautifulSoup object of the mobile page.
+
+        Returns:
+            True if the listing is missing, otherwise False.
+        """
+
+        title_element = mobile_soup.find("title")
         title = title_element.get_text()
 
         text_to_find = "Buy and sell things locally on Facebook Marketplace."
-        found = self.mobile_soup.find(string=text_to_find)
+        found = mobile_soup.find(string=text_to_find)
 
         if title.lower() == "page not found" or found:
             return True
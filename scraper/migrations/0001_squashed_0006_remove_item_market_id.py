@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Stands in for the migrations of the Item model, which was removed along
+    # with them. Existing databases have applied them, so the migrations that
+    # follow depend on this history instead of starting a new one.
+
+    replaces = [
+        ('scraper', '0001_initial'),
+        ('scraper', '0002_rename_price_item_rating'),
+        ('scraper', '0003_alter_item_rating'),
+        ('scraper', '0004_item_image'),
+        ('scraper', '0005_item_market_id'),
+        ('scraper', '0006_remove_item_market_id'),
+    ]
+
+    dependencies = [
+    ]
+
+    operations = [
+    ]
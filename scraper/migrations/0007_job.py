@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-18 02:25
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.utils.timezone
+import scraper.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0006_remove_item_market_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.CharField(default=scraper.models.uuid4_hex, editable=False, max_length=32, primary_key=True, serialize=False)),
+                ('url', models.URLField(max_length=255)),
+                ('refresh', models.BooleanField(default=False)),
+                ('status', models.CharField(choices=[('queued', 'queued'), ('running', 'running'), ('done', 'done'), ('missing', 'missing'), ('failed', 'failed')], default='queued', max_length=16)),
+                ('stage', models.CharField(blank=True, max_length=32, null=True)),
+                ('pages_total', models.PositiveIntegerField(default=0)),
+                ('pages_done', models.JSONField(default=list)),
+                ('result', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('worker', models.CharField(blank=True, max_length=128)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['status', 'created'], name='job_status_time'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 4.2 on 2026-10-18 02:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0007_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Comparable',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(max_length=255)),
+                ('position', models.PositiveIntegerField()),
+                ('title', models.CharField(max_length=255)),
+                ('normalized_title', models.CharField(max_length=255)),
+                ('price', models.FloatField()),
+                ('shipping', models.FloatField()),
+                ('country', models.CharField(blank=True, max_length=128, null=True)),
+                ('condition', models.CharField(blank=True, max_length=128, null=True)),
+                ('similarity', models.FloatField()),
+                ('scraped_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['listing', 'position'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Listing',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=255)),
+                ('title', models.CharField(max_length=255)),
+                ('normalized_title', models.CharField(max_length=255)),
+                ('price', models.FloatField()),
+                ('currency', models.CharField(blank=True, max_length=8)),
+                ('condition', models.CharField(blank=True, max_length=64)),
+                ('category', models.CharField(blank=True, max_length=128)),
+                ('city', models.CharField(blank=True, max_length=128)),
+                ('price_rating', models.FloatField()),
+                ('best_title', models.CharField(max_length=255)),
+                ('best_price', models.FloatField()),
+                ('best_shipping', models.FloatField()),
+                ('best_score', models.FloatField()),
+                ('total_items', models.PositiveIntegerField()),
+                ('analyzed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['url', '-analyzed_at'], name='listing_url_time'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['normalized_title', '-analyzed_at'], name='listing_title_time'),
+        ),
+        migrations.AddField(
+            model_name='comparable',
+            name='listing',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comparables', to='scraper.listing'),
+        ),
+        migrations.AddIndex(
+            model_name='comparable',
+            index=models.Index(fields=['query', '-scraped_at'], name='comparable_query_time'),
+        ),
+        migrations.AddIndex(
+            model_name='comparable',
+            index=models.Index(fields=['normalized_title', '-scraped_at'], name='comparable_title_time'),
+        ),
+        migrations.AddIndex(
+            model_name='comparable',
+            index=models.Index(fields=['scraped_at'], name='comparable_time'),
+        ),
+    ]
@@ -1,7 +1,127 @@
+import uuid
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+def uuid4_hex() -> str:
+    return uuid.uuid4().hex
 
+class Listing(models.Model):
+    """
+    A Marketplace listing as it was at the time of one of its analyses.
+    """
 
+    url = models.URLField(max_length=255)
+    title = models.CharField(max_length=255)
+    # The title as the similarity scoring sees it, identifies the Ebay search of the analysis
+    normalized_title = models.CharField(max_length=255)
+    price = models.FloatField()
+    currency = models.CharField(max_length=8, blank=True)
+    condition = models.CharField(max_length=64, blank=True)
+    category = models.CharField(max_length=128, blank=True)
+    city = models.CharField(max_length=128, blank=True)
+    price_rating = models.FloatField()
+    best_title = models.CharField(max_length=255)
+    best_price = models.FloatField()
+    best_shipping = models.FloatField()
+    best_score = models.FloatField()
+    total_items = models.PositiveIntegerField()
+    analyzed_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['url', '-analyzed_at'], name='listing_url_time'),
+            models.Index(fields=['normalized_title', '-analyzed_at'], name='listing_title_time'),
+        ]
 
+    def __str__(self):
+        return f"{self.title} ({self.analyzed_at:%Y-%m-%d %H:%M})"
+
+class Comparable(models.Model):
+    """
+    An Ebay product found by the search of an analysis, in the order of the
+    result pages.
+    """
+
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='comparables')
+    # The normalized title of the listing the product was found for, the Ebay query it answers
+    query = models.CharField(max_length=255)
+    position = models.PositiveIntegerField()
+    title = models.CharField(max_length=255)
+    normalized_title = models.CharField(max_length=255)
+    price = models.FloatField()
+    shipping = models.FloatField()
+    country = models.CharField(max_length=128, null=True, blank=True)
+    condition = models.CharField(max_length=128, null=True, blank=True)
+    similarity = models.FloatField()
+    scraped_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['listing', 'position']
+        indexes = [
+            models.Index(fields=['query', '-scraped_at'], name='comparable_query_time'),
+            models.Index(fields=['normalized_title', '-scraped_at'], name='comparable_title_time'),
+            models.Index(fields=['scraped_at'], name='comparable_time'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+class Job(models.Model):
+    """
+    An analysis submitted to the job queue, with the progress reported by
+    the pipeline while it runs. Jobs are kept in the database so that every
+    worker process can run them and report their status.
+
+    The status moves from queued to running, then to done, missing when the
+    listing doesn't exist, or failed.
+    """
+
+    STATUSES = ['queued', 'running', 'done', 'missing', 'failed']
+
+    id = models.CharField(max_length=32, primary_key=True, default=uuid4_hex, editable=False)
+    url = models.URLField(max_length=255)
+    refresh = models.BooleanField(default=False)
+    status = models.CharField(max_length=16, choices=[(status, status) for status in STATUSES], default='queued')
+    stage = models.CharField(max_length=32, null=True, blank=True)
+    pages_total = models.PositiveIntegerField(default=0)
+    pages_done = models.JSONField(default=list)
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(null=True, blank=True)
+    # The process running the job, see JobQueue.worker
+    worker = models.CharField(max_length=128, blank=True)
+    created = models.DateTimeField(default=timezone.now)
+    # Refreshed by every stage of a running job and by the heartbeat of its worker, a job left running without updates lost its worker
+    updated = models.DateTimeField(default=timezone.now)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created'], name='job_status_time'),
+        ]
+
+    def to_dict(self) -> dict:
+        """
+        Returns the state of the job, with the context of the report once it
+        is done.
+        """
+
+        state = {
+            'id': self.id,
+            'url': self.url,
+            'status': self.status,
+            'stage': self.stage,
+            'pages_done': sorted(self.pages_done),
+            'pages_total': self.pages_total,
+            'created': self.created.timestamp(),
+            'finished': self.finished.timestamp() if self.finished else None
+        }
+        if self.status == 'done':
+            state['result'] = self.result
+        if self.error is not None:
+            state['error'] = self.error
+
+        return state
+
+    def __str__(self):
+        return f"{self.url} ({self.status})"
@@ -0,0 +1,334 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from django.conf import settings
+
+# Defaults for the SCRAPER_PAGE_CACHE setting
+DEFAULT_PAGE_CACHE = {
+    "ENABLED": False,
+    "DIR": Path(tempfile.gettempdir()) / "marketscrape-pages",
+    "MAX_BYTES": 256 * 1024 * 1024,
+    # Seconds a page stays fresh, per host, 0 disables caching for a host
+    "TTL": {
+        "default": 900
+    },
+}
+
+# Eviction trims the cache down to this fraction of MAX_BYTES so that it
+# doesn't run again on the very next write
+LOW_WATERMARK = 0.9
+
+# Number of writes after which the size estimate is refreshed from disk,
+# since other workers write to the same directory
+RESCAN_INTERVAL = 100
+
+_lock = threading.Lock()
+_cache = None
+
+class PageCache:
+    """
+    Content-addressed cache of raw response bodies on local disk.
+
+    Entries are keyed by the normalized URL and request headers, written
+    atomically so that several processes can share one directory, expire
+    after a per-host TTL and are evicted least recently used first once the
+    directory grows past its size cap.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int, ttl: dict):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._size = None
+        self._writes = 0
+        self.counters = {"hits": 0, "misses": 0, "expired": 0, "stores": 0, "evictions": 0}
+
+    @staticmethod
+    def normalize_url(url: str) -> str:
+        """
+        Normalizes a URL so that equivalent URLs share a cache entry.
+
+        Args:
+            url (str): The URL to normalize.
+
+        Returns:
+            str: The URL with a lowercase scheme and host, without a default
+            port or fragment, and with its query parameters sorted.
+        """
+
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        netloc = parts.netloc.lower()
+        if (scheme, netloc.rsplit(":", 1)[-1]) in (("http", "80"), ("https", "443")):
+            netloc = netloc.rsplit(":", 1)[0]
+        query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+
+        return urlunsplit((scheme, netloc, parts.path or "/", query, ""))
+
+    def key(self, url: str, headers: dict) -> str:
+        """
+        Computes the cache key of a request.
+
+        Args:
+            url (str): The URL of the request.
+            headers (dict): The headers of the request.
+
+        Returns:
+            str: The hex digest identifying the request.
+        """
+
+        normalized_headers = sorted((name.lower(), value) for name, value in (headers or {}).items())
+        material = json.dumps([self.normalize_url(url), normalized_headers])
+
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def path(self, key: str) -> Path:
+        """
+        Returns the file of a cache entry, sharded by the first two hex digits
+        of its key.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            Path: The path of the entry.
+        """
+
+        return self.directory / key[:2] / key
+
+    def host_ttl(self, url: str) -> float:
+        """
+        Returns the TTL of the host a URL points to.
+
+        Args:
+            url (str): The URL of the request.
+
+        Returns:
+            float: The number of seconds a page stays fresh.
+        """
+
+        host = urlsplit(url).hostname or ""
+        return self.ttl.get(host, self.ttl.get("default", 0))
+
+    def get(self, url: str, headers: dict) -> str:
+        """
+        Returns the cached body of a request if it is still fresh.
+
+        Args:
+            url (str): The URL of the request.
+            headers (dict): The headers of the request.
+
+        Returns:
+            str: The decoded body, or None on a miss.
+        """
+
+        ttl = self.host_ttl(url)
+        if ttl <= 0:
+            return None
+
+        path = self.path(self.key(url, headers))
+        try:
+            with open(path, "rb") as file:
+                metadata = json.loads(file.readline())
+                body = file.read()
+        except (FileNotFoundError, ValueError):
+            self._count("misses")
+            return None
+
+        if time.time() - metadata["stored_at"] > ttl:
+            self._count("expired")
+            self._count("misses")
+            return None
+
+        # The modification time doubles as the last access time for LRU eviction
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+        self._count("hits")
+
+        return body.decode(metadata["encoding"], errors="replace")
+
+    def set(self, url: str, headers: dict, content: bytes, encoding: str) -> None:
+        """
+        Stores the raw body of a response.
+
+        Args:
+            url (str): The URL of the request.
+            headers (dict): The headers of the request.
+            content (bytes): The raw body of the response.
+            encoding (str): The encoding of the body.
+        """
+
+        if self.host_ttl(url) <= 0:
+            return
+
+        path = self.path(self.key(url, headers))
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        metadata = json.dumps({"url": url, "encoding": encoding or "utf-8", "stored_at": time.time()})
+        payload = metadata.encode() + b"\n" + content
+
+        # Write to a temporary file in the same directory and rename it over
+        # the entry, so readers never see a partially written page
+        fd, temporary = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(payload)
+            os.replace(temporary, path)
+        except OSError:
+            try:
+                os.unlink(temporary)
+            except FileNotFoundError:
+                pass
+            raise
+
+        with self._lock:
+            self.counters["stores"] += 1
+            self._writes += 1
+            if self._size is None or self._writes % RESCAN_INTERVAL == 0:
+                self._size = self.disk_usage()
+            else:
+                self._size += len(payload)
+            over_budget = self._size > self.max_bytes
+
+        if over_budget:
+            self.evict()
+
+    def entries(self) -> list[tuple[float, int, Path]]:
+        """
+        Lists every entry of the cache directory.
+
+        Returns:
+            list: A list of (last access time, size, path) tuples.
+        """
+
+        entries = []
+        if not self.directory.exists():
+            return entries
+
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.startswith(".tmp-"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, Path(entry.path)))
+
+        return entries
+
+    def disk_usage(self) -> int:
+        """
+        Returns the number of bytes used by the cache directory.
+        """
+
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self) -> int:
+        """
+        Removes the least recently used entries until the cache is back under
+        its low watermark.
+
+        Returns:
+            int: The number of evicted entries.
+        """
+
+        entries = sorted(self.entries())
+        size = sum(size for _, size, _ in entries)
+        target = self.max_bytes * LOW_WATERMARK
+
+        evicted = 0
+        for _, entry_size, path in entries:
+            if size <= target:
+                break
+            try:
+                path.unlink()
+                evicted += 1
+            except FileNotFoundError:
+                # Another worker evicted it first
+                pass
+            size -= entry_size
+
+        with self._lock:
+            self._size = size
+            self.counters["evictions"] += evicted
+
+        return evicted
+
+    def clear(self) -> None:
+        """
+        Removes every entry of the cache.
+        """
+
+        for _, _, path in self.entries():
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+        with self._lock:
+            self._size = 0
+
+    def stats(self) -> dict:
+        """
+        Returns the counters of the cache.
+
+        Returns:
+            dict: The hits, misses, expired entries, stores and evictions of
+            this process, and the hit rate.
+        """
+
+        with self._lock:
+            stats = dict(self.counters)
+
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+
+        return stats
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self.counters[counter] += 1
+
+def get_page_cache() -> PageCache:
+    """
+    Returns the process-wide page cache configured by the SCRAPER_PAGE_CACHE
+    setting.
+
+    Returns:
+        PageCache: The page cache, or None when it is disabled.
+    """
+
+    global _cache
+
+    config = {**DEFAULT_PAGE_CACHE, **getattr(settings, "SCRAPER_PAGE_CACHE", {})}
+    if not config["ENABLED"]:
+        return None
+
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                _cache = PageCache(config["DIR"], config["MAX_BYTES"], config["TTL"])
+
+    return _cache
+
+def page_cache_stats() -> dict:
+    """
+    Returns the counters of the page cache, or an empty dictionary when it is
+    disabled.
+    """
+
+    cache = get_page_cache()
+    return cache.stats() if cache else {}
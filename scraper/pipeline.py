@@ -0,0 +1,499 @@
+from django.conf import settings
+from .exceptions import ListingNotFound
+from .products import ProductTable
+from .utils import (
+    chart_rendering, create_bargraph, create_chart, create_compact_chart, percentage_difference, price_difference_rating,
+    remove_illegal_characters, result_cache_key, run_cpu, shorten_url
+)
+from .shop_class import EbayScraper
+from .marketplace_class import FacebookMarketplaceScraper
+from .similarity import normalize_title
+from .index import candidate_comparables, get_index_config
+from .store import fresh_comparables, get_store_config, save_analysis
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import connections
+from typing import AsyncIterator, Callable, Iterator
+import asyncio
+import queue
+import threading
+
+# Keys of the context reported by the listing and rating stages of analyze_listing
+LISTING_FIELDS = ('shortened_url', 'mobile_url', 'title', 'price', 'days', 'hours', 'image', 'description', 'condition', 'category', 'city', 'currency')
+RATING_FIELDS = ('price_rating', 'total_items', 'best_price', 'best_shipping', 'best_title', 'best_score', 'best_context')
+
+def comparable_rows(products: ProductTable) -> list[dict]:
+    """
+    Converts a table of comparable products to JSON serializable rows.
+
+    Args:
+        products (ProductTable): The table of the comparable products.
+
+    Returns:
+        list[dict]: One dictionary per product, in the order of the table.
+    """
+
+    return [
+        {
+            'title': title.title(),
+            'price': float(price),
+            'shipping': float(ship),
+            'condition': condition,
+            'country': country,
+            'similarity': round(float(similarity) * 100, 2)
+        }
+        for title, price, ship, condition, country, similarity in zip(
+            products.titles, products.prices, products.shipping, products.conditions, products.countries, products.similarities
+        )
+    ]
+
+def listing_details(facebook_instance: FacebookMarketplaceScraper, shortened_url: str, mobile_url: str) -> dict:
+    """
+    Reads the details of a Marketplace listing.
+
+    Args:
+        facebook_instance (FacebookMarketplaceScraper): The scraper of the listing.
+        shortened_url (str): The canonical URL of the listing.
+        mobile_url (str): The URL of the mobile version of the listing.
+
+    Returns:
+        dict: The LISTING_FIELDS of the context.
+    """
+
+    days, hours = facebook_instance.get_listing_date()
+
+    return {
+        'shortened_url': shortened_url,
+        'mobile_url': mobile_url,
+        'title': facebook_instance.get_listing_title(),
+        'price': float(facebook_instance.get_listing_price()),
+        'days': days,
+        'hours': hours,
+        'image': facebook_instance.get_listing_image(),
+        'description': facebook_instance.get_listing_description(),
+        'condition': facebook_instance.get_listing_condition(),
+        'category': facebook_instance.get_listing_category(),
+        'city': facebook_instance.get_listing_city(),
+        'currency': facebook_instance.get_listing_currency()
+    }
+
+def rate_listing(shopping_instance: EbayScraper, products: ProductTable, price: float, days: int) -> tuple[int, dict]:
+    """
+    Finds the best comparable product and rates the price of the listing
+    against it.
+
+    Args:
+        shopping_instance (EbayScraper): The scraper that found the products.
+        products (ProductTable): The table of the comparable products.
+        price (float): The price of the listing.
+        days (int): The number of days the listing has been up.
+
+    Returns:
+        tuple[int, dict]: The row of the best product and the RATING_FIELDS
+        of the context.
+    """
+
+    # Based on the best similar product, get the price, title, and similarity
+    best = shopping_instance.best_product_index(products)
+    best_price = products.prices[best]
+    best_shipping = products.shipping[best]
+    best_title = products.titles[best]
+    best_score = products.similarities[best] * 100
+
+    # Percetage difference between the listing price and the best found price (including shipping)
+    best_total = best_price + best_shipping
+    best_context = percentage_difference(price, best_total)
+    price_rating = price_difference_rating(price, best_total, days)
+
+    return best, {
+        'price_rating': round(price_rating, 1),
+        'total_items': len(products),
+        'best_price': float(best_price),
+        'best_shipping': float(best_shipping),
+        'best_title': best_title.title(),
+        'best_score': round(best_score, 2),
+        'best_context': best_context
+    }
+
+def report_context(listing: dict, rating: dict, products: ProductTable, best: int) -> dict:
+    """
+    Builds the charts of the report and assembles its context.
+
+    Args:
+        listing (dict): The details of the listing.
+        rating (dict): The rating of the listing.
+        products (ProductTable): The table of the comparable products.
+        best (int): The row of the best product.
+
+    Returns:
+        dict: The context of the analysis report.
+    """
+
+    # Categorize the titles and create the chart and bargraph, the browser builds the figure of a compact chart
+    robust = getattr(settings, 'SCRAPER_ROBUST_TREND', False)
+    rendering = chart_rendering(products, best)
+    if getattr(settings, 'SCRAPER_CHART_FORMAT', 'compact') == 'compact':
+        chart = create_compact_chart(products, listing['currency'], listing['title'], best, robust, rendering)
+    else:
+        chart = create_chart(products, listing['currency'], listing['title'], best, robust, rendering)
+    bargraph = create_bargraph(products.countries)
+
+    return {
+        **listing,
+        **rating,
+        'chart': chart,
+        'chart_rendering': {key: rendering[key] for key in ('mode', 'points', 'total')},
+        'bargraph': bargraph,
+        'comparables': comparable_rows(products)
+    }
+
+def local_comparables(shopping_instance: EbayScraper, title: str, query: str, refresh: bool) -> ProductTable:
+    """
+    Returns comparable products from the database when they can stand in for
+    a new Ebay search: the products of a recent search for the same title
+    from the store, or else the closest candidates from the comparable index,
+    scored and filtered like the products of a result page.
+
+    Args:
+        shopping_instance (EbayScraper): The scraper that scores the candidates.
+        title (str): The title of the listing.
+        query (str): The normalized title of the listing.
+        refresh (bool): Whether to search Ebay regardless.
+
+    Returns:
+        ProductTable: The products, or None when Ebay has to be searched.
+    """
+
+    if refresh:
+        return None
+
+    products = fresh_comparables(query)
+    if products is not None:
+        return products
+
+    candidates = candidate_comparables(title)
+    if candidates is None:
+        return None
+
+    products = shopping_instance.score_table(shopping_instance.remove_outliers(candidates), title, ramp_down=0.0)
+
+    return products if len(products) >= max(get_index_config()['MIN_COMPARABLES'], 1) else None
+
+def store_analysis(shopping_instance: EbayScraper, listing: dict, price: float, rating: dict, query: str, products: ProductTable, best: int, stored: bool) -> None:
+    """
+    Records an analysis in the store when the SCRAPER_STORE setting enables
+    it. The products are only recorded when they come from a new search, by
+    the first analysis that records the search when it is shared.
+    """
+
+    if get_store_config()['ENABLED']:
+        save_analysis(listing, price, rating, query, products, best, comparables=not stored and shopping_instance.claim_products(products))
+
+def analyze_listing(url: str, progress: Callable[[str, dict], None] = None, shopping_instance: EbayScraper = None, refresh: bool = False) -> dict:
+    """
+    Runs the full analysis of a Marketplace listing: scrapes the listing,
+    finds comparable products on Ebay, rates the listing price and builds
+    the charts of the report.
+
+    Args:
+        url (str): The URL of the Marketplace listing.
+        progress (Callable): Called with the name and the data of each stage
+            as it completes:
+                - listing: The LISTING_FIELDS of the context.
+                - page: The page number, the number of pages and the
+                  ProductTable of the comparable products of an Ebay page.
+                - rating: The RATING_FIELDS of the context.
+        shopping_instance (EbayScraper): The scraper that searches Ebay,
+            a new EbayScraper by default.
+        refresh (bool): Whether to search Ebay even if the store has
+            recent products for the title.
+
+    Returns:
+        dict: The context of the analysis report.
+
+    Raises:
+        ListingNotFound: If the listing is missing.
+    """
+
+    def report(stage: str, data: dict):
+        if progress is not None:
+            progress(stage, data)
+
+    # Shorten the URL and create a mobile URL
+    shortened_url = shorten_url(url)
+    mobile_url = shortened_url.replace("www", "m")
+
+    # Fetch the desktop and mobile versions of the page concurrently and create a FacebookScraper instance,
+    # the desktop fetch is cancelled if the mobile page shows that the listing is missing
+    facebook_instance = FacebookMarketplaceScraper.from_urls(mobile_url, url)
+
+    # Get the listing data
+    listing = listing_details(facebook_instance, shortened_url, mobile_url)
+    report('listing', listing)
+
+    # Create a GoogleShoppingScraper instance
+    if shopping_instance is None:
+        shopping_instance = EbayScraper()
+
+    # Find viable products based on the title, reporting each result page as soon as it is scored
+    def on_page(page: int, page_products: ProductTable):
+        report('page', {'page': page, 'pages': shopping_instance.pages, 'products': page_products})
+
+    title = remove_illegal_characters(listing['title'])
+    query = normalize_title(title)
+
+    # Serve the products from the database when recent enough ones match the title
+    products = local_comparables(shopping_instance, title, query, refresh)
+    stored = products is not None
+    if stored:
+        report('page', {'page': 0, 'pages': 1, 'products': products})
+    else:
+        products = shopping_instance.find_viable_product(title, ramp_down=0.0, on_page=on_page)
+
+    price = float(facebook_instance.get_listing_price())
+    best, rating = rate_listing(shopping_instance, products, price, listing['days'])
+    report('rating', rating)
+
+    store_analysis(shopping_instance, listing, price, rating, query, products, best, stored)
+
+    return report_context(listing, rating, products, best)
+
+async def aanalyze_listing(url: str, progress: Callable[[str, dict], None] = None, refresh: bool = False, shopping_instance: EbayScraper = None) -> dict:
+    """
+    Asynchronous version of analyze_listing. The pages are fetched on the
+    event loop, and the parsing, scoring and charting run in the CPU
+    executor, so a single ASGI worker can keep many analyses waiting on the
+    network at once.
+
+    Args:
+        url (str): The URL of the Marketplace listing.
+        progress (Callable): Called with the name and the data of each
+            stage, see analyze_listing.
+        refresh (bool): Whether to search Ebay even if the store has
+            recent products for the title.
+        shopping_instance (EbayScraper): The scraper that searches Ebay,
+            a new EbayScraper by default.
+
+    Returns:
+        dict: The context of the analysis report.
+
+    Raises:
+        ListingNotFound: If the listing is missing.
+    """
+
+    def report(stage: str, data: dict):
+        if progress is not None:
+            progress(stage, data)
+
+    shortened_url = shorten_url(url)
+    mobile_url = shortened_url.replace("www", "m")
+
+    facebook_instance = await FacebookMarketplaceScraper.afrom_urls(mobile_url, url)
+
+    listing = listing_details(facebook_instance, shortened_url, mobile_url)
+    report('listing', listing)
+
+    if shopping_instance is None:
+        shopping_instance = EbayScraper()
+
+    def on_page(page: int, page_products: ProductTable):
+        report('page', {'page': page, 'pages': shopping_instance.pages, 'products': page_products})
+
+    title = remove_illegal_characters(listing['title'])
+    query = normalize_title(title)
+
+    products = await sync_to_async(local_comparables)(shopping_instance, title, query, refresh)
+    stored = products is not None
+    if stored:
+        report('page', {'page': 0, 'pages': 1, 'products': products})
+    else:
+        products = await shopping_instance.afind_viable_product(title, ramp_down=0.0, on_page=on_page)
+
+    price = float(facebook_instance.get_listing_price())
+    best, rating = rate_listing(shopping_instance, products, price, listing['days'])
+    report('rating', rating)
+
+    await sync_to_async(store_analysis)(shopping_instance, listing, price, rating, query, products, best, stored)
+
+    return await run_cpu(report_context, listing, rating, products, best)
+
+def cached_analysis(url: str, refresh: bool = False, progress: Callable[[str, dict], None] = None, shopping_instance: EbayScraper = None) -> dict:
+    """
+    Returns the analysis of a Marketplace listing from the result cache, or
+    runs it and caches it.
+
+    Args:
+        url (str): The URL of the Marketplace listing.
+        refresh (bool): Whether to run the analysis even if it is cached.
+        progress (Callable): The progress callback of analyze_listing, not
+            called when the analysis is served from the cache.
+        shopping_instance (EbayScraper): The scraper that searches Ebay.
+
+    Returns:
+        dict: The context of the analysis report.
+
+    Raises:
+        ListingNotFound: If the listing is missing.
+    """
+
+    # The shortened URL identifies the listing in the result cache
+    cache_key = result_cache_key(shorten_url(url))
+
+    # Serve repeat lookups of the same listing from the result cache unless a refresh is forced
+    context = None if refresh else cache.get(cache_key)
+    if context is None:
+        context = analyze_listing(url, progress, shopping_instance, refresh)
+        cache.set(cache_key, context, getattr(settings, 'SCRAPER_RESULT_CACHE_TTL', 600))
+
+    return context
+
+async def acached_analysis(url: str, refresh: bool = False, progress: Callable[[str, dict], None] = None, shopping_instance: EbayScraper = None) -> dict:
+    """
+    Asynchronous version of cached_analysis.
+
+    Args:
+        url (str): The URL of the Marketplace listing.
+        refresh (bool): Whether to run the analysis even if it is cached.
+        progress (Callable): The progress callback of aanalyze_listing, not
+            called when the analysis is served from the cache.
+        shopping_instance (EbayScraper): The scraper that searches Ebay.
+
+    Returns:
+        dict: The context of the analysis report.
+
+    Raises:
+        ListingNotFound: If the listing is missing.
+    """
+
+    cache_key = result_cache_key(shorten_url(url))
+
+    context = None if refresh else await cache.aget(cache_key)
+    if context is None:
+        context = await aanalyze_listing(url, progress, refresh, shopping_instance)
+        await cache.aset(cache_key, context, getattr(settings, 'SCRAPER_RESULT_CACHE_TTL', 600))
+
+    return context
+
+def stream_stages(stage: str, data: dict, seen: set) -> Iterator[tuple[str, dict]]:
+    """
+    Turns an event of a running analysis into the stages sent to the client,
+    see analysis_events.
+
+    Args:
+        stage (str): The name of the event: a stage reported by the pipeline,
+            result with the context of the report, missing or failure.
+        data (dict): The data of the event.
+        seen (set): The stages already sent, updated.
+
+    Returns:
+        Iterator[tuple[str, dict]]: The name and the data of each stage.
+    """
+
+    if stage == 'page':
+        seen.add('comparables')
+        yield 'comparables', {'page': data['page'], 'pages': data['pages'], 'rows': comparable_rows(data['products'])}
+    elif stage == 'result':
+        # Stages a cached analysis skipped are taken from its context
+        if 'listing' not in seen:
+            yield 'listing', {key: data[key] for key in LISTING_FIELDS}
+        if 'comparables' not in seen:
+            yield 'comparables', {'page': 0, 'pages': 1, 'rows': data['comparables']}
+        if 'rating' not in seen:
+            yield 'rating', {key: data[key] for key in RATING_FIELDS}
+        # Analyses cached before the rendering was recorded don't have one
+        yield 'charts', {'chart': data['chart'], 'chart_rendering': data.get('chart_rendering'), 'bargraph': data['bargraph']}
+    else:
+        seen.add(stage)
+        yield stage, data
+
+# Events after which an analysis sends nothing more
+FINAL_EVENTS = ('result', 'missing', 'failure')
+
+def analysis_events(url: str, refresh: bool = False) -> Iterator[tuple[str, dict]]:
+    """
+    Runs the analysis of a Marketplace listing in a background thread and
+    yields its stages as they complete, so they can be sent to the client
+    before the whole analysis is done:
+        - listing: The LISTING_FIELDS of the context.
+        - comparables: The rows of the comparable products of an Ebay page,
+          see comparable_rows.
+        - rating: The RATING_FIELDS of the context.
+        - charts: The chart, its rendering and the bargraph of the context.
+        - missing: The listing doesn't exist.
+        - failure: The analysis failed, with the reason.
+
+    An analysis served from the result cache yields the same stages, with
+    all the comparable products in one comparables stage.
+
+    Args:
+        url (str): The URL of the Marketplace listing.
+        refresh (bool): Whether to run the analysis even if it is cached.
+
+    Returns:
+        Iterator[tuple[str, dict]]: The name and the data of each stage.
+    """
+
+    events = queue.Queue()
+
+    def run():
+        try:
+            events.put(('result', cached_analysis(url, refresh, lambda stage, data: events.put((stage, data)))))
+        except ListingNotFound:
+            events.put(('missing', {}))
+        except Exception as e:
+            events.put(('failure', {'error': f"{type(e).__name__}: {e}"}))
+        finally:
+            # Database connections are per thread, don't leave this one's open
+            connections.close_all()
+
+    # The analysis keeps running, and gets cached, if the client goes away
+    threading.Thread(target=run, name='scraper-stream', daemon=True).start()
+
+    seen = set()
+    while True:
+        stage, data = events.get()
+        yield from stream_stages(stage, data, seen)
+        if stage in FINAL_EVENTS:
+            return
+
+# Analyses of streams whose client went away, referenced until they finish so they aren't garbage collected
+_detached = set()
+
+async def aanalysis_events(url: str, refresh: bool = False) -> AsyncIterator[tuple[str, dict]]:
+    """
+    Asynchronous version of analysis_events: the analysis runs as a task of
+    the event loop with aanalyze_listing, and its stages are passed on
+    through an asyncio queue.
+
+    Args:
+        url (str): The URL of the Marketplace listing.
+        refresh (bool): Whether to run the analysis even if it is cached.
+
+    Returns:
+        AsyncIterator[tuple[str, dict]]: The name and the data of each stage.
+    """
+
+    events = asyncio.Queue()
+
+    async def run():
+        try:
+            events.put_nowait(('result', await acached_analysis(url, refresh, lambda stage, data: events.put_nowait((stage, data)))))
+        except ListingNotFound:
+            events.put_nowait(('missing', {}))
+        except Exception as e:
+            events.put_nowait(('failure', {'error': f"{type(e).__name__}: {e}"}))
+
+    task = asyncio.ensure_future(run())
+    try:
+        seen = set()
+        while True:
+            stage, data = await events.get()
+            for event in stream_stages(stage, data, seen):
+                yield event
+            if stage in FINAL_EVENTS:
+                return
+    finally:
+        # The analysis keeps running, and gets cached, if the client goes away
+        if not task.done():
+            _detached.add(task)
+            task.add_done_callback(_detached.discard)
@@ -0,0 +1,91 @@
+import numpy as np
+
+class ProductTable:
+    """
+    Columnar store of Ebay products: one NumPy array per field, all of the
+    same length, with row i of every column describing the same product.
+
+    Slicing a table returns views of its columns, so stages of the pipeline
+    can narrow the products down without copying them.
+    """
+
+    __slots__ = ('titles', 'prices', 'shipping', 'countries', 'conditions', 'similarities')
+
+    def __init__(self, titles, prices, shipping, countries, conditions, similarities=None):
+        self.titles = np.asarray(titles, dtype=object)
+        self.prices = np.asarray(prices, dtype=float)
+        self.shipping = np.asarray(shipping, dtype=float)
+        self.countries = np.asarray(countries, dtype=object)
+        self.conditions = np.asarray(conditions, dtype=object)
+        self.similarities = np.zeros(len(self.titles)) if similarities is None else np.asarray(similarities, dtype=float)
+
+    @classmethod
+    def empty(cls) -> "ProductTable":
+        """
+        Creates a table without products.
+        """
+
+        return cls([], [], [], [], [])
+
+    @classmethod
+    def from_records(cls, records: list[dict]) -> "ProductTable":
+        """
+        Creates a table from product dictionaries.
+
+        Args:
+            records: Dictionaries with the title, price, shipping, country and
+                condition of each product.
+
+        Returns:
+            The table of the products.
+        """
+
+        return cls(
+            [record['title'] for record in records],
+            [record['price'] for record in records],
+            [record['shipping'] for record in records],
+            [record['country'] for record in records],
+            [record['condition'] for record in records]
+        )
+
+    @classmethod
+    def concatenate(cls, tables: list["ProductTable"]) -> "ProductTable":
+        """
+        Joins tables end to end.
+
+        Args:
+            tables: The tables to join, in order.
+
+        Returns:
+            The table of all their products.
+        """
+
+        if not tables:
+            return cls.empty()
+
+        return cls(*(np.concatenate([getattr(table, column) for table in tables]) for column in cls.__slots__))
+
+    def take(self, rows) -> "ProductTable":
+        """
+        Selects rows of the table.
+
+        Args:
+            rows: A slice, a boolean mask or an array of row indices.
+
+        Returns:
+            The table of the selected products, sharing memory with this
+            table when rows is a slice.
+        """
+
+        return ProductTable(*(getattr(self, column)[rows] for column in self.__slots__))
+
+    @property
+    def totals(self) -> np.ndarray:
+        """
+        The price of each product including shipping.
+        """
+
+        return self.prices + self.shipping
+
+    def __len__(self) -> int:
+        return len(self.titles)
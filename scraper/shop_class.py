@@ -1,138 +1,165 @@
-from .utils import *
-from difflib import SequenceMatcher
-import string
+import asyncio
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterator
+import numpy as np
+from bs4 import BeautifulSoup, Tag
+from django.conf import settings
+from .exceptions import InvalidSimilarityThreshold, NoProductsFound
+from .products import ProductTable
+from .similarity import batch_similarity
+from .utils import (
+    PARSE_TARGETS, StreamingPriceStatistics, afetch_html, clean_text, create_soup, parse_html, reject_outliers, run_cpu
+)
 
 class EbayScraper:
-    def __init__(self):
-        self.title = None 
-        self.start = None
-        self.soup = None
-
-    def create_url(self):
+    def __init__(self, pages: int = 5, max_workers: int = 5, streaming_outliers: bool = None):
+        # The scraper keeps no per-page state, so a single instance can be
+        # shared by all the workers fetching result pages concurrently
+        self.pages = pages
+        self.max_workers = max_workers
+        # Judge outliers against the prices of every page received so far
+        # rather than each page on its own
+        if streaming_outliers is None:
+            streaming_outliers = getattr(settings, 'SCRAPER_STREAMING_OUTLIERS', False)
+        self.streaming_outliers = streaming_outliers
+
+    def search_request(self, title: str, page_number: int) -> tuple[str, dict]:
         """
-        Creates a URL to search for a product on Ebay and retrieves the corresponding page using BeautifulSoup.
+        Creates the URL and the headers of the request for a page of Ebay
+        search results.
 
         Args:
-            self: The instance of the class.
-            
+            title: The title of the product to search for.
+            page_number: The result page to retrieve.
+
         Returns:
-            None
+            A tuple of the URL and the headers of the request.
         """
 
-        url = f"https://www.ebay.com/sch/i.html?_from=R40&_nkw={self.title}&_sacat=0&_ipg=240&_pgn={self.start}"
+        url = f"https://www.ebay.com/sch/i.html?_from=R40&_nkw={title}&_sacat=0&_ipg=240&_pgn={page_number}"
         headers = { 
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/70.0.3538.102 Safari/537.36 Edge/18.19582",
             "Referer": "https://www.google.com/"
         }
-        self.soup = create_soup(url, headers)
 
-    def get_product_title(self) -> str:
+        return url, headers
+
+    def create_url(self, title: str, page_number: int) -> BeautifulSoup:
         """
-        Returns the product description in the soup.
+        Creates a URL to search for a product on Ebay and retrieves the corresponding page using BeautifulSoup.
 
         Args:
-            soup: a BeautifulSoup object containing a product page
-
+            title: The title of the product to search for.
+            page_number: The result page to retrieve.
+            
         Returns:
-            The product description
+            The BeautifulSoup object of the result page.
         """
 
-        description = self.soup.find_all('div', class_='s-item__title')
+        url, headers = self.search_request(title, page_number)
 
-        return description
+        return create_soup(url, headers, parse_only=PARSE_TARGETS["ebay"])
 
-    def get_product_price(self) -> list[float]:
+    def iter_product_info(self, soup: BeautifulSoup) -> Iterator[dict]:
         """
-        Extracts the price of each product from the HTML.
+        Walks the result page one item container at a time and yields the
+        fields of each item as soon as its container has been read, so that
+        the fields of an item always stay together.
+
+        Each dictionary contains the following keys, set to None when the
+        item doesn't have the field:
+            - title: The title of the product.
+            - price: The price of the product.
+            - shipping: The shipping cost of the product.
+            - country: The country of the product.
+            - condition: The condition of the product.
 
         Args:
-            soup: The HTML to extract the price from.
-            
-        Returns:
-            The price of each product. 
-        """
+            soup: The BeautifulSoup object of the result page.
 
-        prices = self.soup.find_all('span', class_='s-item__price')
+        Yields:
+            dict: The fields of a product.
+        """
 
-        values = []
-        for price in prices:
-            values.append(price.text)
+        item = soup.find('li', class_='s-item')
+        while item is not None:
+            yield self.extract_item(item)
 
-        cleansed = [re.search(r"([0-9]+\.[0-9]+)|([0-9]+,[0-9]+)", price).group(0) for price in values]
-        cleansed = [price.replace(",", "") for price in cleansed]
-        cleansed = [float(price) for price in cleansed]
+            # Items are siblings within a result list, only look further
+            # ahead when a list ends
+            item = item.find_next_sibling('li', class_='s-item') or item.find_next('li', class_='s-item')
 
-        return cleansed
-    
-    def get_product_condition(self) -> list[str]:
+    def extract_item(self, item: Tag) -> dict:
         """
-        Extracts the conditions of each product from the HTML
+        Extracts the fields of a product from its item container in a single
+        walk over the container.
 
         Args:
-            soup: The HTML to extract the condition from.
+            item: The s-item container of the product.
 
         Returns:
-            The condition of each product. The conditions is represented as a
+            dict: The fields of the product, None when missing.
         """
 
-        conditions = self.soup.find_all('span', class_='SECONDARY_INFO')
+        record = dict.fromkeys(('title', 'price', 'shipping', 'country', 'condition'))
 
-        values = []
-        for condition in conditions:
-            values.append(condition.text)
+        for node in item.descendants:
+            if not isinstance(node, Tag):
+                continue
 
-        return values
-    
-    def get_product_shipping(self) -> list[float]:
+            classes = node.get('class')
+            if not classes:
+                continue
+
+            if node.name == 'div' and 's-item__title' in classes:
+                record['title'] = node.text
+            elif node.name != 'span':
+                continue
+            elif 's-item__price' in classes and record['price'] is None:
+                record['price'] = self.parse_price(node.text)
+            elif 's-item__shipping' in classes and 's-item__logisticsCost' in classes:
+                record['shipping'] = self.parse_shipping(node.text)
+            elif 's-item__location' in classes and 's-item__itemLocation' in classes:
+                record['country'] = node.text.replace("from ", "")
+            elif 'SECONDARY_INFO' in classes:
+                record['condition'] = node.text
+
+        return record
+
+    def parse_price(self, text: str) -> float:
         """
-        Extracts the shipping cost of each product from the HTML.
+        Parses the price of a product.
 
         Args:
-            soup: The HTML to extract the shipping cost from.
-            
+            text: The text of the price element.
+
         Returns:
-            The shipping cost of each product.
+            The first price in the text, or None if it has no price.
         """
 
-        shipping = self.soup.find_all('span', class_='s-item__shipping s-item__logisticsCost')
-
-        values = []
-        for ship in shipping:
-            values.append(ship.text)
-        
-        cleansed = []
-        for ship in values:
-            match = re.search(r"([0-9]+.*[0-9])|(Free)|(not specified)", ship)
-            if match:
-                if match.group(1):
-                    price = match.group(1).replace(",", "")
-                    cleansed.append(float(price))
-                else:
-                    cleansed.append(0.0)
-            else:
-                cleansed.append(0.0)
+        match = re.search(r"([0-9]+\.[0-9]+)|([0-9]+,[0-9]+)", text)
+        if not match:
+            return None
 
-        return cleansed
+        return float(match.group(0).replace(",", ""))
 
-    def get_product_country(self) -> str:
+    def parse_shipping(self, text: str) -> float:
         """
-        Returns the product country in the soup.
+        Parses the shipping cost of a product.
 
         Args:
-            soup: a BeautifulSoup object containing a product page
+            text: The text of the shipping element.
 
         Returns:
-            The product country
+            The shipping cost, 0 when shipping is free or not specified.
         """
 
-        countries = self.soup.find_all('span', class_='s-item__location s-item__itemLocation')
+        match = re.search(r"([0-9]+.*[0-9])|(Free)|(not specified)", text)
+        if match and match.group(1):
+            return float(match.group(1).replace(",", ""))
 
-        values = []
-        for country in countries:
-            result = country.text.replace("from ", "")
-            values.append(result)
-
-        return values
+        return 0.0
 
     def get_similarity(self, string1: str, string2: str) -> float:
         """
@@ -147,229 +174,319 @@ class EbayScraper:
             The similarity between the two titles.
         """
 
-        string1 = string1.lower().strip()
-        string2 = string2.lower().strip()
-
-        string1 = ' '.join(string1.split())
-        string2 = ' '.join(string2.split())
-
-        translator = str.maketrans('', '', string.punctuation)
-        string1_clean = string1.translate(translator)
-        string2_clean = string2.translate(translator)
-
-        # Compute the similarity score using SequenceMatcher
-        similarity = SequenceMatcher(None, string1_clean, string2_clean).ratio()
+        similarity = batch_similarity(string2, [string1], method='ratio')[0]
 
         return similarity
     
-    def remove_outliers(self, titles: list[str], prices: list[float], shipping: list[float], countries: list[str], conditions: list[str]) -> tuple[list[str], list[float], list[float], list[str]]:
+    def remove_outliers(self, products: ProductTable, statistics: StreamingPriceStatistics = None) -> ProductTable:
         """
-        Removes outliers from a set of data consisting of titles, prices, and countries.
+        Removes the products whose price is an outlier. A single mask is
+        computed from the prices and applied to every column of the table.
 
         Args:
-            titles (list[str]): A list of titles of the items.
-            prices (list[float]): A list of prices of the items.
-            shipping (list[float]): A list of shipping costs of the items.
-            countries (list[str]): A list of countries of the items.
+            products (ProductTable): The products of a page.
+            statistics (StreamingPriceStatistics): The running price statistics
+                of the pages seen so far. When given, the prices of the page
+                are added to them and the outliers are judged against their
+                estimates instead of the page alone.
 
         Returns:
-            A tuple of three lists: (1) titles with outliers removed, (2) prices with outliers removed, and (3) countries with outliers removed.
+            ProductTable: The products without the outliers.
         """
 
         # Minimum number of items required to start removing outliers
         removal_threshold = 100
 
-        if len(titles) >= removal_threshold:
-            outlier_indices = reject_outliers(np.array(prices), m=1.5)
-
-            titles = [title for i, title in enumerate(titles) if i not in outlier_indices]
-            prices = [price for i, price in enumerate(prices) if i not in outlier_indices]
-            shipping = [ship for i, ship in enumerate(shipping) if i not in outlier_indices]
-            countries = [country for i, country in enumerate(countries) if i not in outlier_indices]
-            conditions = [condition for i, condition in enumerate(conditions) if i not in outlier_indices]
+        if statistics is not None:
+            median, deviation = statistics.update(products.prices)
+            if statistics.count < removal_threshold:
+                return products
+            outliers = reject_outliers(products.prices, m=1.5, median=median, deviation=deviation)
+        elif len(products) >= removal_threshold:
+            outliers = reject_outliers(products.prices, m=1.5)
+        else:
+            return products
 
-        return titles, prices, shipping, countries, conditions
+        return products.take(~outliers)
 
-    def get_product_info(self):
+    def get_product_info(self, soup: BeautifulSoup, statistics: StreamingPriceStatistics = None) -> ProductTable:
         """
-        Extracts product information from the page and returns a list of dictionaries.
+        Extracts product information from the page and returns it as a table
+        with the following columns:
+            - titles: The cleaned title of each product.
+            - prices: The price of each product.
+            - shipping: The shipping cost of each product.
+            - countries: The country of each product.
+            - conditions: The condition of each product.
 
-        Each dictionary contains the following keys:
-            - title: The title of the product.
-            - description: The description of the product.
-            - price: The price of the product.
-            - country: The country of the product.
+        Items without a title or a price are skipped.
 
         Args:
             soup (BeautifulSoup): The parsed HTML of the page.
+            statistics (StreamingPriceStatistics): The running price statistics
+                to remove the outliers with, see remove_outliers.
 
         Returns:
-            list: A list of dictionaries containing the product information.
+            ProductTable: The table of the products on the page.
+        """
+
+        records = []
+        for record in self.iter_product_info(soup):
+            if record['title'] is None or record['price'] is None:
+                continue
+            record['title'] = clean_text(record['title'].lower())
+            if record['shipping'] is None:
+                record['shipping'] = 0.0
+            records.append(record)
+
+        return self.remove_outliers(ProductTable.from_records(records), statistics)
+
+    def best_product_index(self, products: ProductTable) -> int:
         """
+        Finds the row of the lowest priced product among the products with
+        the highest similarity.
 
-        titles = self.get_product_title()
-        prices = self.get_product_price()
-        shipping = self.get_product_shipping()
-        countries = self.get_product_country()
-        conditions = self.get_product_condition()
+        Args:
+            products: The table of similar products.
+
+        Returns:
+            The index of the row of the product in the table.
 
-        titles, prices, shipping, countries, conditions = self.remove_outliers(titles, prices, shipping, countries, conditions)
+        Raises:
+            NoProductsFound: If the table is empty.
+        """
+
+        if len(products) == 0:
+            raise NoProductsFound("No similar products were found.")
 
-        product_info = []
-        for title, price, ship, country, condition in zip(titles, prices, shipping, countries, conditions):
-            product_info.append({
-                'title': clean_text(title.text.lower()),
-                'price': price,
-                'shipping': ship,
-                'country': country,
-                'condition': condition
-            })
+        # Sentinel above every price, so only the most similar products can win the argmin
+        prices = np.where(products.similarities == products.similarities.max(), products.prices, np.inf)
 
-        return product_info
+        return int(np.argmin(prices))
 
-    def lowest_price_highest_similarity(self, filtered_prices_descriptions: dict) -> tuple[float, str, float]:
+    def claim_products(self, products: ProductTable) -> bool:
         """
-        Finds the lowest price and the highest similarity of the filtered
-        prices and descriptions.
+        Claims the recording of a table of products found by this scraper,
+        so that products shared between analyses are stored only once.
 
         Args:
-            filtered_prices_descriptions: The filtered prices and descriptions.
+            products: The table of products of a search.
 
         Returns:
-            The lowest price, the highest similarity, and the description
-            associated with the highest similarity.
+            True if the caller records the products, always for a scraper
+            that doesn't share its searches.
+        """
+
+        return True
+
+    def score_page(self, soup: BeautifulSoup, title: str, ramp_down: float, statistics: StreamingPriceStatistics = None) -> ProductTable:
         """
+        Scores the products of a single result page against the title of the
+        Marketplace listing, lowering the similarity threshold when nothing on
+        the page is similar enough.
 
-        max_similarity_item = None
-        min_price_item = None
+        The page is parsed and scored exactly once, lowering the threshold
+        only selects from the scores that were already computed.
 
-        for _, item_details in filtered_prices_descriptions.items():
-            if max_similarity_item is None and min_price_item is None:
-                max_similarity_item = item_details
-                min_price_item = item_details
-            else:
-                if item_details['similarity'] > max_similarity_item['similarity']:
-                    max_similarity_item = item_details
-                if item_details['price'] < min_price_item['price']:
-                    min_price_item = item_details
+        Args:
+            soup: The BeautifulSoup object of the result page.
+            title: The title of the product.
+            ramp_down: The initial ramp down of the similarity threshold.
+            statistics: The running price statistics to remove the outliers
+                with, the page's own prices are used when omitted.
 
-        max_similar_items = [(item_name, item_details) for item_name, item_details in filtered_prices_descriptions.items() if item_details['similarity'] == max_similarity_item['similarity']]
+        Returns:
+            ProductTable: The table of the similar products.
+        """
 
-        min_price_item = min(max_similar_items, key=lambda x: x[1]['price'])
+        return self.score_table(self.get_product_info(soup, statistics), title, ramp_down)
 
-        return min_price_item
-        
-    def construct_candidates(self, descriptions, prices, shipping, countries, conditions, similarities):
+    def score_table(self, products: ProductTable, title: str, ramp_down: float) -> ProductTable:
         """
-        Constructs a list of candidates from the descriptions, prices, and
-        countries.
+        Scores a table of products against the title of the Marketplace
+        listing and keeps the similar ones, see score_page.
 
         Args:
-            descriptions: The descriptions of the products.
-            prices: The prices of the products.
-            shipping: The shipping costs of the products.
-            countries: The countries of the products.
+            products: The products, without their outliers.
+            title: The title of the product.
+            ramp_down: The initial ramp down of the similarity threshold.
+
+        Returns:
+            ProductTable: The table of the similar products, in the order of
+            the table.
+        """
+
+        try:
+            products.similarities = self.score_products(products, title.lower())
+        except InvalidSimilarityThreshold:
+            return ProductTable.empty()
+
+        threshold = self.ramp_down_threshold(products.similarities, ramp_down)
+        if threshold is None:
+            return ProductTable.empty()
+
+        return self.filter_products_by_similarity(products, threshold)
+
+    def ramp_down_threshold(self, similarities: np.ndarray, ramp_down: float) -> float:
+        """
+        Picks the similarity threshold of a page: 0.35 when a product reaches
+        it, otherwise the first of up to three thresholds, each 0.05 lower
+        than the previous one, that a product reaches.
+
+        Args:
+            similarities: The similarity of every product on the page.
+            ramp_down: The initial ramp down of the similarity threshold.
 
         Returns:
-            The list of candidates.
+            The threshold, or None when no product reaches any of them.
         """
 
-        candidates = {}
-        for i in range(len(descriptions)):
-            candidates[descriptions[i]] = {
-                "price": prices[i],
-                "shipping": shipping[i],
-                "country": countries[i],
-                "condition": conditions[i],
-                "similarity": similarities[i]
-            }
+        if len(similarities) == 0:
+            return None
+
+        best = similarities.max()
+        similarity_threshold = 0.35
+        if best >= similarity_threshold:
+            return similarity_threshold
 
-        return candidates
+        for _ in range(3):
+            ramp_down += 0.05
+            if best >= similarity_threshold - ramp_down:
+                return similarity_threshold - ramp_down
 
-    def find_viable_product(self, title: str, ramp_down: float) -> tuple[list[str], list[str], list[str], list[float]]:
+        return None
+
+    def find_viable_product(self, title: str, ramp_down: float, on_page: Callable[[int, ProductTable], None] = None) -> ProductTable:
         """
         Finds viable products based on the title of the Marketplace listing,
         and utilizes the ramp down of the previous product in the sequence, to 
         find the descriptions, prices, and countries of the prices of the product.
 
+        All result pages are requested at once, each page is scored as soon as
+        it arrives, and the results are merged in page order. With streaming
+        outliers, the outliers of each page are removed against the running
+        price statistics of the pages that arrived before it.
+
         Args:
             title: The title of the product.
             ramp_down: The ramp down of the previous product in the
                 sequence.
+            on_page: Called with the page number and the table of the viable
+                products of each page as soon as it is scored, in the order
+                the pages arrive.
 
         Returns:
-            The descriptions, prices and countries the viable products.
+            ProductTable: The table of the viable products.
         """
 
-        descriptions, prices, shipping, countries, conditions, similarities = [], [], [], [], [], []
+        pages = [None] * self.pages
+        statistics = StreamingPriceStatistics() if self.streaming_outliers else None
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, self.pages))) as executor:
+            futures = {executor.submit(self.create_url, title, page_number): page_number for page_number in range(self.pages)}
+            for future in as_completed(futures):
+                page_number = futures[future]
+                pages[page_number] = self.score_page(future.result(), title, ramp_down, statistics)
+                if on_page is not None:
+                    on_page(page_number, pages[page_number])
 
-        for page_number in range(5):
-            similarity_threshold = 0.35
-            self.title = title
-            self.start = page_number
-            self.create_url()
+        return ProductTable.concatenate(pages)
 
-            try:
-                filtered_prices_descriptions = self.listing_product_similarity(title, similarity_threshold)
-                if not filtered_prices_descriptions:
-                    raise NoProductsFound("No similar products found")
-            except NoProductsFound:
-                consecutively_empty = 0
-                while not filtered_prices_descriptions:
-                    ramp_down += 0.05
-                    filtered_prices_descriptions = self.listing_product_similarity(title, similarity_threshold - ramp_down)
-                    if consecutively_empty == 2:
-                        break 
+    def score_html(self, html: str, title: str, ramp_down: float, statistics: StreamingPriceStatistics = None) -> ProductTable:
+        """
+        Parses a result page and scores its products, see score_page.
 
-                    if filtered_prices_descriptions:
-                        consecutively_empty = 0
-                    else:
-                        consecutively_empty += 1
+        Args:
+            html: The HTML of the result page.
+            title: The title of the product.
+            ramp_down: The initial ramp down of the similarity threshold.
+            statistics: The running price statistics to remove the outliers with.
 
-            descriptions += list(filtered_prices_descriptions.keys())
-            prices += [f"{product['price']:,.2f}" for product in filtered_prices_descriptions.values()]
-            shipping += [f"{product['shipping']:,.2f}" for product in filtered_prices_descriptions.values()]
-            countries += [product['country'] for product in filtered_prices_descriptions.values()]
-            conditions += [product['condition'] for product in filtered_prices_descriptions.values()]
-            similarities += [product['similarity'] for product in filtered_prices_descriptions.values()]
+        Returns:
+            ProductTable: The table of the similar products.
+        """
 
-        return descriptions, prices, shipping, countries, conditions, similarities
+        return self.score_page(parse_html(html, PARSE_TARGETS["ebay"]), title, ramp_down, statistics)
 
-    def filter_products_by_similarity(self, product_info: list, target_title: str, similarity_threshold: float):
+    async def afind_viable_product(self, title: str, ramp_down: float, on_page: Callable[[int, ProductTable], None] = None) -> ProductTable:
         """
-        Filters a list of products based on their similarity to a target product title.
+        Asynchronous version of find_viable_product: the result pages are
+        fetched concurrently on the event loop, and each one is parsed and
+        scored in the CPU executor as soon as it arrives.
 
         Args:
-            product_info (list): A list of product dictionaries.
+            title: The title of the product.
+            ramp_down: The ramp down of the previous product in the
+                sequence.
+            on_page: Called with the page number and the table of the viable
+                products of each page as soon as it is scored.
+
+        Returns:
+            ProductTable: The table of the viable products.
+        """
+
+        pages = [None] * self.pages
+        statistics = StreamingPriceStatistics() if self.streaming_outliers else None
+
+        async def fetch_page(page_number: int) -> tuple[int, str]:
+            return page_number, await afetch_html(*self.search_request(title, page_number))
+
+        tasks = [asyncio.ensure_future(fetch_page(page_number)) for page_number in range(self.pages)]
+        try:
+            for next_page in asyncio.as_completed(tasks):
+                page_number, html = await next_page
+                pages[page_number] = await run_cpu(self.score_html, html, title, ramp_down, statistics)
+                if on_page is not None:
+                    on_page(page_number, pages[page_number])
+        finally:
+            # Don't leave fetches running when a page fails or the request is cancelled
+            for task in tasks:
+                task.cancel()
+
+        return ProductTable.concatenate(pages)
+
+    def score_products(self, products: ProductTable, target_title: str) -> np.ndarray:
+        """
+        Computes the similarity of every product to a target product title
+        in a single batch.
+
+        Args:
+            products (ProductTable): The table of products.
             target_title (str): The target product title to compare against.
+
+        Returns:
+            np.ndarray: The similarity of each product, in page order.
+        """
+
+        similarities = batch_similarity(target_title, products.titles.tolist())
+        if (similarities < 0).any():
+            raise InvalidSimilarityThreshold("Similarity threshold must be between 0 and 1.")
+
+        return similarities
+
+    def filter_products_by_similarity(self, products: ProductTable, similarity_threshold: float) -> ProductTable:
+        """
+        Filters a table of products based on their precomputed similarity to a target product title.
+
+        Args:
+            products (ProductTable): The table of scored products.
             similarity_threshold (float): The minimum similarity ratio to consider a product similar.
 
         Returns:
-            dict: A dictionary mapping the product ID to the product title.
-        """
-        filtered_products = {}
-        for product in product_info:
-            try:
-                similarity = self.get_similarity(product['title'], target_title)
-                if similarity < 0:
-                    raise InvalidSimilarityThreshold("Similarity threshold must be between 0 and 1.")
-
-                if similarity >= similarity_threshold:
-                    filtered_products[product['title']] = {
-                        'price': product['price'],
-                        'shipping': product['shipping'],
-                        'country': product['country'],
-                        'condition': product['condition'],
-                        'similarity': similarity
-                    }
-            except InvalidSimilarityThreshold:
-                return filtered_products
+            ProductTable: The table of the similar products, in page order.
+            Products sharing a title are all kept, as they usually differ in
+            price.
+        """
 
-        return filtered_products
+        # Binary search the sorted scores for the products at or above the threshold, then restore page order
+        order = np.argsort(products.similarities, kind='stable')
+        start = np.searchsorted(products.similarities[order], similarity_threshold, side='left')
 
-    def listing_product_similarity(self, title: str, similarity_threshold: float) -> dict:
+        return products.take(np.sort(order[start:]))
+
+    def listing_product_similarity(self, soup: BeautifulSoup, title: str, similarity_threshold: float) -> ProductTable:
         """
-        Returns a dictionary of all products listed on the page that are similar to the given title.
+        Returns a table of all products listed on the page that are similar to the given title.
 
         Args:
             soup (BeautifulSoup): The parsed HTML of the page.
@@ -377,9 +494,10 @@ class EbayScraper:
             similarity_threshold (float): The minimum similarity ratio to consider a product similar.
 
         Returns:
-            dict: A dictionary mapping the product ID to the product title.
+            ProductTable: The table of the similar products.
         """
-        product_info = self.get_product_info()
-        filtered_products = self.filter_products_by_similarity(product_info, title.lower(), similarity_threshold)
+        products = self.get_product_info(soup)
+        products.similarities = self.score_products(products, title.lower())
+        filtered_products = self.filter_products_by_similarity(products, similarity_threshold)
 
-        return filtered_products
\ No newline at end of file
+        return filtered_products
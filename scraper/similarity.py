@@ -0,0 +1,271 @@
+import string
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+import numpy as np
+from django.conf import settings
+from .utils import clean_text
+
+try:
+    # Cython port of difflib, returns the exact same ratios several times faster
+    from cydifflib import SequenceMatcher
+except ImportError:
+    from difflib import SequenceMatcher
+
+PUNCTUATION = str.maketrans('', '', string.punctuation)
+
+# Length of the character n-grams compared by the ngram method
+NGRAM_SIZE = 3
+
+# Entries kept by the process-level caches, popular titles recur across requests
+TITLE_CACHE_SIZE = 65536
+SCORE_CACHE_SIZE = 131072
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded mapping that evicts the least recently used
+    entry and counts its hits and misses.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get_many(self, keys: list) -> list:
+        """
+        Looks up several keys at once.
+
+        Args:
+            keys: The keys to look up.
+
+        Returns:
+            The value of each key, None for the keys that aren't cached.
+        """
+
+        values = []
+        with self.lock:
+            for key in keys:
+                value = self.entries.get(key)
+                if value is None:
+                    self.misses += 1
+                else:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                values.append(value)
+
+        return values
+
+    def set_many(self, items: list[tuple]) -> None:
+        """
+        Stores several entries at once, evicting the least recently used
+        entries beyond the size bound.
+
+        Args:
+            items: The (key, value) pairs to store.
+        """
+
+        with self.lock:
+            for key, value in items:
+                self.entries[key] = value
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Removes every entry and resets the counters.
+        """
+
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        """
+        Returns the size and hit rate of the cache.
+        """
+
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+# Similarity of (method, normalized target, normalized candidate) triples
+score_cache = LRUCache(SCORE_CACHE_SIZE)
+
+@lru_cache(maxsize=TITLE_CACHE_SIZE)
+def normalize_title(title: str) -> str:
+    """
+    Normalizes a title for comparison: lowercase, single spaces and no
+    punctuation.
+
+    Args:
+        title: The title to normalize.
+
+    Returns:
+        The normalized title.
+    """
+
+    return ' '.join(title.lower().split()).translate(PUNCTUATION)
+
+def ratio_scores(target: str, candidates: list[str]) -> np.ndarray:
+    """
+    Computes the SequenceMatcher ratio of every candidate to the target,
+    analysing the target only once.
+
+    Args:
+        target: The normalized target title.
+        candidates: The normalized candidate titles.
+
+    Returns:
+        The ratio of each candidate, identical to SequenceMatcher(None, candidate, target).ratio().
+    """
+
+    matcher = SequenceMatcher(None)
+    # SequenceMatcher caches everything it knows about the second sequence
+    matcher.set_seq2(target)
+
+    scores = np.empty(len(candidates), dtype=float)
+    for i, candidate in enumerate(candidates):
+        matcher.set_seq1(candidate)
+        scores[i] = matcher.ratio()
+
+    return scores
+
+def ngram_scores(target: str, candidates: list[str]) -> np.ndarray:
+    """
+    Computes the Dice coefficient between the character n-gram multisets of
+    every candidate and the target in one vectorized pass.
+
+    Args:
+        target: The normalized target title.
+        candidates: The normalized candidate titles.
+
+    Returns:
+        The similarity of each candidate, between 0 and 1.
+    """
+
+    def ngrams(title: str) -> list[str]:
+        return [title[i:i + NGRAM_SIZE] for i in range(max(len(title) - NGRAM_SIZE + 1, 1))]
+
+    target_ngrams = ngrams(target)
+    vocabulary = {ngram: i for i, ngram in enumerate(dict.fromkeys(target_ngrams))}
+    target_counts = np.bincount([vocabulary[ngram] for ngram in target_ngrams], minlength=len(vocabulary))
+
+    # Only n-grams shared with the target can contribute to the intersection,
+    # so the count matrix has one column per distinct n-gram of the target
+    rows, columns, lengths = [], [], np.empty(len(candidates), dtype=float)
+    for row, candidate in enumerate(candidates):
+        candidate_ngrams = ngrams(candidate)
+        lengths[row] = len(candidate_ngrams)
+        for ngram in candidate_ngrams:
+            column = vocabulary.get(ngram)
+            if column is not None:
+                rows.append(row)
+                columns.append(column)
+
+    counts = np.zeros((len(candidates), len(vocabulary)), dtype=np.int64)
+    np.add.at(counts, (np.array(rows, dtype=np.intp), np.array(columns, dtype=np.intp)), 1)
+
+    intersection = np.minimum(counts, target_counts).sum(axis=1)
+
+    return 2 * intersection / (lengths + len(target_ngrams))
+
+SIMILARITY_METHODS = {
+    # Compatibility mode, reproduces EbayScraper.get_similarity exactly so the thresholds keep working
+    'ratio': ratio_scores,
+    'ngram': ngram_scores,
+}
+
+def get_similarity_method() -> str:
+    """
+    Returns the scoring method configured by the SCRAPER_SIMILARITY_METHOD
+    setting.
+
+    Returns:
+        The name of the method, ratio when the setting is unknown.
+    """
+
+    method = getattr(settings, 'SCRAPER_SIMILARITY_METHOD', 'ratio')
+
+    return method if method in SIMILARITY_METHODS else 'ratio'
+
+def batch_similarity(target: str, candidates: list[str], method: str = None) -> np.ndarray:
+    """
+    Scores every candidate title against a target title in one call. The
+    target is normalized once, the candidates once each, and the scores of
+    pairs seen by earlier requests are served from the score cache.
+
+    Args:
+        target: The target title.
+        candidates: The candidate titles.
+        method: The scoring method, defaults to the configured one.
+
+    Returns:
+        The similarity of each candidate, in the order of the candidates.
+    """
+
+    if not candidates:
+        return np.empty(0, dtype=float)
+
+    method = method or get_similarity_method()
+    target = normalize_title(target)
+    normalized = [normalize_title(candidate) for candidate in candidates]
+
+    scores = np.empty(len(normalized), dtype=float)
+    cached = score_cache.get_many([(method, target, candidate) for candidate in normalized])
+
+    # Positions of every candidate that still has to be scored, repeated titles are scored once
+    missing = {}
+    for i, (candidate, score) in enumerate(zip(normalized, cached)):
+        if score is None:
+            missing.setdefault(candidate, []).append(i)
+        else:
+            scores[i] = score
+
+    if missing:
+        computed = SIMILARITY_METHODS[method](target, list(missing))
+        for positions, score in zip(missing.values(), computed):
+            scores[positions] = score
+        score_cache.set_many([((method, target, candidate), float(score)) for candidate, score in zip(missing, computed)])
+
+    return scores
+
+def lru_cache_stats(function) -> dict:
+    """
+    Returns the size and hit rate of a function memoized with lru_cache.
+    """
+
+    info = function.cache_info()
+    lookups = info.hits + info.misses
+
+    return {
+        'size': info.currsize,
+        'maxsize': info.maxsize,
+        'hits': info.hits,
+        'misses': info.misses,
+        'hit_rate': info.hits / lookups if lookups else 0.0
+    }
+
+def similarity_cache_stats() -> dict:
+    """
+    Returns the size and hit rate of the title normalization and similarity
+    score caches.
+
+    Returns:
+        dict: The statistics of each cache.
+    """
+
+    return {
+        'titles': lru_cache_stats(normalize_title),
+        'cleaned_titles': lru_cache_stats(clean_text),
+        'scores': score_cache.stats()
+    }
@@ -8,6 +8,15 @@ function isValidUrl(url) {
     return false;
 }
 
+// Open the streamed report of the listing, which shows each part of the analysis as soon as it's ready
+function showReport(form) {
+    var params = new URLSearchParams({url: form.elements['url'].value});
+    if (form.elements['refresh'].checked) {
+        params.set('refresh', 'on');
+    }
+    window.location.href = form.getAttribute('data-report-url') + '?' + params.toString();
+}
+
 document.getElementById('MarketForm').addEventListener('submit', function(event) {
     event.preventDefault();
 
@@ -15,10 +24,10 @@ document.getElementById('MarketForm').addEventListener('submit', function(event)
     if (isValidUrl(inputUrl.value)) {
         inputUrl.classList.add('is-valid');
         inputUrl.classList.remove('is-invalid');
-        this.submit();
+        showReport(this);
     } else {
         inputUrl.classList.add('is-invalid');
         inputUrl.classList.remove('is-valid');
     }
 
-});
\ No newline at end of file
+});
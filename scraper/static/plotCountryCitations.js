@@ -1,6 +1,13 @@
-document.addEventListener("DOMContentLoaded", function () {
+function plotCountryCitations () {
     var chart = document.getElementById('render-bargraph');
     var chartContent = chart.getAttribute('data-chart');
     var chartObject = JSON.parse(chartContent);
     Plotly.newPlot(chart, chartObject);
+}
+
+document.addEventListener("DOMContentLoaded", function () {
+    // The streamed report adds the chart later
+    if (document.getElementById('render-bargraph')) {
+        plotCountryCitations();
+    }
 });
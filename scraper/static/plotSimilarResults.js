@@ -1,6 +1,154 @@
-document.addEventListener("DOMContentLoaded", function () {
+// The parts of the plotly_white template the chart uses, a compact chart doesn't carry the template
+var chartAxis = {
+    gridcolor: '#EBF0F8',
+    linecolor: '#EBF0F8',
+    zerolinecolor: '#EBF0F8',
+    zerolinewidth: 2,
+    ticks: '',
+    automargin: true
+};
+
+var chartLayout = {
+    font: {color: '#2a3f5f'},
+    hoverlabel: {align: 'left'},
+    hovermode: 'closest',
+    paper_bgcolor: 'white',
+    plot_bgcolor: 'white',
+    colorway: ['#636efa', '#EF553B', '#00cc96', '#ab63fa', '#FFA15A', '#19d3f3', '#FF6692', '#B6E880', '#FF97FF', '#FECB52']
+};
+
+// RdYlGn_r, plotly.js doesn't know it by name
+var totalPriceColorscale = [
+    [0.0, 'rgb(0,104,55)'], [0.1, 'rgb(26,152,80)'], [0.2, 'rgb(102,189,99)'], [0.3, 'rgb(166,217,106)'],
+    [0.4, 'rgb(217,239,139)'], [0.5, 'rgb(255,255,191)'], [0.6, 'rgb(254,224,139)'], [0.7, 'rgb(253,174,97)'],
+    [0.8, 'rgb(244,109,67)'], [0.9, 'rgb(215,48,39)'], [1.0, 'rgb(165,0,38)']
+];
+
+// Decodes a column of amounts sent as base64 little-endian 32-bit integers of cents
+function decodeCents (encoded) {
+    var bytes = Uint8Array.from(atob(encoded), function (c) { return c.charCodeAt(0); });
+    var cents = new Int32Array(bytes.buffer);
+    var amounts = new Float64Array(cents.length);
+    for (var i = 0; i < cents.length; i++) {
+        amounts[i] = cents[i] / 100;
+    }
+    return amounts;
+}
+
+function formatAmount (amount) {
+    return amount.toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2});
+}
+
+// Evaluates a polynomial given its coefficients from the constant term up
+function polynomial (coefficients, x) {
+    var y = 0;
+    for (var i = coefficients.length - 1; i >= 0; i--) {
+        y = y * x + coefficients[i];
+    }
+    return y;
+}
+
+// The title of utils.chart_title, which mentions the sample when the products are downsampled
+function chartTitle (data) {
+    var rendering = data.rendering;
+    if (rendering && rendering.points < rendering.total) {
+        return `Products Similar to: ${data.title}<br><sup>Showing ${rendering.points.toLocaleString('en-US')} of ${rendering.total.toLocaleString('en-US')} products</sup>`;
+    }
+    return `Products Similar to: ${data.title}`;
+}
+
+// Builds the figure of utils.create_chart from the data of utils.create_compact_chart
+function buildChart (data) {
+    var prices = decodeCents(data.prices);
+    var shipping = decodeCents(data.shipping);
+    var totals = prices.map(function (price, i) { return price + shipping[i]; });
+    var text = data.titles.map(function (title, i) {
+        return `Product: ${title}<br>Price: $${formatAmount(prices[i])}<br>Shipping: $${formatAmount(shipping[i])}<br>Condition: ${data.conditions[data.condition_codes[i]]}`;
+    });
+
+    var traces = [
+        {
+            // Past the WebGL threshold the products are drawn on a canvas, SVG markers slow browsers down
+            type: data.rendering && data.rendering.mode === 'webgl' ? 'scattergl' : 'scatter',
+            x: Array.from(prices),
+            y: Array.from(shipping),
+            mode: 'markers',
+            marker: {color: Array.from(totals), colorscale: totalPriceColorscale, colorbar: {title: {text: 'Total Price'}, outlinewidth: 0, ticks: ''}, size: 8},
+            hovertemplate: '%{text}',
+            text: text,
+            showlegend: false,
+            name: 'Products'
+        },
+        {
+            type: 'scatter',
+            x: [data.best[0]],
+            y: [data.best[1]],
+            mode: 'markers',
+            marker: {color: '#fc0', symbol: 'star', size: 12},
+            showlegend: false,
+            hoverinfo: 'skip'
+        }
+    ];
+
+    if (prices.length) {
+        var low = Math.min.apply(null, prices);
+        var high = Math.max.apply(null, prices);
+        var points = data.trend.points;
+        var trendX = [];
+        var trendY = [];
+        for (var i = 0; i < points; i++) {
+            var x = points > 1 ? low + (high - low) * i / (points - 1) : low;
+            trendX.push(x);
+            trendY.push(polynomial(data.trend.coefficients, x));
+        }
+
+        traces.push({
+            type: 'scatter',
+            x: trendX,
+            y: trendY,
+            mode: 'lines',
+            hovertemplate: '%{text}',
+            text: trendX.map(function (x, i) { return `Predicted Price: $${x.toFixed(2)}<br>Predicted Shipping: $${trendY[i].toFixed(2)}`; }),
+            showlegend: false,
+            name: 'Trend Line',
+            line: {color: 'rgb(128, 128, 128)', dash: 'longdash'}
+        });
+
+        traces.push({
+            type: 'scatter',
+            x: trendX.concat(trendX.slice().reverse()),
+            y: trendY.map(function (y) { return y + data.trend.ci; }).concat(trendY.map(function (y) { return y - data.trend.ci; }).reverse()),
+            fill: 'toself',
+            fillcolor: 'rgba(128, 128, 128, 0.15)',
+            line: {color: 'rgba(255, 255, 255, 0)'},
+            hoverinfo: 'skip',
+            showlegend: false
+        });
+    }
+
+    var layout = Object.assign({}, chartLayout, {
+        xaxis: Object.assign({}, chartAxis, {title: {text: `Product Price $(${data.currency})`, standoff: 15}}),
+        yaxis: Object.assign({}, chartAxis, {title: {text: `Shipping Cost $(${data.currency})`, standoff: 15}}),
+        legend: {title: {text: 'Categories'}},
+        title: {text: chartTitle(data), xanchor: 'center', yanchor: 'top', y: 0.9, x: 0.5}
+    });
+
+    return {data: traces, layout: layout};
+}
+
+function plotSimilarResults () {
     var chart = document.getElementById('render-chart');
     var chartContent = chart.getAttribute('data-chart');
     var chartObject = JSON.parse(chartContent);
+    if (chartObject.format === 'compact') {
+        chartObject = buildChart(chartObject);
+    }
     Plotly.newPlot(chart, chartObject);
+}
+
+document.addEventListener("DOMContentLoaded", function () {
+    // The streamed report adds the chart later
+    if (document.getElementById('render-chart')) {
+        plotSimilarResults();
+    }
 });
@@ -1,9 +1,5 @@
-// Get all the keys in localStorage
-for (var i = localStorage.length - 1; i >= 0; i--) {
-    var shortened_url = localStorage.key(i);
-    var data = JSON.parse(localStorage.getItem(shortened_url));
-
-    // Create a row for the item and add it to the table
+// Create the row of a previously analyzed listing
+function resultRow (shortened_url, data) {
     var row = document.createElement("tr");
     row.innerHTML = `
         <td style="vertical-align: middle; horizontal-align: middle;"><img src="${data.image}" style="width:50%;" class="figure-img img-fluid rounded clickable" style="object-fit: fill;" data-url="${ shortened_url }" onClick="rowReport(this)"></td>
@@ -13,11 +9,51 @@ for (var i = localStorage.length - 1; i >= 0; i--) {
             <div class="Stars" style="--rating: ${ data.rating }" aria-label="Rating of this product is ${ data.rating } out of 5."></div>
         </td>
     `;
-    document.getElementById("result-table").appendChild(row);
+
+    return row;
+}
+
+function appendResultRow (table, shortened_url, data) {
+    table.appendChild(resultRow(shortened_url, data));
+}
+
+// Append the rows of comparable products, as they are streamed in page by page
+function appendComparableRows (table, rows) {
+    var fragment = document.createDocumentFragment();
+    rows.forEach(function (product) {
+        var row = document.createElement("tr");
+        var cells = [
+            product.title,
+            "$" + product.price.toFixed(2),
+            product.shipping ? "$" + product.shipping.toFixed(2) : "Free",
+            product.condition || "",
+            product.similarity.toFixed(2) + "%"
+        ];
+        cells.forEach(function (text) {
+            // Titles come from Ebay, so they are never parsed as HTML
+            var cell = document.createElement("td");
+            cell.textContent = text;
+            row.appendChild(cell);
+        });
+        fragment.appendChild(row);
+    });
+    table.appendChild(fragment);
 }
 
 function rowReport (select) {
     var url = select.getAttribute("data-url");
     document.getElementById("id_url").value = url;
-    document.querySelector("form").submit();
-}
\ No newline at end of file
+    showReport(document.getElementById("MarketForm"));
+}
+
+// Get all the keys in localStorage
+var resultTable = document.getElementById("result-table");
+if (resultTable) {
+    for (var i = localStorage.length - 1; i >= 0; i--) {
+        var shortened_url = localStorage.key(i);
+        var data = JSON.parse(localStorage.getItem(shortened_url));
+
+        // Create a row for the item and add it to the table
+        appendResultRow(resultTable, shortened_url, data);
+    }
+}
@@ -0,0 +1,61 @@
+// Fill in the report as the server streams each stage of the analysis
+var report = document.getElementById('report');
+var source = new EventSource(report.getAttribute('data-stream-url'));
+var listing = null;
+var comparables = 0;
+var pagesDone = 0;
+
+function streamed (event) {
+    return JSON.parse(event.data);
+}
+
+source.addEventListener('listing', function (event) {
+    listing = streamed(event);
+    document.getElementById('report-listing').innerHTML = listing.html;
+});
+
+source.addEventListener('comparables', function (event) {
+    var page = streamed(event);
+    comparables += page.rows.length;
+    pagesDone += 1;
+    appendComparableRows(document.getElementById('comparables-table'), page.rows);
+    document.getElementById('comparables-progress').textContent = `${comparables} found, ${pagesDone} of ${page.pages} pages searched`;
+});
+
+source.addEventListener('rating', function (event) {
+    var rating = streamed(event);
+    document.getElementById('report-rating').innerHTML = rating.html;
+    document.getElementById('comparables-progress').textContent = `${rating.total_items} found`;
+
+    // Remember the listing on the index page, like the non-streamed report does
+    var item = {
+        image: listing.image,
+        title: listing.title,
+        rating: String(rating.price_rating),
+        price: listing.price.toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2}),
+        date: new Date()
+    };
+    localStorage.setItem(listing.shortened_url, JSON.stringify(item));
+});
+
+source.addEventListener('charts', function (event) {
+    document.getElementById('report-charts').innerHTML = streamed(event).html;
+    plotSimilarResults();
+    plotCountryCitations();
+    source.close();
+});
+
+source.addEventListener('missing', function (event) {
+    report.innerHTML = streamed(event).html;
+    source.close();
+});
+
+source.addEventListener('failure', function (event) {
+    document.getElementById('report-rating').innerHTML = streamed(event).html;
+    source.close();
+});
+
+// Don't let the browser reconnect and start the analysis over
+source.onerror = function () {
+    source.close();
+};
@@ -0,0 +1,142 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .index import update_comparable_index
+from .models import Comparable, Listing
+from .products import ProductTable
+from .similarity import normalize_title
+
+# Defaults of the SCRAPER_STORE setting
+DEFAULT_STORE = {
+    # Record every analysis and the Ebay products it found
+    'ENABLED': False,
+    # Seconds the stored products of a search can stand in for a new one, 0 always searches Ebay
+    'MAX_AGE': 0,
+    # Fewest stored products worth serving an analysis from
+    'MIN_COMPARABLES': 20,
+}
+
+def get_store_config() -> dict:
+    """
+    Returns the store configuration, merging the SCRAPER_STORE setting over
+    the defaults.
+    """
+
+    return {**DEFAULT_STORE, **getattr(settings, 'SCRAPER_STORE', {})}
+
+def save_analysis(listing: dict, price: float, rating: dict, query: str, products: ProductTable, best: int, comparables: bool = True) -> Listing:
+    """
+    Records an analysis and the products it found, in one transaction.
+
+    Args:
+        listing (dict): The LISTING_FIELDS of the context.
+        price (float): The price of the listing.
+        rating (dict): The RATING_FIELDS of the context.
+        query (str): The normalized title of the Ebay search.
+        products (ProductTable): The comparable products.
+        best (int): The row of the best product.
+        comparables (bool): Whether to record the products, False when they
+            were served from the store in the first place.
+
+    Returns:
+        Listing: The recorded listing.
+    """
+
+    now = timezone.now()
+
+    with transaction.atomic():
+        record = Listing.objects.create(
+            url=listing['shortened_url'],
+            title=listing['title'][:255],
+            normalized_title=query[:255],
+            price=price,
+            currency=listing['currency'] or '',
+            condition=listing['condition'] or '',
+            category=listing['category'] or '',
+            city=listing['city'] or '',
+            price_rating=rating['price_rating'],
+            best_title=products.titles[best][:255],
+            best_price=products.prices[best],
+            best_shipping=products.shipping[best],
+            best_score=products.similarities[best] * 100,
+            total_items=len(products),
+            analyzed_at=now
+        )
+
+        if comparables:
+            Comparable.objects.bulk_create([
+                Comparable(
+                    listing=record,
+                    query=query[:255],
+                    position=position,
+                    title=title[:255],
+                    normalized_title=normalize_title(title)[:255],
+                    price=price,
+                    shipping=shipping,
+                    country=country,
+                    condition=condition,
+                    similarity=similarity,
+                    scraped_at=now
+                )
+                for position, (title, price, shipping, country, condition, similarity) in enumerate(zip(
+                    products.titles, products.prices, products.shipping, products.countries, products.conditions, products.similarities
+                ))
+            ], batch_size=500)
+            transaction.on_commit(update_comparable_index)
+
+    return record
+
+def recent_comparables(query: str, max_age: float) -> ProductTable:
+    """
+    Returns the products found by the most recent search for a title, if it
+    is recent enough.
+
+    Args:
+        query (str): The normalized title of the search.
+        max_age (float): The age of the oldest acceptable search, in seconds.
+
+    Returns:
+        ProductTable: The products of the search in page order, with their
+        similarity to the title, or an empty table.
+    """
+
+    latest = (
+        Comparable.objects
+        .filter(query=query[:255], scraped_at__gte=timezone.now() - timedelta(seconds=max_age))
+        .order_by('-scraped_at')
+        .values_list('listing_id', flat=True)
+        .first()
+    )
+    if latest is None:
+        return ProductTable.empty()
+
+    rows = Comparable.objects.filter(listing_id=latest).order_by('position').values_list(
+        'title', 'price', 'shipping', 'country', 'condition', 'similarity'
+    )
+    if not rows:
+        return ProductTable.empty()
+
+    titles, prices, shipping, countries, conditions, similarities = zip(*rows)
+
+    return ProductTable(titles, prices, shipping, countries, conditions, similarities)
+
+def fresh_comparables(query: str) -> ProductTable:
+    """
+    Returns the stored products that can serve an analysis instead of a new
+    Ebay search, according to the SCRAPER_STORE setting.
+
+    Args:
+        query (str): The normalized title of the search.
+
+    Returns:
+        ProductTable: The products, or None when the search has to run.
+    """
+
+    config = get_store_config()
+    if not config['ENABLED'] or config['MAX_AGE'] <= 0:
+        return None
+
+    products = recent_comparables(query, config['MAX_AGE'])
+
+    return products if len(products) >= max(config['MIN_COMPARABLES'], 1) else None
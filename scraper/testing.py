@@ -0,0 +1,123 @@
+import json
+import random
+
+WORDS = (
+    "apple iphone 12 13 pro max mini 64gb 128gb 256gb unlocked blue black white gold "
+    "case screen protector charger cable mint used new sealed samsung galaxy s21 s22 "
+    "ultra google pixel 6 7 oneplus phone smartphone carrier tmobile verizon att "
+    "refurbished excellent condition bundle lot genuine oem"
+).split()
+
+CONDITIONS = ["Pre-Owned", "Brand New", "Open Box", "For parts or not working", "Certified - Refurbished"]
+COUNTRIES = ["China", "United States", "Canada", "Japan", "Germany", "United Kingdom", "Hong Kong"]
+
+def ebay_item(rng: random.Random, missing_rate: float) -> str:
+    """
+    Renders one s-item container the way the Ebay result page lays it out.
+
+    Args:
+        rng: The random generator of the page.
+        missing_rate: The probability of leaving out each optional field.
+
+    Returns:
+        The HTML of the item.
+    """
+
+    title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 12)))
+    price = rng.lognormvariate(5, 0.8)
+
+    fields = []
+    if rng.random() >= missing_rate:
+        fields.append(f'<div class="s-item__subtitle"><span class="SECONDARY_INFO">{rng.choice(CONDITIONS)}</span></div>')
+
+    details = [f'<div class="s-item__detail s-item__detail--primary"><span class="s-item__price">${price:,.2f}</span></div>']
+    if rng.random() >= missing_rate:
+        shipping = "Free shipping" if rng.random() < 0.3 else f"+${rng.uniform(1, 40):,.2f} shipping"
+        details.append(f'<div class="s-item__detail s-item__detail--primary"><span class="s-item__shipping s-item__logisticsCost">{shipping}</span></div>')
+    if rng.random() >= missing_rate:
+        details.append(f'<div class="s-item__detail s-item__detail--primary"><span class="s-item__location s-item__itemLocation">from {rng.choice(COUNTRIES)}</span></div>')
+    details.append('<div class="s-item__detail s-item__detail--primary"><span class="s-item__watchCountTotal"><span class="BOLD">12 watchers</span></span></div>')
+
+    return (
+        '<li class="s-item s-item__pl-on-bottom" data-viewport="{}">'
+        '<div class="s-item__wrapper clearfix">'
+        '<div class="s-item__image-section"><div class="s-item__image"><a href="https://www.ebay.com/itm/1" tabindex="-1">'
+        '<div class="s-item__image-wrapper image-treatment"><img alt="" src="https://i.ebayimg.com/thumbs/images/g/1/s-l225.jpg" loading="eager"></div>'
+        '</a></div></div>'
+        '<div class="s-item__info clearfix">'
+        f'<a class="s-item__link" href="https://www.ebay.com/itm/1"><div class="s-item__title"><span role="heading" aria-level="3">{title}</span></div></a>'
+        + "".join(fields) +
+        '<div class="s-item__details clearfix">' + "".join(details) + '</div>'
+        '</div></div></li>'
+    )
+
+def ebay_search_page(items: int = 240, seed: int = 0, missing_rate: float = 0.05) -> str:
+    """
+    Generates an Ebay search result page with the given number of items,
+    surrounded by the navigation, filter and script markup of a real page.
+
+    Args:
+        items: The number of s-item containers.
+        seed: The seed of the random generator, the same seed always renders
+            the same page.
+        missing_rate: The probability of leaving out each optional field of
+            an item.
+
+    Returns:
+        The HTML of the page.
+    """
+
+    rng = random.Random(seed)
+    navigation = "".join(f'<li class="x-refine__main__list"><a href="#"><span class="cbx x-refine__multi-select-cbx">{word}</span></a></li>' for word in WORDS)
+    scripts = "".join(f'<script>window.SRP_{i}={json.dumps({"k": list(range(50))})};</script>' for i in range(20))
+
+    return (
+        '<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>iphone | eBay</title>' + scripts + '</head>'
+        '<body><div id="gh"><header><nav><ul>' + navigation * 10 + '</ul></nav></header></div>'
+        '<div id="mainContent"><div class="srp-river"><ul class="srp-results srp-list clearfix">'
+        + "".join(ebay_item(rng, missing_rate) for _ in range(items)) +
+        '</ul></div></div><footer>' + navigation * 5 + '</footer></body></html>'
+    )
+
+def marketplace_pages(seed: int = 0, missing: bool = False) -> tuple[str, str]:
+    """
+    Generates the mobile and desktop pages of a Marketplace listing.
+
+    Args:
+        seed: The seed of the random generator.
+        missing: Whether the mobile page shows that the listing is missing.
+
+    Returns:
+        A tuple of the mobile and desktop HTML of the listing.
+    """
+
+    rng = random.Random(seed)
+    title = " ".join(rng.choice(WORDS) for _ in range(6)).title()
+    listing = {
+        "@context": "https://schema.org",
+        "@type": "Product",
+        "name": title,
+        "description": " ".join(rng.choice(WORDS) for _ in range(60)),
+        "itemCondition": "https://schema.org/UsedCondition",
+        "offers": {"price": f"{rng.uniform(50, 900):.2f}", "priceCurrency": "USD"},
+        "itemListElement": [{"name": "Marketplace"}, {"name": "Vancouver, BC"}, {"name": "Electronics"}],
+    }
+
+    page_title = "Page Not Found" if missing else f"{title} - Cell Phones - Vancouver, British Columbia | Facebook Marketplace"
+    mobile = (
+        f'<!DOCTYPE html><html><head><title>{page_title}</title></head><body>'
+        '<div id="viewport"><div><img src="https://static.xx.fbcdn.net/rsrc.php/logo.png">'
+        '<img src="https://scontent.fyvr1-1.fna.fbcdn.net/v/t45.5328-4/listing.jpg"></div>'
+        + '<div class="_a58"><span>Details</span></div>' * 50 +
+        '<div><abbr>3 hours ago</abbr></div></div></body></html>'
+    )
+
+    desktop = (
+        f'<!DOCTYPE html><html><head><title>{page_title}</title>'
+        + "".join(f'<script>requireLazy(["m{i}"], function() {{ {json.dumps({"k": list(range(200))})} }});</script>' for i in range(40)) +
+        f'<script type="application/ld+json">{json.dumps(listing)}</script></head><body>'
+        + '<div class="x9f619 x1n2onr6"><div class="x78zum5"><span class="x193iq5w">Marketplace</span></div></div>' * 1500 +
+        '</body></html>'
+    )
+
+    return mobile, desktop
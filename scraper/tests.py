@@ -1,3 +1,507 @@
-from django.test import TestCase
+import datetime
+import json
+import os
+import re
+import string
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from difflib import SequenceMatcher
+from importlib.util import find_spec
+from pathlib import Path
+from unittest import mock
+import numpy as np
+from django.core.cache import cache
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from scraper.testing import ebay_search_page, marketplace_pages
+from scraper import jobs
+from scraper.index import LOW_WATERMARK, ComparableIndex
+from scraper.models import Job
+from scraper.page_cache import PageCache
+from scraper.shop_class import EbayScraper
+from scraper.similarity import batch_similarity, score_cache
+from scraper.utils import downsample_points, fit_polynomial, reject_outliers, shorten_url
 
-# Create your tests here.
+LISTING_URL = "https://www.facebook.com/marketplace/item/123456789012345/"
+
+def original_threshold(similarities: np.ndarray, ramp_down: float) -> float:
+    """
+    The threshold search of the original find_viable_product, run on the
+    similarities of a page instead of fetching the page again for every
+    threshold it tries.
+    """
+
+    similarity_threshold = 0.35
+    if (similarities >= similarity_threshold).any():
+        return similarity_threshold
+
+    found = False
+    consecutively_empty = 0
+    while not found:
+        ramp_down += 0.05
+        found = (similarities >= similarity_threshold - ramp_down).any()
+        if consecutively_empty == 2:
+            break
+
+        if found:
+            consecutively_empty = 0
+        else:
+            consecutively_empty += 1
+
+    return similarity_threshold - ramp_down if found else None
+
+def original_similarity(string1: str, string2: str) -> float:
+    """
+    The original EbayScraper.get_similarity.
+    """
+
+    string1 = ' '.join(string1.lower().strip().split())
+    string2 = ' '.join(string2.lower().strip().split())
+
+    translator = str.maketrans('', '', string.punctuation)
+
+    return SequenceMatcher(None, string1.translate(translator), string2.translate(translator)).ratio()
+
+def original_outliers(data: list[float], m: float) -> list[int]:
+    """
+    The original reject_outliers, which returned the indices of the outliers.
+    """
+
+    if len(data) <= 0:
+        return []
+
+    distribution = np.abs(data - np.median(data))
+    m_deviation = np.median(distribution)
+    standard = distribution / (m_deviation if m_deviation else 1.)
+
+    return np.where(standard >= m)[0].tolist()
+
+class RampDownThresholdTests(SimpleTestCase):
+    def test_matches_the_original_threshold_loop(self):
+        scraper = EbayScraper()
+        rng = np.random.default_rng(0)
+
+        for ramp_down in (0.0, 0.05, 0.1):
+            for high in (0.5, 0.36, 0.35, 0.31, 0.3, 0.26, 0.21, 0.2, 0.1):
+                similarities = rng.uniform(0, high, 50)
+                similarities[0] = high
+                with self.subTest(ramp_down=ramp_down, high=high):
+                    self.assertEqual(scraper.ramp_down_threshold(similarities, ramp_down), original_threshold(similarities, ramp_down))
+
+    def test_no_threshold_without_products(self):
+        self.assertIsNone(EbayScraper().ramp_down_threshold(np.empty(0), 0.0))
+
+class BatchSimilarityTests(SimpleTestCase):
+    def setUp(self):
+        score_cache.clear()
+
+    def test_ratio_matches_sequence_matcher(self):
+        target = "  Apple iPhone 12 Pro - 128GB, Graphite (Unlocked)! "
+        candidates = [
+            "Apple iPhone 12 Pro 128GB Graphite Unlocked",
+            "APPLE   IPHONE 12 PRO, 256GB - Pacific Blue",
+            "iPhone 12 Pro Max case",
+            "Samsung Galaxy S21",
+            "",
+            "Apple iPhone 12 Pro 128GB Graphite Unlocked",
+        ]
+
+        expected = [original_similarity(candidate, target) for candidate in candidates]
+
+        np.testing.assert_array_equal(batch_similarity(target, candidates, method='ratio'), expected)
+        # The second call is served from the score cache
+        np.testing.assert_array_equal(batch_similarity(target, candidates, method='ratio'), expected)
+
+    def test_matches_get_similarity(self):
+        scraper = EbayScraper()
+
+        self.assertEqual(scraper.get_similarity("Nintendo Switch OLED", "nintendo switch (oled model)"), original_similarity("Nintendo Switch OLED", "nintendo switch (oled model)"))
+
+class RejectOutliersTests(SimpleTestCase):
+    def test_mask_matches_the_original_indices(self):
+        rng = np.random.default_rng(1)
+        prices = np.concatenate([rng.normal(200, 20, 200), [5, 900, 1500]])
+
+        for m in (1.5, 3.0):
+            with self.subTest(m=m):
+                np.testing.assert_array_equal(np.flatnonzero(reject_outliers(prices, m)), original_outliers(prices, m))
+
+    def test_constant_prices(self):
+        # The median absolute deviation is zero, distances are compared as they are
+        mask = reject_outliers(np.array([10.0, 10.0, 10.0, 12.0]), 1.5)
+
+        np.testing.assert_array_equal(mask, [False, False, False, True])
+
+    def test_empty(self):
+        self.assertEqual(reject_outliers(np.empty(0), 1.5).shape, (0,))
+
+    def test_estimates(self):
+        mask = reject_outliers(np.array([90.0, 100.0, 130.0]), 1.5, median=100.0, deviation=10.0)
+
+        np.testing.assert_array_equal(mask, [False, False, True])
+
+class PageCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.cache = PageCache(self.directory, 1024 * 1024, {'default': 60, 'm.facebook.com': 0})
+
+    def test_hit_until_the_ttl(self):
+        url = "https://www.ebay.com/sch/i.html?_nkw=switch&_pgn=1"
+        self.cache.set(url, {}, "Nintendo Switch €".encode('utf-8'), 'utf-8')
+
+        self.assertEqual(self.cache.get(url, {}), "Nintendo Switch €")
+
+        stored = time.time()
+        with mock.patch('scraper.page_cache.time.time', return_value=stored + 61):
+            self.assertIsNone(self.cache.get(url, {}))
+
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['expired'], 1)
+
+    def test_zero_ttl_host_is_not_cached(self):
+        url = "https://m.facebook.com/marketplace/item/123456789012345/"
+        self.cache.set(url, {}, b"listing", 'utf-8')
+
+        self.assertIsNone(self.cache.get(url, {}))
+        self.assertEqual(self.cache.entries(), [])
+
+    def test_equivalent_urls_share_an_entry(self):
+        self.cache.set("HTTPS://WWW.EBAY.COM:443/sch/i.html?b=2&a=1#results", {'Accept': 'text/html'}, b"page", 'utf-8')
+
+        self.assertEqual(self.cache.get("https://www.ebay.com/sch/i.html?a=1&b=2", {'accept': 'text/html'}), "page")
+        self.assertIsNone(self.cache.get("https://www.ebay.com/sch/i.html?a=1&b=2", {'accept': 'application/json'}))
+
+    def test_evicts_the_least_recently_used(self):
+        self.cache.max_bytes = 2500
+        urls = [f"https://www.ebay.com/sch/i.html?_pgn={page}" for page in range(3)]
+        for age, url in zip((300, 200, 100), urls):
+            self.cache.set(url, {}, b"x" * 700, 'utf-8')
+            path = self.cache.path(self.cache.key(url, {}))
+            os.utime(path, (time.time() - age, time.time() - age))
+
+        # Reading the oldest entry makes it the most recently used
+        self.assertIsNotNone(self.cache.get(urls[0], {}))
+        self.cache.set("https://www.ebay.com/sch/i.html?_pgn=3", {}, b"x" * 700, 'utf-8')
+
+        self.assertIsNone(self.cache.get(urls[1], {}))
+        self.assertIsNotNone(self.cache.get(urls[0], {}))
+        self.assertLessEqual(self.cache.disk_usage(), self.cache.max_bytes * 0.9)
+        self.assertGreaterEqual(self.cache.stats()['evictions'], 1)
+
+class ComparableIndexTests(SimpleTestCase):
+    titles = [
+        "apple iphone 12 pro 128gb graphite",
+        "apple iphone 12 pro max 256gb",
+        "samsung galaxy s21 ultra",
+        "nintendo switch oled white",
+        "apple iphone 11 64gb",
+    ]
+
+    def build(self, max_documents: int = 100) -> ComparableIndex:
+        index = ComparableIndex(max_documents)
+        index.add_many(enumerate(self.titles, start=1))
+        return index
+
+    def test_search_ranks_the_closest_titles_first(self):
+        index = self.build()
+
+        results = index.search("Apple iPhone 12 Pro 128GB", 3)
+
+        self.assertEqual([comparable_id for comparable_id, _ in results], [1, 2, 5])
+        self.assertEqual([score for _, score in results], sorted((score for _, score in results), reverse=True))
+        self.assertEqual(index.search("playstation", 3), [])
+
+    def test_repeated_title_points_at_the_newest_product(self):
+        index = self.build()
+        index.add(10, "samsung galaxy s21 ultra")
+
+        self.assertEqual(len(index), len(self.titles))
+        self.assertEqual(index.search("samsung galaxy s21 ultra", 1)[0][0], 10)
+
+    def test_products_already_inserted_are_skipped(self):
+        index = self.build()
+        index.add_many([(3, "sony wh-1000xm4"), (6, "sony wh-1000xm4")])
+
+        self.assertEqual(index.last_id, 6)
+        self.assertEqual([comparable_id for comparable_id, _ in index.search("sony wh-1000xm4", 5)], [6])
+        self.assertEqual(index.search("samsung galaxy s21 ultra", 1)[0][0], 3)
+
+    def test_compaction_keeps_the_results(self):
+        index = self.build()
+        before = index.search("apple iphone 12", 5)
+
+        index.compact()
+
+        self.assertEqual(index.delta_size, 0)
+        self.assertEqual(index.search("apple iphone 12", 5), before)
+
+    def test_eviction_drops_the_oldest_titles(self):
+        index = self.build(max_documents=4)
+
+        # Trimmed to the low watermark, the first two titles are gone
+        self.assertEqual(len(index), int(4 * LOW_WATERMARK))
+        self.assertEqual([comparable_id for comparable_id, _ in index.search("apple iphone 12 pro", 5)], [5])
+        self.assertEqual(index.search("samsung galaxy s21 ultra", 5)[0][0], 3)
+
+    def test_save_and_load(self):
+        index = self.build()
+        with tempfile.TemporaryDirectory() as directory:
+            index.save(Path(directory) / 'index')
+            loaded = ComparableIndex.load(Path(directory) / 'index')
+
+            self.assertEqual(loaded.search("apple iphone 12", 5), index.search("apple iphone 12", 5))
+            self.assertEqual(loaded.last_id, index.last_id)
+
+class DownsamplePointsTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(2)
+        self.x = np.concatenate([rng.normal(300, 30, 5000), [2000.0]])
+        self.y = np.concatenate([rng.normal(15, 3, 5000), [0.5]])
+
+    def test_few_points_are_all_kept(self):
+        np.testing.assert_array_equal(downsample_points(self.x[:10], self.y[:10], [3], 100), np.arange(10))
+
+    def test_keeps_the_extremes_and_the_required_points(self):
+        selected = downsample_points(self.x, self.y, [1234], 500)
+
+        self.assertLessEqual(len(selected), 500)
+        self.assertGreater(len(selected), 400)
+        np.testing.assert_array_equal(selected, np.unique(selected))
+        sums = self.x + self.y
+        for required in (1234, self.x.argmin(), self.x.argmax(), self.y.argmin(), self.y.argmax(), sums.argmin(), sums.argmax()):
+            self.assertIn(required, selected)
+
+    def test_keeps_the_shape(self):
+        selected = downsample_points(self.x, self.y, [], 500)
+
+        self.assertAlmostEqual(np.median(self.x[selected]), np.median(self.x), delta=5)
+        self.assertAlmostEqual(np.median(self.y[selected]), np.median(self.y), delta=0.5)
+
+class FitPolynomialTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        self.x = np.sort(rng.uniform(20, 1500, 300))
+        self.y = 5 + 0.02 * self.x - 1e-5 * self.x ** 2 + rng.normal(0, 2, 300)
+
+    def test_matches_polyfit(self):
+        fit = fit_polynomial(self.x, self.y)
+
+        coefficients = np.polynomial.polynomial.polyfit(self.x, self.y, 4)
+        np.testing.assert_allclose(fit['y'], np.polynomial.polynomial.polyval(fit['x'], coefficients), rtol=1e-7, atol=1e-7)
+        np.testing.assert_allclose(fit['coefficients'], coefficients, rtol=1e-5, atol=1e-12)
+        self.assertEqual(fit['rank'], 5)
+
+    @unittest.skipUnless(find_spec('sklearn'), "scikit-learn isn't installed")
+    def test_matches_the_original_scikit_learn_fit(self):
+        from sklearn.linear_model import LinearRegression
+        from sklearn.metrics import mean_squared_error
+        from sklearn.preprocessing import PolynomialFeatures
+
+        prices = self.x.reshape(-1, 1)
+        features = PolynomialFeatures(degree=4, include_bias=True)
+        model = LinearRegression().fit(features.fit_transform(prices), self.y)
+        curve_x = np.linspace(prices.min(), prices.max(), 100)
+        curve_y = model.predict(features.fit_transform(curve_x.reshape(-1, 1)))
+        mse = mean_squared_error(self.y, model.predict(features.fit_transform(prices)))
+
+        fit = fit_polynomial(self.x, self.y)
+
+        np.testing.assert_allclose(fit['x'], curve_x)
+        np.testing.assert_allclose(fit['y'], curve_y, rtol=1e-6, atol=1e-6)
+        self.assertAlmostEqual(fit['mse'], mse, places=6)
+        np.testing.assert_allclose(fit['upper'] - fit['y'], 1.96 * np.sqrt(mse), rtol=1e-6)
+
+    def test_single_price(self):
+        fit = fit_polynomial(np.full(5, 100.0), np.array([1.0, 2.0, 3.0, 4.0, 5.0]))
+
+        np.testing.assert_allclose(fit['y'], 3.0)
+        np.testing.assert_allclose(fit['coefficients'], [3.0, 0, 0, 0, 0], atol=1e-12)
+
+    def test_robust_fit_ignores_outliers(self):
+        y = self.y.copy()
+        y[::25] += 200
+
+        plain = fit_polynomial(self.x, y)
+        robust = fit_polynomial(self.x, y, robust=True)
+        clean = fit_polynomial(self.x, self.y)
+
+        self.assertLess(np.abs(robust['y'] - clean['y']).max(), np.abs(plain['y'] - clean['y']).max() / 5)
+        self.assertGreater(robust['iterations'], 0)
+
+class SimulatedResponse:
+    """
+    The parts of a requests response the scraper reads.
+    """
+
+    def __init__(self, html: str):
+        self.text = html
+        self.content = html.encode()
+        self.status_code = 200
+        self.encoding = 'utf-8'
+        self.apparent_encoding = 'utf-8'
+
+class SimulatedUpstream:
+    """
+    Stands in for client.fetch, serving synthetic Marketplace and Ebay pages.
+    """
+
+    def __init__(self, missing: bool = False):
+        self.mobile, self.desktop = marketplace_pages(missing=missing)
+        self.ebay = [ebay_search_page(48, seed=page) for page in range(5)]
+
+    def fetch(self, url: str, headers: dict, cancel=None) -> SimulatedResponse:
+        if 'ebay' in url:
+            return SimulatedResponse(self.ebay[int(re.search(r"_pgn=(\d+)", url).group(1)) - 1])
+
+        return SimulatedResponse(self.mobile if '//m.' in url else self.desktop)
+
+class ViewTestMixin:
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        score_cache.clear()
+        self.upstream = SimulatedUpstream()
+        patcher = mock.patch('scraper.utils.fetch', side_effect=lambda *args: self.upstream.fetch(*args))
+        self.fetch = patcher.start()
+        self.addCleanup(patcher.stop)
+
+class IndexTests(ViewTestMixin, SimpleTestCase):
+    def test_no_comparable_products(self):
+        self.upstream.ebay = [ebay_search_page(0, seed=page) for page in range(5)]
+
+        response = self.client.post('/', {'url': LISTING_URL})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'scraper/failure.html')
+
+@override_settings(SCRAPER_BATCH={'PARALLELISM': 2, 'MAX_PARALLELISM': 4, 'MAX_URLS': 4})
+class BatchAnalysisTests(ViewTestMixin, SimpleTestCase):
+    def post(self, body) -> list[dict]:
+        response = self.client.post('/api/batch/', json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_streams_one_line_per_listing(self):
+        urls = [LISTING_URL, LISTING_URL.replace("123456789012345", "223456789012345"), LISTING_URL + "?ref=share", "https://example.com/item/1"]
+        lines = {line['url']: line for line in self.post({'urls': urls})}
+
+        self.assertEqual(len(lines), 3)
+        self.assertIsNotNone(lines["https://example.com/item/1"]['error'])
+        for url in map(shorten_url, urls[:2]):
+            result = lines[url]['result']
+            self.assertIsNone(lines[url]['error'])
+            self.assertIsInstance(result['best_price'], float)
+            self.assertIsInstance(result['best_shipping'], float)
+            self.assertIsInstance(result['price'], float)
+            self.assertNotIn('chart', result)
+
+        # Both listings have the same title, their Ebay search runs once
+        self.assertEqual(sum('ebay' in call.args[0] for call in self.fetch.call_args_list), 5)
+
+    def test_charts_on_request(self):
+        lines = self.post({'urls': [LISTING_URL], 'charts': True})
+
+        self.assertIn('chart', lines[0]['result'])
+        self.assertIn('bargraph', lines[0]['result'])
+
+    def test_missing_listing(self):
+        self.upstream = SimulatedUpstream(missing=True)
+
+        lines = self.post({'urls': [LISTING_URL]})
+
+        self.assertEqual(lines[0]['error'], "The listing doesn't exist anymore.")
+
+    def test_invalid_batches(self):
+        for body in ('not json', '[]', '{"urls": []}', '{"urls": ["a", "b", "c", "d", "e"]}', '{"urls": ["a"], "parallelism": 0}'):
+            with self.subTest(body=body):
+                response = self.client.post('/api/batch/', body, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+@override_settings(SCRAPER_JOBS={'MAX_WORKERS': 1, 'MAX_PENDING': 2})
+class JobsTests(ViewTestMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        # A queue of one worker thread per test, waiting for it lets the test poll without racing its writes
+        jobs._queue = None
+        self.queue = jobs.get_job_queue()
+        self.addCleanup(self.queue.shutdown)
+        self.wait()
+
+    def wait(self):
+        self.queue.executor.submit(int).result()
+
+    def test_submit_and_poll(self):
+        response = self.client.post('/jobs/', {'url': LISTING_URL})
+        self.assertEqual(response.status_code, 202)
+        submitted = response.json()
+        self.assertEqual(submitted['status'], 'queued')
+
+        self.wait()
+        job = self.client.get(submitted['status_url']).json()
+
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['stage'], 'rating')
+        self.assertEqual(job['pages_total'], 5)
+        self.assertEqual(sorted(job['pages_done']), list(range(5)))
+        self.assertIsInstance(job['result']['best_price'], float)
+        self.assertNotIn('error', job)
+
+    def test_missing_listing(self):
+        self.upstream = SimulatedUpstream(missing=True)
+
+        submitted = self.client.post('/jobs/', {'url': LISTING_URL}).json()
+        self.wait()
+        job = self.client.get(submitted['status_url']).json()
+
+        self.assertEqual(job['status'], 'missing')
+        self.assertEqual(job['error'], "The listing doesn't exist anymore.")
+
+    def test_full_queue(self):
+        # Keep the worker busy so the submissions stay queued
+        with mock.patch.object(self.queue, 'drain'):
+            for _ in range(2):
+                self.assertEqual(self.client.post('/jobs/', {'url': LISTING_URL}).status_code, 202)
+            response = self.client.post('/jobs/', {'url': LISTING_URL})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '30')
+
+    def test_invalid_and_unknown_jobs(self):
+        self.assertEqual(self.client.post('/jobs/', {'url': "not a url"}).status_code, 400)
+        self.assertEqual(self.client.get('/jobs/0123456789abcdef/').status_code, 404)
+
+    def test_requeues_only_the_jobs_of_gone_workers(self):
+        exited = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True, text=True)
+        now = timezone.now()
+        silent = now - datetime.timedelta(seconds=301)
+        workers = {
+            'alive': (self.queue.worker, now),
+            'exited': (f"{self.queue.host}:{int(exited.stdout)}", now),
+            'remote': ("elsewhere:1", now),
+            'silent': ("elsewhere:2", silent),
+        }
+        ids = {name: Job.objects.create(url=LISTING_URL, status='running', worker=worker, updated=updated).id for name, (worker, updated) in workers.items()}
+
+        # Leave the requeued jobs queued
+        with mock.patch.object(self.queue, 'drain'):
+            self.queue.prune()
+
+        statuses = {name: Job.objects.get(id=job_id).status for name, job_id in ids.items()}
+        self.assertEqual(statuses, {'alive': 'running', 'exited': 'queued', 'remote': 'running', 'silent': 'queued'})
+
+    def test_a_job_taken_over_is_not_finished_by_its_old_run(self):
+        job = Job.objects.create(url=LISTING_URL, status='running', worker="elsewhere:1")
+
+        self.queue.finish(job, 'failed', error="Lost")
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'running')
+        self.assertIsNone(job.error)
@@ -1,13 +1,22 @@
-from bs4 import BeautifulSoup
-from .exceptions import *
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.builder import builder_registry
+from django.conf import settings
+from .client import fetch
+from .async_client import afetch
+from .page_cache import get_page_cache
+from .products import ProductTable
 import numpy as np
-import requests
+import asyncio
+import os
+import threading
+import hashlib
+import base64
+import json
 import re
-import plotly.graph_objects as go
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import PolynomialFeatures
-from sklearn.metrics import mean_squared_error
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from math import comb
 
 def remove_illegal_characters(title: str) -> str:
     """
@@ -25,6 +34,35 @@ def remove_illegal_characters(title: str) -> str:
 
     return title
 
+def shorten_url(url: str) -> str:
+    """
+    Strip the query string and trailing path from a Marketplace URL, leaving
+    the canonical URL of the listing.
+
+    Args:
+        url (str): URL of the Marketplace listing.
+
+    Returns:
+        str: The canonical URL, ending with the listing ID.
+    """
+
+    return re.search(r".*[0-9]", url).group(0)
+
+def result_cache_key(shortened_url: str) -> str:
+    """
+    Build the cache key of the analysis of a listing.
+
+    Args:
+        shortened_url (str): The canonical URL of the listing.
+
+    Returns:
+        str: The cache key, hashed to stay within cache backend key limits.
+    """
+
+    # Versioned with the format of the context, v2 holds the prices as numbers
+    return "marketscrape:analysis:v2:" + hashlib.sha256(shortened_url.encode()).hexdigest()
+
+@lru_cache(maxsize=65536)
 def clean_text(title: str) -> str:
     """
     Remove non-ASCII characters from title and description fields.
@@ -41,52 +79,226 @@ def clean_text(title: str) -> str:
 
     return cleaned
 
-def create_soup(url: str, headers: dict) -> BeautifulSoup:
+# Subtrees each caller reads, the rest of the page is never materialized. The mobile Marketplace
+# page is small and is searched for loose strings, so it is always parsed in full.
+PARSE_TARGETS = {
+    "ebay": SoupStrainer("li", class_=re.compile(r"(^|\s)s-item(\s|$)")),
+    "marketplace": SoupStrainer("script", attrs={"type": "application/ld+json"}),
+}
+
+def get_html_parser() -> str:
+    """
+    Get the parser backend configured by the SCRAPER_HTML_PARSER setting.
+
+    Returns:
+        str: The name of the parser, html.parser when the configured backend is not installed.
+    """
+
+    parser = getattr(settings, "SCRAPER_HTML_PARSER", "lxml")
+    if builder_registry.lookup(parser) is None:
+        return "html.parser"
+
+    return parser
+
+def parse_html(html: str, parse_only: SoupStrainer = None, parser: str = None) -> BeautifulSoup:
+    """
+    Create a BeautifulSoup object from HTML content.
+
+    Args:
+        html (str): The HTML content to parse
+        parse_only (SoupStrainer): Optional target, only the matching subtrees are built
+        parser (str): Optional parser backend, defaults to the configured one
+    Returns:
+        BeautifulSoup: BeautifulSoup object of the HTML content
+    """
+
+    return BeautifulSoup(html, parser or get_html_parser(), parse_only=parse_only)
+
+def create_soup(url: str, headers: dict, cancel: threading.Event = None, parse_only: SoupStrainer = None) -> BeautifulSoup:
     """
     Create a BeautifulSoup object from a URL.
 
     Args:
         url (str): URL of the page to scrape
         headers (dict): Dictionary of headers to use in the request
+        cancel (threading.Event): Optional event that aborts the fetch once set
+        parse_only (SoupStrainer): Optional target, only the matching subtrees are built
     Returns:
         BeautifulSoup: BeautifulSoup object of the URL's HTML content
     """
 
-    response = requests.get(url, headers=headers)
-    soup = BeautifulSoup(response.text, 'html.parser')
+    cache = get_page_cache()
+    html = cache.get(url, headers) if cache else None
+
+    if html is None:
+        response = fetch(url, headers, cancel)
+        html = response.text
+        if cache and response.status_code == 200:
+            cache.set(url, headers, response.content, response.encoding or response.apparent_encoding)
+
+    soup = parse_html(html, parse_only)
 
     return soup
 
-def reject_outliers(data: list[float], m: float) -> list[int]:
+_cpu_executor = None
+_cpu_executor_pid = None
+
+def get_cpu_executor() -> ThreadPoolExecutor:
     """
-    This function rejects outliers from the input list of data. The outliers are rejected using the
-    Tukey method, which defines the outliers as the data that are more than m times the interquartile
-    range outside the first and third quartiles. The default value of m is 1.5, but can be changed
-    by the user.
+    Returns the process-wide executor the asynchronous pipeline offloads
+    parsing, scoring and charting to, sized by the SCRAPER_CPU_WORKERS
+    setting.
+
+    Returns:
+        ThreadPoolExecutor: The shared executor.
+    """
+
+    global _cpu_executor, _cpu_executor_pid
+
+    if _cpu_executor is None or _cpu_executor_pid != os.getpid():
+        _cpu_executor = ThreadPoolExecutor(max_workers=getattr(settings, 'SCRAPER_CPU_WORKERS', None) or os.cpu_count(), thread_name_prefix='scraper-cpu')
+        _cpu_executor_pid = os.getpid()
+
+    return _cpu_executor
+
+async def run_cpu(function, *args, **kwargs):
+    """
+    Runs a CPU-bound function in the executor of get_cpu_executor, keeping
+    the event loop free to serve other requests meanwhile.
 
     Args:
-        data: A list of float values.
-        m: A float value defining the number of interquartile ranges outside which the data are
-            considered outliers. The default value is 1.5.
+        function: The function to run.
+        *args: The positional arguments of the function.
+        **kwargs: The keyword arguments of the function.
 
     Returns:
-        A list of indices where the outliers occured.
+        The result of the function.
     """
 
-    try:
-        if len(data) <= 0:
-            raise InvalidDataFormat("No data was provided")
+    return await asyncio.get_running_loop().run_in_executor(get_cpu_executor(), partial(function, *args, **kwargs))
+
+async def afetch_html(url: str, headers: dict) -> str:
+    """
+    Retrieves the HTML of a page without blocking the event loop, through
+    the page cache when it is enabled.
+
+    Args:
+        url (str): URL of the page to retrieve
+        headers (dict): Dictionary of headers to use in the request
+
+    Returns:
+        str: The HTML of the page.
+    """
+
+    cache = get_page_cache()
+    html = await run_cpu(cache.get, url, headers) if cache else None
+
+    if html is None:
+        response = await afetch(url, headers)
+        html = response.text
+        if cache and response.status_code == 200:
+            await run_cpu(cache.set, url, headers, response.content, response.encoding)
+
+    return html
+
+async def acreate_soup(url: str, headers: dict, parse_only: SoupStrainer = None) -> BeautifulSoup:
+    """
+    Asynchronous version of create_soup: the page is fetched on the event
+    loop and parsed in the CPU executor. Cancelling the coroutine aborts the
+    fetch.
+
+    Args:
+        url (str): URL of the page to scrape
+        headers (dict): Dictionary of headers to use in the request
+        parse_only (SoupStrainer): Optional target, only the matching subtrees are built
+
+    Returns:
+        BeautifulSoup: BeautifulSoup object of the URL's HTML content
+    """
+
+    html = await afetch_html(url, headers)
+
+    return await run_cpu(parse_html, html, parse_only)
+
+def reject_outliers(data: np.ndarray, m: float, median: float = None, deviation: float = None) -> np.ndarray:
+    """
+    This function flags the outliers of the input data. A value is an outlier when its distance
+    to the median is at least m times the median absolute deviation (MAD) of the data. The median
+    and the MAD are computed once, unless estimates of them are passed in.
+
+    Args:
+        data: An array of float values.
+        m: A float value defining the number of median absolute deviations away from the median
+            beyond which the data are considered outliers, usually 1.5.
+        median: An estimate of the median to use instead of the median of the data.
+        deviation: An estimate of the MAD to use instead of the MAD of the data.
+
+    Returns:
+        A boolean mask that is True where the outliers occured.
+    """
+
+    data = np.asarray(data, dtype=float)
+    if data.size == 0:
+        return np.zeros(0, dtype=bool)
+
+    distribution = np.abs(data - (np.median(data) if median is None else median))
+    if deviation is None:
+        deviation = np.median(distribution)
+
+    return distribution / (deviation if deviation else 1.) >= m
+
+class StreamingPriceStatistics:
+    """
+    Running estimate of the median and median absolute deviation of the
+    prices of every page seen so far, so outliers can be removed from each
+    page as soon as it arrives instead of after the last one.
+
+    The estimates are taken over a uniform reservoir sample of the prices,
+    which keeps the memory and the cost of each update bounded however many
+    pages stream in. Until the reservoir fills up they are exact.
+    """
+
+    def __init__(self, capacity: int = 4096, seed: int = 0):
+        self.sample = np.empty(capacity, dtype=float)
+        self.size = 0
+        self.count = 0
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+
+    def update(self, prices: np.ndarray) -> tuple[float, float]:
+        """
+        Adds the prices of a page to the sample.
 
-        distribution = np.abs(data - np.median(data))
-    except InvalidDataFormat:
-        return []
+        Args:
+            prices: The prices of the page.
 
-    m_deviation = np.median(distribution)
-    standard = distribution / (m_deviation if m_deviation else 1.)
+        Returns:
+            A tuple of the median and median absolute deviation estimates,
+            including the new prices.
+        """
 
-    indices = np.where(standard >= m)[0]
+        prices = np.asarray(prices, dtype=float)
 
-    return indices.tolist()
+        with self.lock:
+            capacity = len(self.sample)
+            free = min(capacity - self.size, len(prices))
+            self.sample[self.size:self.size + free] = prices[:free]
+            self.size += free
+
+            # Reservoir sampling: the price seen in position t replaces a random slot with probability capacity / t
+            rest = prices[free:]
+            if len(rest):
+                seen = self.count + free + np.arange(1, len(rest) + 1)
+                slots = self.rng.integers(0, seen)
+                keep = slots < capacity
+                self.sample[slots[keep]] = rest[keep]
+
+            self.count += len(prices)
+            sample = self.sample[:self.size]
+            median = np.median(sample) if self.size else 0.0
+            deviation = np.median(np.abs(sample - median)) if self.size else 0.0
+
+        return median, deviation
 
 def price_difference_rating(initial: float, final: float, days: int) -> float:
     """
@@ -157,29 +369,288 @@ def percentage_difference(list_price: float, best_price: float) -> dict:
 
     return difference
 
-def create_chart(similar_prices: list[float], similar_shipping: list[float], similar_descriptions: list[str], similar_conditions: list[str], listing_currency: str, listing_title: str, best_title: str) -> object:
+# Points of the trend line of the price chart
+CHART_TREND_POINTS = 100
+
+# Tuning constant of the Tukey biweight of the robust fit, 95% efficient for normal residuals
+ROBUST_TUNING = 4.685
+
+def fit_polynomial(x: np.ndarray, y: np.ndarray, degree: int = 4, weights: np.ndarray = None, robust: bool = False, points: int = CHART_TREND_POINTS, iterations: int = 10) -> dict:
+    """
+    Fits a polynomial of y in x by least squares, with NumPy only. The powers
+    of x are taken on x mapped to [-1, 1], which keeps the problem well
+    conditioned for prices in the thousands, and the coefficients are
+    converted back to x.
+
+    Args:
+        x (np.ndarray): The values of the variable.
+        y (np.ndarray): The values to fit.
+        degree (int): The degree of the polynomial.
+        weights (np.ndarray): The weight of every point, all the same by default.
+        robust (bool): Whether to refit with Tukey biweights, so that points
+            far from the curve stop pulling it towards them.
+        points (int): The number of points of the curve.
+        iterations (int): The most refits of the robust fit.
+
+    Returns:
+        dict: The fit:
+            - coefficients: The coefficients of the polynomial in x, from the
+              constant term up.
+            - x, y: The curve, evenly spaced over the range of x.
+            - lower, upper: The 95% confidence band of the curve.
+            - ci: The half-width of the band, 1.96 times the root mean
+              squared error.
+            - mse: The (weighted) mean squared error of the fit.
+            - r2: The (weighted) coefficient of determination.
+            - rank: The rank of the least squares problem.
+            - condition: The condition number of the least squares problem.
+            - iterations: The number of robust refits.
+    """
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    weights = np.ones(len(x)) if weights is None else np.asarray(weights, dtype=float)
+
+    low, high = (x.min(), x.max()) if len(x) else (0.0, 0.0)
+    # With a single price, the only curve is the mean shipping cost
+    scale = (high - low) / 2 or 1.0
+    center = (high + low) / 2
+
+    def solve(point_weights: np.ndarray) -> tuple[np.ndarray, int, float]:
+        vandermonde = np.polynomial.polynomial.polyvander((x - center) / scale, degree)
+        if high == low:
+            vandermonde[:, 1:] = 0.0
+        root = np.sqrt(point_weights)
+        solution, _, rank, singular_values = np.linalg.lstsq(vandermonde * root[:, None], y * root, rcond=None)
+        condition = singular_values[0] / singular_values[-1] if len(singular_values) and singular_values[-1] > 0 else np.inf
+        return solution, rank, condition
+
+    solution, rank, condition = solve(weights)
+
+    refits = 0
+    if robust:
+        point_weights = weights
+        for refits in range(1, iterations + 1):
+            residuals = y - np.polynomial.polynomial.polyval((x - center) / scale, solution)
+            # Median absolute deviation, scaled to the standard deviation of normal residuals
+            spread = 1.4826 * np.median(np.abs(residuals - np.median(residuals)))
+            if spread == 0:
+                break
+            u = residuals / (ROBUST_TUNING * spread)
+            point_weights = weights * np.where(np.abs(u) < 1, (1 - u ** 2) ** 2, 0.0)
+            previous = solution
+            solution, rank, condition = solve(point_weights)
+            if np.allclose(solution, previous, rtol=1e-8, atol=1e-10):
+                break
+        weights = point_weights
+
+    # Coefficients in x, expanding the powers of (x - center) / scale of the fitted polynomial
+    coefficients = np.zeros(degree + 1)
+    for power, coefficient in enumerate(solution if high != low else solution[:1]):
+        for j in range(power + 1):
+            coefficients[j] += coefficient * comb(power, j) * (-center) ** (power - j) / scale ** power
+
+    predicted = np.polynomial.polynomial.polyval((x - center) / scale, solution)
+    total = weights.sum()
+    mse = float(np.sum(weights * (y - predicted) ** 2) / total) if total else 0.0
+    mean = np.sum(weights * y) / total if total else 0.0
+    variance = float(np.sum(weights * (y - mean) ** 2) / total) if total else 0.0
+    ci = 1.96 * np.sqrt(mse)
+
+    curve_x = np.linspace(low, high, points)
+    curve_y = np.polynomial.polynomial.polyval((curve_x - center) / scale, solution)
+
+    return {
+        'coefficients': coefficients,
+        'x': curve_x,
+        'y': curve_y,
+        'lower': curve_y - ci,
+        'upper': curve_y + ci,
+        'ci': ci,
+        'mse': mse,
+        'r2': 1 - mse / variance if variance else 1.0,
+        'rank': int(rank),
+        'condition': float(condition),
+        'iterations': refits
+    }
+
+# Rendering of the products of the price chart, see chart_rendering
+DEFAULT_CHART_RENDERING = {
+    # Plot the products with WebGL above this many points, browsers slow down drawing more SVG markers
+    'WEBGL_THRESHOLD': 1000,
+    # Plot a sample of at most MAX_POINTS products, see downsample_points
+    'DOWNSAMPLE': False,
+    'MAX_POINTS': 1000,
+}
+
+def get_chart_config() -> dict:
+    """
+    Returns the chart rendering configuration, merging the
+    SCRAPER_CHART_RENDERING setting over the defaults.
+    """
+
+    return {**DEFAULT_CHART_RENDERING, **getattr(settings, 'SCRAPER_CHART_RENDERING', {})}
+
+def downsample_points(x: np.ndarray, y: np.ndarray, keep: list[int], max_points: int) -> np.ndarray:
+    """
+    Selects at most max_points of a scatter of points so that the plot keeps
+    its shape. The points at the extremes of x, y and x + y and the points
+    of keep are always selected. The plot is divided into a grid, every
+    occupied cell keeps at least one point so that sparse regions and
+    outliers stay visible, and the rest of the points are shared between
+    the cells in proportion to how many points they hold. The points of a
+    cell are spread evenly along x + y.
+
+    Args:
+        x (np.ndarray): The x coordinates of the points.
+        y (np.ndarray): The y coordinates of the points.
+        keep (list[int]): The indices of the points to select regardless.
+        max_points (int): The most points to select.
+
+    Returns:
+        np.ndarray: The sorted indices of the selected points.
+    """
+
+    total = len(x)
+    if total <= max_points:
+        return np.arange(total)
+
+    sums = x + y
+    required = np.unique(np.concatenate([
+        [x.argmin(), x.argmax(), y.argmin(), y.argmax(), sums.argmin(), sums.argmax()], np.asarray(keep, dtype=int)
+    ]))
+    budget = max_points - len(required)
+    if budget <= 0:
+        return required[:max_points]
+
+    # Cells of a square grid, few enough that each can keep a point and most of the budget is proportional
+    grid = int(np.clip(np.sqrt(budget / 4), 1, 32))
+
+    def cell(values: np.ndarray) -> np.ndarray:
+        low, high = values.min(), values.max()
+        return np.minimum(((values - low) / ((high - low) or 1) * grid).astype(int), grid - 1)
+
+    cells = cell(x) * grid + cell(y)
+    order = np.lexsort((sums, cells))
+    counts = np.bincount(cells, minlength=grid * grid)
+    occupied = np.flatnonzero(counts)
+    starts = np.concatenate([[0], np.cumsum(counts)])[occupied]
+    counts = counts[occupied]
+
+    # One point per occupied cell, then the rest of the budget in proportion to the points left in each
+    shares = (counts - 1) * (budget - len(occupied)) / max(total - len(occupied), 1)
+    quotas = 1 + np.floor(shares).astype(int)
+    # The points the rounding down left over go to the cells with the largest remainders
+    remainders = np.argsort(np.floor(shares) - shares, kind='stable')[:budget - quotas.sum()]
+    quotas[remainders] += 1
+    quotas = np.minimum(quotas, counts)
+
+    # The j-th of the q points of a cell of c points is its point of rank (j + 0.5) * c / q
+    cell_counts = np.repeat(counts, quotas)
+    cell_quotas = np.repeat(quotas, quotas)
+    ranks = np.arange(quotas.sum()) - np.repeat(np.cumsum(quotas) - quotas, quotas)
+    sampled = order[np.repeat(starts, quotas) + ((ranks + 0.5) * cell_counts / cell_quotas).astype(int)]
+
+    return np.union1d(required, sampled)
+
+def chart_rendering(products: ProductTable, best: int, config: dict = None) -> dict:
+    """
+    Decides how the products of the price chart are plotted: which of them,
+    downsampled when the DOWNSAMPLE setting is on and there are more than
+    MAX_POINTS, and whether with SVG or with WebGL, past WEBGL_THRESHOLD
+    points.
+
+    Args:
+        products (ProductTable): The table of similar products.
+        best (int): The row of the best match in the table, always plotted.
+        config (dict): The rendering configuration, see get_chart_config.
+
+    Returns:
+        dict: The rendering:
+            - mode: 'svg' or 'webgl'.
+            - points: The number of products plotted.
+            - total: The number of products.
+            - rows: The rows of the products plotted.
+    """
+
+    if config is None:
+        config = get_chart_config()
+
+    rows = np.arange(len(products))
+    if config['DOWNSAMPLE'] and len(products) > config['MAX_POINTS']:
+        rows = downsample_points(products.prices, products.shipping, [best], config['MAX_POINTS'])
+
+    return {
+        'mode': 'webgl' if len(rows) > config['WEBGL_THRESHOLD'] else 'svg',
+        'points': len(rows),
+        'total': len(products),
+        'rows': rows
+    }
+
+def chart_title(listing_title: str, rendering: dict) -> str:
+    """
+    Returns the title of the price chart, which mentions the sample when the
+    products are downsampled.
+    """
+
+    if rendering['points'] < rendering['total']:
+        return f"Products Similar to: {listing_title}<br><sup>Showing {rendering['points']:,} of {rendering['total']:,} products</sup>"
+
+    return f"Products Similar to: {listing_title}"
+
+def graph_objects():
+    """
+    Imports the Plotly figure classes on first use, along with orjson, the
+    JSON encoder Plotly loads when it first serializes a figure. Plotly
+    takes it from sys.modules without waiting for another thread to finish
+    importing it, the import statement waits.
+
+    Returns:
+        The plotly.graph_objects module.
+    """
+
+    import plotly.graph_objects as go
+
+    try:
+        import orjson  # noqa: F401
+    except ImportError:
+        # Plotly falls back to the json module
+        pass
+
+    return go
+
+def create_chart(products: ProductTable, listing_currency: str, listing_title: str, best: int, robust: bool = False, rendering: dict = None) -> object:
     """
     Creates a line chart visualization based on the categorized items, their prices, and their descriptions.
 
     Args:
-        categorized (dict): A dictionary where the keys are the names of the clusters and the values are lists of the items in that cluster.
-        similar_prices (list[float]): A list of prices of the items.
-        similar_shipping (list[float]): A list of shipping costs of the items.
-        similar_descriptions (list[str]): A list of descriptions of the items.
+        products (ProductTable): The table of similar products.
+        listing_currency (str): The currency of the listing.
+        listing_title (str): The title of the listing.
+        best (int): The row of the best match in the table.
+        robust (bool): Whether to fit the trend line robustly, see fit_polynomial.
+        rendering (dict): Which products to plot and how, see chart_rendering.
 
     Returns:
         A JSON string containing the Plotly figure of the line chart.
     """
     
-    sorted_indices = np.argsort(similar_shipping)
-    sorted_similar_prices = np.array([similar_prices[i] for i in sorted_indices]).reshape(-1, 1)
-    sorted_similar_shipping = np.array([similar_shipping[i] for i in sorted_indices])
-    sorted_similar_descriptions = np.array([similar_descriptions[i] for i in sorted_indices])
-    sorted_similar_conditions = np.array([similar_conditions[i] for i in sorted_indices])
+    # Plotly builds its figure classes on first use, only the figure payloads pay for them
+    go = graph_objects()
+
+    if rendering is None:
+        rendering = chart_rendering(products, best)
+    scatter = go.Scattergl if rendering['mode'] == 'webgl' else go.Scatter
+
+    sorted_indices = rendering['rows'][np.argsort(products.shipping[rendering['rows']])]
+    sorted_similar_prices = products.prices[sorted_indices].reshape(-1, 1)
+    sorted_similar_shipping = products.shipping[sorted_indices]
+    sorted_similar_descriptions = products.titles[sorted_indices]
+    sorted_similar_conditions = products.conditions[sorted_indices]
   
     fig = go.Figure()
     fig.add_trace(
-        go.Scatter(
+        scatter(
             x=sorted_similar_prices[:, 0], 
             y=sorted_similar_shipping, 
             mode='markers',
@@ -206,7 +677,7 @@ def create_chart(similar_prices: list[float], similar_shipping: list[float], sim
         yaxis_title=f"Shipping Cost $({listing_currency})",
         legend_title="Categories", 
         title={
-            'text': f"Products Similar to: {listing_title}", 
+            'text': chart_title(listing_title, rendering), 
             'xanchor': 'center',
             'yanchor': 'top',
             'y': 0.9, 
@@ -215,8 +686,8 @@ def create_chart(similar_prices: list[float], similar_shipping: list[float], sim
     )
     
     # Add best match annotation
-    best_price = similar_prices[similar_descriptions.index(best_title)]
-    best_shipping = similar_shipping[similar_descriptions.index(best_title)]
+    best_price = products.prices[best]
+    best_shipping = products.shipping[best]
     fig.add_trace(
         go.Scatter(
             x=[best_price],
@@ -232,24 +703,10 @@ def create_chart(similar_prices: list[float], similar_shipping: list[float], sim
         )
     )
 
-    # Perform polynomial regression to obtain polynomial coefficients
-    poly_features = PolynomialFeatures(degree=4, include_bias=True)
-    X_poly = poly_features.fit_transform(sorted_similar_prices)
-    poly_model = LinearRegression()
-    poly_model.fit(X_poly, sorted_similar_shipping)
-
-    X_range = np.linspace(sorted_similar_prices.min(), sorted_similar_prices.max(), 100)
-    X_range_poly = poly_features.fit_transform(X_range.reshape(-1, 1))
-    Y_range = poly_model.predict(X_range_poly)
-
-    # Calculate confidence interval
-    y_pred = poly_model.predict(X_poly)
-    mse = mean_squared_error(sorted_similar_shipping, y_pred)
-    # 95% confidence interval
-    ci = 1.96 * np.sqrt(mse)
-
-    upper_bound = Y_range + ci
-    lower_bound = Y_range - ci
+    # Fit a degree 4 polynomial of the shipping cost in the price, with its 95% confidence band, on all the products
+    trend = fit_polynomial(products.prices, products.shipping, robust=robust)
+    X_range, Y_range = trend['x'], trend['y']
+    upper_bound, lower_bound = trend['upper'], trend['lower']
 
     fig.add_trace(
         go.Scatter(
@@ -282,6 +739,64 @@ def create_chart(similar_prices: list[float], similar_shipping: list[float], sim
         
     return fig.to_json()
 
+def encode_cents(values: np.ndarray) -> str:
+    """
+    Encodes amounts of money as base64 little-endian 32-bit integers of
+    cents, which the browser decodes into an Int32Array.
+    """
+
+    return base64.b64encode(np.rint(np.asarray(values, dtype=float) * 100).astype('<i4').tobytes()).decode('ascii')
+
+def create_compact_chart(products: ProductTable, listing_currency: str, listing_title: str, best: int, robust: bool = False, rendering: dict = None) -> str:
+    """
+    Creates the data of the chart of create_chart without the figure: the
+    prices and shipping costs as base64 binary columns, the titles and
+    conditions, the best match, the coefficients of the trend line and how
+    to plot the products. plotSimilarResults.js assembles the same figure
+    from it in the browser.
+
+    Args:
+        products (ProductTable): The table of similar products.
+        listing_currency (str): The currency of the listing.
+        listing_title (str): The title of the listing.
+        best (int): The row of the best match in the table.
+        robust (bool): Whether to fit the trend line robustly, see fit_polynomial.
+        rendering (dict): Which products to plot and how, see chart_rendering.
+
+    Returns:
+        A JSON string containing the data of the chart.
+    """
+
+    if rendering is None:
+        rendering = chart_rendering(products, best)
+
+    sorted_indices = rendering['rows'][np.argsort(products.shipping[rendering['rows']])]
+    sorted_similar_prices = products.prices[sorted_indices]
+    sorted_similar_shipping = products.shipping[sorted_indices]
+
+    # Few distinct conditions, sent once each with the index of every product's
+    conditions, condition_codes = np.unique(products.conditions[sorted_indices].astype(str), return_inverse=True)
+
+    trend = fit_polynomial(products.prices, products.shipping, robust=robust)
+
+    return json.dumps({
+        'format': 'compact',
+        'currency': listing_currency,
+        'title': listing_title,
+        'rendering': {key: rendering[key] for key in ('mode', 'points', 'total')},
+        'prices': encode_cents(sorted_similar_prices),
+        'shipping': encode_cents(sorted_similar_shipping),
+        'titles': [title.title() for title in products.titles[sorted_indices]],
+        'conditions': conditions.tolist(),
+        'condition_codes': condition_codes.tolist(),
+        'best': [float(products.prices[best]), float(products.shipping[best])],
+        'trend': {
+            'coefficients': trend['coefficients'].tolist(),
+            'ci': float(trend['ci']),
+            'points': CHART_TREND_POINTS
+        }
+    }, separators=(',', ':'))
+
 def create_bargraph(countries: list[str]) -> object:
     """
     Creates a word cloud visualization based on a list of countries.
@@ -293,8 +808,10 @@ def create_bargraph(countries: list[str]) -> object:
         A JSON string containing the Plotly Express figure of the word cloud.
     """
 
-    # Count the occurrences of each country
-    country_counts = Counter(countries)
+    go = graph_objects()
+
+    # Count the occurrences of each country, skipping items without one
+    country_counts = Counter(country for country in countries if country is not None)
     
     # Get the names and counts of the countries
     country_names = list(country_counts.keys())
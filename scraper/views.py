@@ -1,9 +1,23 @@
-from django.shortcuts import render
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import redirect, render
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
 from django.views import View
 from .forms import MarketForm
-from .utils import *
-from .shop_class import EbayScraper
-from .marketplace_class import FacebookMarketplaceScraper
+from .async_client import async_pool_stats
+from .batch import aanalyze_batch, analyze_batch, get_batch_config
+from .client import pool_stats
+from .index import comparable_index_stats
+from .jobs import get_job_queue, job_queue_stats
+from .page_cache import page_cache_stats
+from .pipeline import aanalysis_events, acached_analysis, analysis_events, cached_analysis
+from .similarity import similarity_cache_stats
+from .exceptions import JobQueueFull, ListingNotFound, NoProductsFound
+import json
 
 class Index(View):
     def get(self, request):
@@ -15,90 +29,215 @@ class Index(View):
     def post(self, request):
         form = MarketForm(request.POST)
         if form.is_valid():
-            url = form.cleaned_data['url']
+            try:
+                context = cached_analysis(form.cleaned_data['url'], form.cleaned_data['refresh'])
+            except ListingNotFound:
+                return render(request, 'scraper/missing.html')
+            except NoProductsFound:
+                # Reported like a failed stream, see Stream.templates
+                return render(request, 'scraper/failure.html')
 
-            # Shorten the URL and create a mobile URL
-            shortened_url = re.search(r".*[0-9]", url).group(0)
-            mobile_url = shortened_url.replace("www", "m")
+            return render(request, 'scraper/result.html', context)
 
-            # Create soup objects from the desktop and mobile versions of the page
-            mobile_soup = create_soup(mobile_url, headers=None)
-            base_soup = create_soup(url, headers=None)
+class AsyncIndex(View):
+    """
+    Asynchronous version of Index, routed instead of it when the project is
+    served through marketscrape.asgi.
+    """
 
-            # Create a FacebookScraper instance
-            facebook_instance = FacebookMarketplaceScraper(mobile_soup, base_soup)
+    async def get(self, request):
+        form = MarketForm()
+        context = {'form': form}
 
-            # Check if the listing is missing
-            if facebook_instance.is_listing_missing():
+        return render(request, 'scraper/index.html', context)
+
+    async def post(self, request):
+        form = MarketForm(request.POST)
+        if form.is_valid():
+            try:
+                context = await acached_analysis(form.cleaned_data['url'], form.cleaned_data['refresh'])
+            except ListingNotFound:
                 return render(request, 'scraper/missing.html')
-            
-            # Get the listing data
-            image = facebook_instance.get_listing_image()
-            days, hours = facebook_instance.get_listing_date()
-            description = facebook_instance.get_listing_description()
-            title = facebook_instance.get_listing_title()
-            condition = facebook_instance.get_listing_condition()
-            category = facebook_instance.get_listing_category()
-            price = facebook_instance.get_listing_price()
-            city = facebook_instance.get_listing_city()
-            currency = facebook_instance.get_listing_currency()
-
-            # Create a GoogleShoppingScraper instance
-            shopping_instance = EbayScraper()
-
-            # Find viable products based on the title
-            cleaned_title = remove_illegal_characters(title)
-            similar_descriptions, similar_prices, similar_shipping, similar_countries, similar_conditions, similar_scores = shopping_instance.find_viable_product(cleaned_title, ramp_down=0.0)
-            candidates = shopping_instance.construct_candidates(similar_descriptions, similar_prices, similar_shipping, similar_countries, similar_conditions, similar_scores)
-
-            # Convert prices to float and shorten the descriptions if necessary
-            similar_prices = [float(price.replace(',', '')) for price in similar_prices]
-            similar_shipping = [float(ship.replace(',', '')) for ship in similar_shipping]
-
-            # Based on the best similar product, get the price, description, and country
-            best_product = shopping_instance.lowest_price_highest_similarity(candidates)
-
-            idx = similar_countries.index(best_product[1]["country"])
-            best_price = f"{similar_prices[idx]:,.2f}"
-            best_shipping = f"{similar_shipping[idx]:,.2f}"
-            best_title = similar_descriptions[idx]
-            best_score = best_product[1]["similarity"] * 100
-
-            # Percetage difference between the listing price and the best found price (including shipping)
-            best_total = float(best_price.replace(",", "")) + float(best_shipping.replace(",", ""))
-            best_context = percentage_difference(float(price), best_total,)
-            price_rating = price_difference_rating(float(price), best_total, days)
-
-            # Categorize the titles and create the chart and bargraph
-            chart = create_chart(similar_prices, similar_shipping, similar_descriptions, similar_conditions, currency, title, best_title)
-            bargraph = create_bargraph(similar_countries)   
-
-            # Get the total number of items
-            total_items = len(similar_descriptions)
-
-            # Create the context 
-            context = {
-                'shortened_url': shortened_url,
-                'mobile_url': mobile_url,
-                'title': title,
-                'price': f"{float(price):,.2f}",
-                'chart': chart,
-                'bargraph': bargraph,
-                'price_rating': round(price_rating, 1),
-                'days': days,
-                'hours': hours,
-                'image': image,
-                'description': description,
-                'condition': condition,
-                'category': category,
-                'city': city,
-                'currency': currency,
-                'total_items': total_items,
-                'best_price': best_price,
-                'best_shipping': best_shipping,
-                'best_title': best_title.title(),
-                'best_score': round(best_score, 2),
-                'best_context': best_context
-            }
-
-            return render(request, 'scraper/result.html', context)
\ No newline at end of file
+            except NoProductsFound:
+                return render(request, 'scraper/failure.html')
+
+            return render(request, 'scraper/result.html', context)
+
+class Report(View):
+    def get(self, request):
+        form = MarketForm(request.GET)
+        if not form.is_valid():
+            return redirect('index')
+
+        # The page only holds placeholders, the analysis is streamed in from the stream URL
+        context = {'stream_url': f"{reverse('stream')}?{request.GET.urlencode()}"}
+
+        return render(request, 'scraper/report.html', context)
+
+class Stream(View):
+    # Stages sent with the HTML of their part of the report
+    templates = {
+        'listing': 'scraper/result-listing.html',
+        'rating': 'scraper/result-rating.html',
+        'charts': 'scraper/result-charts.html',
+        'missing': 'scraper/missing-message.html',
+        'failure': 'scraper/failure-message.html'
+    }
+
+    def get(self, request):
+        form = MarketForm(request.GET)
+        if not form.is_valid():
+            return JsonResponse({'errors': form.errors}, status=400)
+
+        return self.stream_response(self.events(form.cleaned_data['url'], form.cleaned_data['refresh']))
+
+    def stream_response(self, events) -> StreamingHttpResponse:
+        """
+        Returns the response that sends the events as they are produced.
+        """
+
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Stop nginx from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+
+        return response
+
+    def event(self, stage: str, data: dict) -> str:
+        """
+        Formats a stage of the analysis as a server-sent event.
+        """
+
+        if stage in self.templates:
+            html = render_to_string(self.templates[stage], data)
+            # The charts are already part of their HTML, only how the chart is rendered is sent along
+            data = {'html': html, 'chart_rendering': data['chart_rendering']} if stage == 'charts' else {**data, 'html': html}
+
+        return f"event: {stage}\ndata: {json.dumps(data)}\n\n"
+
+    def events(self, url: str, refresh: bool):
+        """
+        Formats each stage of the analysis as a server-sent event.
+        """
+
+        for stage, data in analysis_events(url, refresh):
+            yield self.event(stage, data)
+
+class AsyncStream(Stream):
+    """
+    Asynchronous version of Stream, routed instead of it when the project is
+    served through marketscrape.asgi. The analysis runs on the event loop
+    and every event is sent as soon as its stage completes.
+    """
+
+    async def get(self, request):
+        form = MarketForm(request.GET)
+        if not form.is_valid():
+            return JsonResponse({'errors': form.errors}, status=400)
+
+        return self.stream_response(self.aevents(form.cleaned_data['url'], form.cleaned_data['refresh']))
+
+    async def aevents(self, url: str, refresh: bool):
+        """
+        Formats each stage of the analysis as a server-sent event.
+        """
+
+        async for stage, data in aanalysis_events(url, refresh):
+            yield self.event(stage, data)
+
+class Jobs(View):
+    def post(self, request):
+        form = MarketForm(request.POST)
+        if not form.is_valid():
+            return JsonResponse({'errors': form.errors}, status=400)
+
+        # The analysis runs in the background, the client polls the status URL for its progress and result
+        try:
+            job = get_job_queue().submit(form.cleaned_data['url'], form.cleaned_data['refresh'])
+        except JobQueueFull as e:
+            return JsonResponse({'error': str(e)}, status=503, headers={'Retry-After': '30'})
+
+        return JsonResponse({'id': job.id, 'status': job.status, 'status_url': reverse('job', args=[job.id])}, status=202)
+
+class JobStatus(View):
+    def get(self, request, job_id):
+        job = get_job_queue().get(job_id)
+        if job is None:
+            return JsonResponse({'error': "Unknown or expired job."}, status=404)
+
+        return JsonResponse(job.to_dict())
+
+@method_decorator(csrf_exempt, name='dispatch')
+class BatchAnalysis(View):
+    def post(self, request):
+        batch, error = self.parse(request)
+        if error is not None:
+            return error
+
+        # One JSON line per listing, in the order the analyses finish
+        lines = analyze_batch(batch['urls'], batch.get('parallelism'), bool(batch.get('refresh')), bool(batch.get('charts')))
+
+        return StreamingHttpResponse((json.dumps(line, cls=DjangoJSONEncoder) + "\n" for line in lines), content_type='application/x-ndjson')
+
+    def parse(self, request) -> tuple[dict, JsonResponse]:
+        """
+        Validates the body of a batch request.
+
+        Returns:
+            tuple[dict, JsonResponse]: The batch, or the error response when
+            the body isn't valid.
+        """
+
+        try:
+            batch = json.loads(request.body)
+        except (ValueError, UnicodeDecodeError):
+            return None, JsonResponse({'error': "The body must be a JSON object."}, status=400)
+
+        urls = batch.get('urls') if isinstance(batch, dict) else None
+        if not isinstance(urls, list) or not urls:
+            return None, JsonResponse({'error': "urls must be a non-empty list of Marketplace URLs."}, status=400)
+
+        max_urls = get_batch_config()['MAX_URLS']
+        if len(urls) > max_urls:
+            return None, JsonResponse({'error': f"A batch can contain at most {max_urls} URLs."}, status=400)
+
+        parallelism = batch.get('parallelism')
+        if parallelism is not None and (not isinstance(parallelism, int) or parallelism < 1):
+            return None, JsonResponse({'error': "parallelism must be a positive integer."}, status=400)
+
+        return batch, None
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncBatchAnalysis(BatchAnalysis):
+    """
+    Asynchronous version of BatchAnalysis, routed instead of it when the
+    project is served through marketscrape.asgi. The listings are analyzed
+    on the event loop and every line is sent as soon as its listing is done.
+    """
+
+    async def post(self, request):
+        batch, error = self.parse(request)
+        if error is not None:
+            return error
+
+        lines = aanalyze_batch(batch['urls'], batch.get('parallelism'), bool(batch.get('refresh')), bool(batch.get('charts')))
+
+        return StreamingHttpResponse(self.ndjson(lines), content_type='application/x-ndjson')
+
+    async def ndjson(self, lines):
+        async for line in lines:
+            yield json.dumps(line, cls=DjangoJSONEncoder) + "\n"
+
+@method_decorator(staff_member_required, name='dispatch')
+class Stats(View):
+    def get(self, request):
+        stats = {
+            'http': pool_stats(),
+            'http_async': async_pool_stats(),
+            'page_cache': page_cache_stats(),
+            'jobs': job_queue_stats(),
+            'similarity': similarity_cache_stats(),
+            'index': comparable_index_stats()
+        }
+
+        return JsonResponse(stats)